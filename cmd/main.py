@@ -7,19 +7,95 @@ load_dotenv()
 from internal.sensor.delivery.http_handler import (
     router as sensor_router,
     debug as sensor_debug,
+    get_broadcaster,
+    fake_stop,
+    replay_ctl,
+    worker_sources,
 )
-from internal.sensor.usecase.sensor_usecase import SensorUsecase
-from internal.sensor.repository.sensor_repository import SensorRepository
+from internal.sensor.delivery import ws_hub
+from internal.sensor.delivery.cluster import Cluster, SHARED_STATE
+from internal.sensor.usecase.sensor_usecase import SensorUsecase, frame_message
+from internal.sensor.usecase.analytics import PressAnalytics
+from internal.sensor.usecase.twin import TwinEngine
+from internal.sensor.repository.sensor_repository import SensorRepository, FLUSH_INTERVAL_S as REPO_FLUSH_INTERVAL_S
+from internal.sensor.repository.csv_store import CsvStore
+from internal.sensor.repository.sharded_repository import ShardedRepository
+from internal.sensor.usecase.sharded_usecase import ShardedUsecase
+from internal.shared.shard_pool import ShardPool, INGEST_SHARDS
 # 👇 importa o replayer que está no teu serial_reader.py
 from internal.shared.serial_reader import send_replay_from_file
+from internal.shared.serial_manager import SerialSessionManager
+from internal.shared.replay_session import ReplaySession, REPLAY_SPEED, expand, is_repo_csv
+from internal.shared.replay_manager import ReplayManager
+from internal.shared import metrics
 
 app = FastAPI(title="Digital Twin API")
 
 # Dependências na app.state (pra acessar nos handlers)
-repo = SensorRepository()
-usecase = SensorUsecase(repo)
+if SHARED_STATE and INGEST_SHARDS > 0:
+    raise RuntimeError("SHARED_STATE (vários workers do uvicorn) e INGEST_SHARDS não combinam: escolha um dos dois.")
+cluster = Cluster() if SHARED_STATE else None
+app.state.cluster = cluster
+if INGEST_SHARDS > 0:
+    # persistência, filtros seriais, analytics e gêmeo em N processos (um shard por device)
+    repo = ShardedRepository(ShardPool(INGEST_SHARDS))
+    usecase = ShardedUsecase(repo, repo.pool)
+    usecase.broadcaster = get_broadcaster()
+    app.state.shards = usecase                # /twin/* consultam os shards
+    app.state.analytics = app.state.twin = None
+else:
+    repo = SensorRepository()
+    usecase = SensorUsecase(repo)
+    usecase.broadcaster = get_broadcaster()   # toda fonte (serial/fake/replay) publica via usecase
+    if cluster is not None:
+        # vários workers: última leitura na memória compartilhada, frames e msgs do WS pelo bus
+        repo.shared = cluster.table
+        for b in repo.backends:
+            if isinstance(b, CsvStore):
+                b.shared_files = True   # CSV de device de outro worker: leitura não grava no .idx
+        usecase.broadcaster = cluster.broadcaster(usecase.broadcaster)
+        usecase.add_stage("cluster", cluster.stage)   # antes do analytics: frame chega aos outros antes do "kpis"
+    app.state.analytics = PressAnalytics()
+    usecase.add_stage("analytics", app.state.analytics.update)   # KPIs em memória (/twin/kpis + "kpis" no WS)
+    app.state.twin = TwinEngine(publish=usecase.broadcaster)
+    usecase.twin_updater = app.state.twin.update                 # estado do gêmeo (/twin/state + deltas "twin" no WS)
+    app.state.shards = None
 app.state.repo = repo
 app.state.usecase = usecase
+app.state.serial_manager = SerialSessionManager(usecase)   # uma sessão por porta serial
+app.state.replay_manager = ReplayManager(usecase)          # replays controlados por /replay/*
+
+if cluster is not None:
+    def _apply_remote(readings):
+        # frame ingerido por outro worker: só a memória deste (sem gravar nem republicar) + WS locais
+        repo.recent.append(readings)
+        app.state.analytics.update(readings)
+        app.state.twin.apply(readings)
+        ws_hub.broadcast_nowait(frame_message(readings))
+
+    async def _ctl_serial_stop(port=None, device_id=None):
+        mgr = app.state.serial_manager
+        for p in mgr.find(port, device_id):
+            await mgr.stop(p)
+
+    async def _ctl_replay(**args):
+        await replay_ctl(app, **args)
+
+    app.state.replay_manager.id_prefix = f"{os.getpid()}-r"   # ids de replay únicos entre os workers
+    cluster.apply_remote = _apply_remote
+    cluster.info = lambda: worker_sources(app)
+    cluster.ctl_handlers = {"fake_stop": fake_stop, "serial_stop": _ctl_serial_stop, "replay": _ctl_replay}
+
+# gauges lidos a cada scrape do /metrics
+metrics.gauge("twin_serial_queue_depth", "Linhas na fila de ingest serial", ("worker",),
+              lambda: [((i,), n) for i, n in enumerate(app.state.serial_manager.queue_depths())])
+metrics.gauge("twin_serial_sessions", "Sessões seriais ativas", (), lambda: [((), app.state.serial_manager.running())])
+metrics.gauge("twin_replays_running", "Replays rodando", (), lambda: [((), app.state.replay_manager.running())])
+metrics.gauge("twin_repo_rows_buffered", "Linhas em buffer no write-behind", ("backend",),
+              lambda: [((name,), st.get("rows_buffered", 0)) for name, st in repo.stats().items()])
+if app.state.shards is not None:
+    metrics.gauge("twin_shard_inflight", "Frames/linhas enviados ao shard e ainda não processados", ("shard",),
+                  lambda: [((st["shard"],), st["inflight"]) for st in repo.pool.status()])
 
 # ---------------------------------------------------------------------
 # 🔹 Inclui os routers principais
@@ -45,22 +121,84 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ---------------------------------------------------------------------
+# 🔹 Shards de ingest (INGEST_SHARDS > 0): sobem antes de qualquer fonte
+# ---------------------------------------------------------------------
+@app.on_event("startup")
+def _boot_shards():
+    if app.state.shards is not None:
+        app.state.shards.start()
+
+# ---------------------------------------------------------------------
+# 🔹 SHARED_STATE: bus entre os workers do uvicorn (uvicorn --workers N)
+# ---------------------------------------------------------------------
+@app.on_event("startup")
+def _boot_cluster():
+    if cluster is not None:
+        cluster.start()
+
 # ---------------------------------------------------------------------
 # 🔹 Inicia o replay automaticamente se REPLAY_FILE estiver no .env
 # ---------------------------------------------------------------------
 @app.on_event("startup")
 def _boot_replay():
     replay_file = os.getenv("REPLAY_FILE")
-    if replay_file and os.path.exists(replay_file):
-        print(f"[replay] Iniciando replay do arquivo: {replay_file}")
-        asyncio.create_task(
-            send_replay_from_file(
-                path=replay_file,
-                usecase=usecase,
-                device_id=os.getenv("SERIAL_DEVICE_ID", "arduino-01"),
-                loop_=os.getenv("REPLAY_LOOP", "true").lower() in ("1", "true", "yes", "on"),
-                speed=float(os.getenv("REPLAY_SPEED", "1.0")),
-            )
-        )
-    else:
+    if replay_file and cluster is not None and not cluster.leader:
+        print(f"[replay] REPLAY_FILE fica com o worker líder do SHARED_STATE (pid {os.getpid()} não é)")
+        return
+    # CSVs do repositório (um por sensor, glob e/ou lista separada por vírgula) -> ReplaySession
+    files = expand(replay_file) if replay_file else []
+    session = bool(files) and all(is_repo_csv(f) for f in files)
+    if not session and not (replay_file and os.path.exists(replay_file)):
         print("[replay] Nenhum arquivo configurado em REPLAY_FILE ou não encontrado.")
+        return
+    device_id = os.getenv("SERIAL_DEVICE_ID", "arduino-01")
+    if REPLAY_SPEED == float("inf"):
+        # backfill: uma passada direto no repositório, fora do /replay/*
+        print(f"[replay] Backfill de: {replay_file}")
+        runner = ReplaySession.from_spec(files) if session else None
+        asyncio.create_task(runner.run(usecase) if runner else
+                            send_replay_from_file(path=replay_file, usecase=usecase, device_id=device_id, speed=REPLAY_SPEED))
+        return
+    mgr = app.state.replay_manager
+    try:
+        rid = mgr.start(files=files) if session else mgr.start(path=replay_file, device_id=device_id)
+    except ValueError as e:
+        print(f"[replay] REPLAY_FILE inválido: {e}")
+        return
+    print(f"[replay] {rid}: {replay_file} -> {', '.join(mgr.get(rid).devices())} (controle em /replay/*)")
+
+# ---------------------------------------------------------------------
+# 🔹 Write-behind do repositório: flush periódico + flush durável no shutdown
+# ---------------------------------------------------------------------
+async def _repo_flusher():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(max(0.05, REPO_FLUSH_INTERVAL_S / 2))
+        try:
+            await loop.run_in_executor(None, repo.flush_due)
+        except Exception as e:
+            print("[repo] flush periódico falhou:", e)
+
+@app.on_event("startup")
+def _boot_repo_flusher():
+    app.state.repo_flusher = asyncio.create_task(_repo_flusher())
+
+@app.on_event("shutdown")
+async def _stop_sources():
+    # antes do repo.close(): fake, sessões seriais e replays ainda podem estar ingerindo
+    await fake_stop()
+    await app.state.serial_manager.stop_all()
+    await app.state.replay_manager.stop_all()
+
+@app.on_event("shutdown")
+def _close_repo():
+    task = getattr(app.state, "repo_flusher", None)
+    if task:
+        task.cancel()
+    repo.close()
+
+@app.on_event("shutdown")
+async def _stop_cluster():
+    if cluster is not None:
+        await cluster.stop()
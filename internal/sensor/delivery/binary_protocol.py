@@ -0,0 +1,110 @@
+# internal/sensor/delivery/binary_protocol.py
+"""
+Protocolo binário opcional do /sensor/ws (?format=bin).
+
+No connect o cliente recebe (texto JSON) o schema + dicionário de devices;
+depois cada frame "ingest" vira um pacote fixo de 24 bytes little-endian:
+
+  u8  type        (1 = frame)
+  u16 device      (índice no dicionário)
+  f64 ts          (epoch em segundos)
+  f32 temperature (NaN = ausente)
+  f32 pressure
+  f32 distance
+  u8  flags       bit0 ir_bread, bit1 ir_hand, bit2 ir_bread presente, bit3 ir_hand presente
+
+Devices novos são anunciados com {"type":"devices","devices":{idx: id}} antes do primeiro frame.
+Mensagens que não são frames continuam em JSON texto.
+"""
+import math
+import struct
+import time
+
+VERSION = 1
+MSG_FRAME = 1
+FRAME = struct.Struct("<BHdfffB")
+
+F_IR_BREAD = 1
+F_IR_HAND = 2
+F_IR_BREAD_SET = 4
+F_IR_HAND_SET = 8
+
+_NAN = float("nan")
+_devices = {}   # device_id -> índice (u16)
+
+# aliases aceitos no dict "reading" (fake usa nomes em inglês, serial usa os do firmware)
+_CHANNELS = (
+    ("temperature", ("temperature", "temperatura_C")),
+    ("pressure",    ("pressure", "pressao_kPa")),
+    ("distance",    ("distance", "distancia_mm")),
+)
+
+def schema() -> dict:
+    return {
+        "type": "schema",
+        "version": VERSION,
+        "endianness": "little",
+        "frame": {
+            "size": FRAME.size,
+            "fields": [["type", "u8"], ["device", "u16"], ["ts", "f64"],
+                       ["temperature", "f32"], ["pressure", "f32"], ["distance", "f32"], ["flags", "u8"]],
+        },
+        "flags": {"ir_bread": F_IR_BREAD, "ir_hand": F_IR_HAND,
+                  "ir_bread_present": F_IR_BREAD_SET, "ir_hand_present": F_IR_HAND_SET},
+        "devices": {str(i): d for d, i in _devices.items()},
+    }
+
+def device_index(device_id: str):
+    """Retorna (índice, novo?) — novo=True quando o device precisa ser anunciado."""
+    idx = _devices.get(device_id)
+    if idx is not None:
+        return idx, False
+    if len(_devices) >= 0xFFFF:
+        raise OverflowError("dicionário de devices cheio (u16)")
+    idx = len(_devices)
+    _devices[device_id] = idx
+    return idx, True
+
+def _num(v):
+    if v is None or isinstance(v, bool):
+        return _NAN if v is None else float(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return _NAN
+
+def _bit(v):
+    if v is None:
+        return None
+    x = _num(v)
+    return None if math.isnan(x) else x > 0.5
+
+def encode_frame(msg: dict):
+    """
+    Converte {"event":"ingest","reading":{...}} em (bytes, anúncio_de_device|None).
+    Retorna None se a mensagem não for um frame de leitura.
+    """
+    reading = msg.get("reading") if msg.get("event") == "ingest" else None
+    if not reading or not reading.get("device_id"):
+        return None
+    idx, new = device_index(reading["device_id"])
+    vals = []
+    for _, keys in _CHANNELS:
+        v = _NAN
+        for k in keys:
+            if k in reading:
+                v = _num(reading[k])
+                break
+        vals.append(v)
+    flags = 0
+    b = _bit(reading.get("ir_bread", reading.get("IR_pao")))
+    if b is not None:
+        flags |= F_IR_BREAD_SET | (F_IR_BREAD if b else 0)
+    h = _bit(reading.get("ir_hand", reading.get("IR_mao")))
+    if h is not None:
+        flags |= F_IR_HAND_SET | (F_IR_HAND if h else 0)
+    # f32 estoura acima de ~3.4e38: trata como ausente
+    vals = [v if abs(v) < 3.4e38 or math.isnan(v) else _NAN for v in vals]
+    data = FRAME.pack(MSG_FRAME, idx, msg.get("ts") or time.time(), vals[0], vals[1], vals[2], flags)
+    announce = {"type": "devices", "devices": {str(idx): reading["device_id"]}} if new else None
+    return data, announce
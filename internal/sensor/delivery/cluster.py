@@ -0,0 +1,118 @@
+# internal/sensor/delivery/cluster.py
+"""
+Vários workers do uvicorn servindo o mesmo estado (SHARED_STATE=true):
+
+  - última leitura: tabela em memória compartilhada (internal.shared.shm_table),
+    escrita pelo SensorRepository de quem ingere; /debug/last lê de lá
+  - fan-out: cada frame ingerido vai pelo bus (internal.shared.worker_bus) para os
+    outros workers, que alimentam o próprio cache recente / KPIs / gêmeo (sem
+    gravar nem republicar) e fazem o broadcast para os WS conectados neles; as msgs
+    "kpis"/"twin"/etc. de quem ingeriu vão prontas. Qualquer worker atende qualquer cliente.
+  - fontes (fake/serial/replay): cada worker publica as suas na tabela a cada
+    SHARED_REPORT_S; /status e os start de fake/serial/replay olham todos, e
+    stop/pause/seek/speed de uma fonte de outro worker vão como comando ("ctl") pelo bus
+  - líder: o worker com o flock do bus (fixo desde o startup); só ele sobe o REPLAY_FILE
+
+Arquivos: cada worker grava os devices que ele ingere (uma fonte por device); os
+outros leem o CSV sem tocar no .idx (CsvStore.shared_files).
+"""
+import asyncio
+import os
+
+from internal.sensor.delivery import ws_hub
+from internal.shared.ratelog import log_event
+from internal.shared.shard_pool import pack_frame, unpack_frame
+from internal.shared.shm_table import LatestTable
+from internal.shared.worker_bus import WorkerBus
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+SHARED_STATE      = os.getenv("SHARED_STATE", "false").lower() in ("1", "true", "yes", "on")
+SHARED_NAME       = os.getenv("SHARED_NAME", "digital_twin")             # nome do segmento em /dev/shm
+SHARED_DIR        = os.getenv("SHARED_DIR", "/tmp")                      # socket do bus + arquivos de lock
+SHARED_REPORT_S   = float(os.getenv("SHARED_REPORT_S", "0.5"))
+
+
+class Cluster:
+    def __init__(self, name: str = SHARED_NAME, directory: str = SHARED_DIR):
+        self.table = LatestTable(name, os.path.join(directory, f"{name}.table.lock"))
+        self.bus = WorkerBus(os.path.join(directory, f"{name}.sock"), self._on_bus)
+        self.pid = os.getpid()
+        self.apply_remote = None    # fn(readings): frame ingerido por outro worker -> memória deste
+        self.info = lambda: {}      # fn() -> fontes rodando neste worker (vai para a tabela)
+        self.ctl_handlers = {}      # nome -> async fn(**args)
+        self._reporter = None
+
+    @property
+    def leader(self) -> bool:
+        return self.bus.holds_lock
+
+    def start(self):
+        """Startup (event loop rodando): bus + publicação periódica das fontes deste worker."""
+        self.bus.start()
+        self._reporter = asyncio.create_task(self._report_loop())
+
+    async def stop(self):
+        if self._reporter:
+            self._reporter.cancel()
+            self._reporter = None
+        await self.bus.stop()
+        self.table.close()
+
+    # ------------------------------------------------------------------ ingest
+    def stage(self, readings):
+        """Estágio do SensorUsecase (registrado antes dos outros: o frame chega aos workers antes das msgs dele)."""
+        self.bus.publish({"k": "frame", "f": pack_frame(readings)})
+
+    def broadcaster(self, local):
+        """Envolve o broadcaster local: toda msg que não é frame também vai para os outros workers."""
+        async def _broadcast(msg: dict):
+            await local(msg)
+            if msg.get("event") != "ingest":
+                self.bus.publish({"k": "msg", "m": msg})
+        return _broadcast
+
+    def _on_bus(self, m: dict):
+        k = m.get("k")
+        if k == "frame":
+            if self.apply_remote is not None:
+                self.apply_remote(unpack_frame(m["f"]))
+        elif k == "msg":
+            ws_hub.broadcast_nowait(m["m"])
+        elif k == "ctl":
+            fn = self.ctl_handlers.get(m.get("c"))
+            if fn is not None:
+                asyncio.create_task(self._ctl(m["c"], fn, m.get("a") or {}))
+
+    @staticmethod
+    async def _ctl(name, fn, args):
+        try:
+            await fn(**args)
+        except Exception as e:
+            log_event("cluster.ctl_failed", level="error", ctl=name, error=e)
+
+    # ------------------------------------------------------------------ fontes
+    def ctl(self, name: str, **args):
+        """Comando para os outros workers (ex.: fake_stop); quem tem a fonte executa."""
+        self.bus.publish({"k": "ctl", "c": name, "a": args})
+
+    def report(self):
+        try:
+            self.table.report(self.info())
+        except Exception as e:
+            log_event("cluster.report_failed", level="error", error=e)
+
+    async def _report_loop(self):
+        while True:
+            self.report()
+            await asyncio.sleep(SHARED_REPORT_S)
+
+    def peers(self) -> list:
+        """[{"pid", "age_s", "info"}] dos outros workers vivos."""
+        return [w for w in self.table.workers() if w["pid"] != self.pid]
+
+    def stats(self) -> dict:
+        return {"pid": self.pid, "leader": self.leader, "broker": self.bus.is_broker, "connected": self.bus.connected,
+                "bus": dict(self.bus.stats), "table": {**self.table.stats, "slots": self.table.slots, "used": self.table.used},
+                "workers": self.table.workers()}
@@ -1,96 +1,39 @@
 # internal/sensor/delivery/http_handler.py
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Body, Query, Request
-from starlette.websockets import WebSocketState
-from collections import defaultdict
+from fastapi.responses import PlainTextResponse
 from datetime import datetime, timezone
-import asyncio, json, time, threading, random, math
+import asyncio, time, threading, random, math
 import os
-from time import monotonic
 
 
-from internal.sensor.domain.sensor_model import SensorReading
+from internal.sensor.domain.sensor_model import Reading, SensorReading
+from internal.sensor.delivery import ws_hub
 
-from internal.shared.calib import CAL_PRESSURE  # a mesma calib do SerialReader
+from internal.shared.serial_reader import serial_asyncio, backfill_file
+from internal.shared.replay_session import (
+    ReplaySession, REPLAY_CLONES, REPLAY_DEVICE_PREFIX, REPLAY_LOOP, REPLAY_SPEED, expand, is_repo_csv,
+)
+from internal.shared.serial_manager import SessionConflict
+from internal.shared.replay_manager import ReplayConflict
+from internal.shared.timeutil import parse_iso_ns, from_epoch_ns
+from internal.shared import metrics
+from internal.shared.press_sim import PressSim, SENSORS as SIM_SENSORS
+from internal.shared.downsample import bucket_aggregate, lttb
+from internal.sensor.repository.csv_store import tail_lines
+from internal.sensor.repository.recent_cache import SNAPSHOT_S, SNAPSHOT_POINTS, SNAPSHOT_TTL_S
 
 router = APIRouter()
 debug = APIRouter()
-def _to_float(v):
-    try:
-        return float(v)
-    except Exception:
-        return float("nan")
 
 # =============== opcional (serial real) ===============
-try:
-    import serial  # pip install pyserial
-except Exception:
-    serial = None
-
 try:
     from serial.tools import list_ports
 except Exception:
     list_ports = None
 # =============================================================================
-# WS: assinatura por device + broadcast
+# WS: assinatura por device + broadcast (fan-out não bloqueante em ws_hub)
 # =============================================================================
-_clients_all = set()
-_subs = defaultdict(set)
-_ws_state = {} 
-
-MAX_FPS = 20          # máx 20 envios/s por cliente
-MIN_DT = 1.0 / MAX_FPS
-
-async def _safe_send(ws: WebSocket, payload: dict):
-    st = _ws_state.get(ws)
-    if not st:  # já desconectou
-        return
-    # rate limit simples
-    now = monotonic()
-    wait = max(0.0, MIN_DT - (now - st["last_sent"]))
-    if wait:
-        await asyncio.sleep(wait)
-
-    async with st["lock"]:
-        if ws.client_state.name != "CONNECTED":
-            return
-        try:
-            await ws.send_json(payload)
-            st["last_sent"] = monotonic()
-        except Exception:
-            # desconectou ou erro de envio
-            await _cleanup_ws(ws)
-async def _heartbeat(ws: WebSocket):
-    try:
-        while True:
-            await asyncio.sleep(30)
-            await _safe_send(ws, {"type": "keepalive"})
-    except asyncio.CancelledError:
-        pass
-
-async def _cleanup_ws(ws: WebSocket):
-    _clients_all.discard(ws)
-    for s in _subs.values():
-        s.discard(ws)
-    task = _ws_state.pop(ws, {}).get("hb_task")
-    if task:
-        task.cancel()
-
-async def _broadcast(msg: dict):
-    did = (msg.get("reading") or {}).get("device_id") or msg.get("device_id")
-    targets = set(_clients_all)
-    if did and did in _subs:
-        targets |= _subs[did]
-
-    # Envia com _safe_send (lock + rate limit)
-    to_cleanup = []
-    for ws in list(targets):
-        try:
-            await _safe_send(ws, msg)   # <- manda dict; _safe_send já usa send_json
-        except Exception:
-            to_cleanup.append(ws)
-
-    for ws in to_cleanup:
-        await _cleanup_ws(ws)
+_broadcast = ws_hub.broadcast
 
 @router.get("/serial/ports")
 async def serial_list_ports():
@@ -122,19 +65,29 @@ async def serial_list_ports():
 @router.websocket("/sensor/ws")
 async def ws_handler(ws: WebSocket):
     await ws.accept()
-    _ws_state[ws] = {"lock": asyncio.Lock(), "last_sent": 0.0, "hb_task": None}
 
     q = ws.query_params.get("device_id")
-    if q:
-        for did in q.split(","):
-            _subs[did.strip()].add(ws)
-        await _safe_send(ws, {"status": "connected", "filter": q})
-    else:
-        _clients_all.add(ws)
-        await _safe_send(ws, {"status": "connected", "filter": "all"})
-
-    # heartbeat em task separada
-    _ws_state[ws]["hb_task"] = asyncio.create_task(_heartbeat(ws))
+    devices = [did.strip() for did in q.split(",") if did.strip()] if q else None
+    # ?format=bin -> schema + frames empacotados (ver binary_protocol)
+    binary = (ws.query_params.get("format") or "json").lower() in ("bin", "binary")
+    shards = ws.app.state.shards
+    # com shards o estado do gêmeo vem por RPC, antes do register: um delta que sair
+    # nesse meio-tempo se perde, e o cliente vê base > versão e pede /twin/state?since=
+    twin = await shards.twin_state(devices=devices) if shards is not None else None
+    # fila de saída + task de envio por cliente; heartbeat incluso
+    ws_hub.register(ws, devices, binary=binary)
+    ws_hub.send_to(ws, {"status": "connected", "filter": q if devices else "all"})
+    # histórico recente da memória antes do 1º frame ao vivo (?snapshot=<s>, 0 desliga)
+    try:
+        seconds = float(ws.query_params.get("snapshot", SNAPSHOT_S))
+    except ValueError:
+        seconds = SNAPSHOT_S
+    if seconds > 0:
+        ws_hub.send_encoded(ws, _snapshot_text(ws.app.state.repo.recent, devices, seconds))
+    # estado completo do gêmeo: os deltas "twin" seguintes valem a partir desta versão
+    if twin is None:
+        twin = ws.app.state.twin.state(devices=devices)
+    ws_hub.send_to(ws, {"event": "twin_state", **twin})
 
     try:
         # Consome frames do cliente (se ele nunca mandar nada, fica só no heartbeat)
@@ -146,13 +99,78 @@ async def ws_handler(ws: WebSocket):
         # Loga se quiser
         pass
     finally:
-        await _cleanup_ws(ws)
+        await ws_hub.cleanup(ws)
+
+_snapshots = {}   # (devices, seconds) -> (monotonic, texto)
+
+def _snapshot_text(recent, devices, seconds: float) -> str:
+    """
+    {"event":"snapshot","window_s":s,"devices":{dev:{sensor:{"unit","ts":[epoch_s],"value":[..]}}}}
+    Montado no event loop (sem await: nenhum frame ao vivo entra antes dele na fila do
+    cliente), com no máx. SNAPSHOT_POINTS pontos por série; o texto é reusado por
+    SNAPSHOT_TTL_S para uma rajada de reconexões serializar uma vez só.
+    """
+    key = (tuple(devices) if devices else None, seconds)
+    now = time.monotonic()
+    hit = _snapshots.get(key)
+    if hit is not None and now - hit[0] < SNAPSHOT_TTL_S:
+        return hit[1]
+
+    since = int((time.time() - seconds) * 1e9)
+    out = {}
+    for dev in devices or recent.devices():
+        series = {}
+        for sensor in recent.sensors(dev):
+            ts, values, unit = recent.read(dev, sensor, since)
+            if len(ts) > SNAPSHOT_POINTS:
+                ts, values = lttb(ts, values, SNAPSHOT_POINTS)
+            if len(ts):
+                series[sensor] = {"unit": unit, "ts": (ts / 1e9).tolist(), "value": values.tolist()}
+        if series:
+            out[dev] = series
+    text = ws_hub.encode({"event": "snapshot", "window_s": seconds, "devices": out})
+    if len(_snapshots) > 256:
+        _snapshots.clear()
+    _snapshots[key] = (now, text)
+    return text
+
+@router.get("/sensor/ws/stats")
+async def ws_stats():
+    """Métricas do fan-out: filas por cliente, conflação, descartes, downgrades e quedas por lentidão."""
+    return ws_hub.stats()
 
 # =============================================================================
-# FAKE: start/stop (thread que gera leituras, persiste e faz broadcast)
+# FAKE: start/stop (thread que gera leituras e ingere; o usecase faz o broadcast)
+#   model="random"  -> ruído uniforme em volta de constantes (1 device, thread)
+#   model="physics" -> N prensas simuladas (PressSim) em lockstep (task no event loop)
 # =============================================================================
 _fake_thread = None
 _fake_stop_event = None
+_fake_task = None
+
+def _fake_running():
+    return bool((_fake_thread and _fake_thread.is_alive()) or (_fake_task and not _fake_task.done()))
+
+async def _fake_physics(device_ids, period: float, usecase, seed=None):
+    """Um tick = sim.step(period) para todas as prensas + um frame por device no ingest normal."""
+    print(f"[fake] physics iniciado devices={len(device_ids)} period={period}s")
+    sim = PressSim(len(device_ids), seed=seed)
+    nxt = time.monotonic()
+    try:
+        while True:
+            vals = sim.step(period)
+            now = datetime.now(timezone.utc)
+            cols = [(s, u, vals[s].tolist()) for s, u in SIM_SENSORS]
+            await asyncio.gather(*(
+                usecase.ingest_batch([Reading(device_id=did, sensor=s, value=col[i], unit=u, ts=now) for s, u, col in cols])
+                for i, did in enumerate(device_ids)))
+            # atrasou (ingest mais lento que o tick): segue do agora, sem rajada para alcançar
+            nxt = max(nxt + period, time.monotonic())
+            await asyncio.sleep(nxt - time.monotonic())
+    except asyncio.CancelledError:
+        pass
+    finally:
+        print("[fake] parado")
 
 def _fake_loop(device_id: str, period: float, loop: asyncio.AbstractEventLoop, usecase):
     print(f"[fake] iniciado device={device_id} period={period}s")
@@ -184,178 +202,102 @@ def _fake_loop(device_id: str, period: float, loop: asyncio.AbstractEventLoop, u
             # persistência primeiro
             now = datetime.now(timezone.utc)
             readings = (
-                SensorReading(device_id=device_id, sensor="temperature", value=float(t_val), unit="C",   ts=now),
-                SensorReading(device_id=device_id, sensor="pressure",    value=float(p_val), unit="kPa", ts=now),
-                SensorReading(device_id=device_id, sensor="distance",    value=float(d_val), unit="mm",  ts=now),
-                SensorReading(device_id=device_id, sensor="ir_bread",    value=1.0 if ir_pao else 0.0,  unit=None, ts=now),
-                SensorReading(device_id=device_id, sensor="ir_hand",     value=1.0 if ir_mao else 0.0,  unit=None, ts=now),
+                Reading(device_id=device_id, sensor="temperature", value=float(t_val), unit="C",   ts=now),
+                Reading(device_id=device_id, sensor="pressure",    value=float(p_val), unit="kPa", ts=now),
+                Reading(device_id=device_id, sensor="distance",    value=float(d_val), unit="mm",  ts=now),
+                Reading(device_id=device_id, sensor="ir_bread",    value=1.0 if ir_pao else 0.0,  unit=None, ts=now),
+                Reading(device_id=device_id, sensor="ir_hand",     value=1.0 if ir_mao else 0.0,  unit=None, ts=now),
             )
-            for r in readings:
-                asyncio.run_coroutine_threadsafe(usecase.ingest(r), loop).result(timeout=2)
-
-            # broadcast único
-            payload = {
-                "event": "ingest",
-                "reading": {
-                    "device_id": device_id,
-                    "temperature": t_val,
-                    "pressure": p_val,
-                    "distance": d_val,
-                    "ir_bread": ir_pao,
-                    "ir_hand":  ir_mao,
-                },
-            }
-            asyncio.run_coroutine_threadsafe(_broadcast(payload), loop).result()
+            # persiste + broadcast (usecase.broadcaster) num único hop
+            asyncio.run_coroutine_threadsafe(usecase.ingest_batch(readings), loop).result(timeout=2)
             time.sleep(period)
     finally:
         print("[fake] parado")
 
 @router.post("/fake/start")
 async def fake_start(request: Request, body: dict = Body(default={"device_id":"sim-arduino-01","period":1.0})):
-    global _fake_thread, _fake_stop_event
-    if _fake_thread and _fake_thread.is_alive():
+    """
+    body: device_id, period (s), model ("random" | "physics"); com physics também
+    count (N prensas: <device_id>-0000..) e seed.
+    """
+    global _fake_thread, _fake_stop_event, _fake_task
+    if _fake_running():
         raise HTTPException(409, "Fake já em execução.")
+    cluster = request.app.state.cluster
+    if cluster is not None and any(w["info"].get("fake") for w in cluster.peers()):
+        raise HTTPException(409, "Fake já em execução em outro worker.")
     usecase = request.app.state.usecase
     device_id = (body.get("device_id") or "sim-arduino-01").strip()
     period = float(body.get("period") or 1.0)
+    model = (body.get("model") or "random").lower()
+    if model == "physics":
+        count = int(body.get("count") or 1)
+        if count < 1:
+            raise HTTPException(400, "'count' deve ser >= 1.")
+        ids = [device_id] if count == 1 else [f"{device_id}-{i:04d}" for i in range(count)]
+        _fake_task = asyncio.create_task(_fake_physics(ids, period, usecase, body.get("seed")))
+        _report(request)
+        return {"ok": True, "mode": "fake", "model": model, "device_id": device_id, "count": count, "period": period}
+    if model != "random":
+        raise HTTPException(400, "'model' deve ser 'random' ou 'physics'.")
     loop = asyncio.get_running_loop()
     _fake_stop_event = threading.Event()
     _fake_thread = threading.Thread(target=_fake_loop, args=(device_id, period, loop, usecase), daemon=True)
     _fake_thread.start()
-    return {"ok": True, "mode": "fake", "device_id": device_id, "period": period}
+    _report(request)
+    return {"ok": True, "mode": "fake", "model": model, "device_id": device_id, "period": period}
 
-@router.post("/fake/stop")
 async def fake_stop():
-    global _fake_thread, _fake_stop_event
-    if not _fake_thread or not _fake_thread.is_alive():
+    """Para o fake deste processo (rota /fake/stop, shutdown e comando "fake_stop" do cluster)."""
+    global _fake_thread, _fake_stop_event, _fake_task
+    if not _fake_running():
         return {"ok": True, "status": "fake já parado"}
-    _fake_stop_event.set()
-    _fake_thread.join(timeout=2.0)
-    _fake_thread = None
+    if _fake_task is not None:
+        _fake_task.cancel()
+        try:
+            await _fake_task
+        except asyncio.CancelledError:
+            pass
+        _fake_task = None
+    if _fake_thread is not None:
+        _fake_stop_event.set()
+        _fake_thread.join(timeout=2.0)
+        _fake_thread = None
     return {"ok": True, "stopped": True}
 
-# =============================================================================
-# SERIAL REAL: start/stop (thread que lê JSON por linha, persiste e broadcast)
-# =============================================================================
-_serial_thread = None
-_serial_stop_event = None
-_serial_port_opened = None
-
-def _serial_loop(port: str, baud: int, device_id: str, loop: asyncio.AbstractEventLoop, usecase):
-    global _serial_port_opened
-    try:
-        ser = serial.Serial(port=port, baudrate=baud, timeout=1)
-        _serial_port_opened = port
-        print(f"[serial] aberto {port}@{baud}")
-    except Exception as e:
-        _serial_port_opened = None
-        print(f"[serial] erro abrindo {port}: {e}")
-        return
-
-    try:
-        while not _serial_stop_event.is_set():
-            line = ser.readline()
-            if not line:
-                continue
-
-            try:
-                data = json.loads(line.decode(errors="ignore").strip())
-            except Exception:
-                continue
-
-            # PRESSÃO: prioriza kPa; se vier em volts, converte
-            kpa = None
-            if "pressao_kPa" in data:
-                kpa = _to_float(data["pressao_kPa"])
-            elif "pressao_kpa" in data:
-                kpa = _to_float(data["pressao_kpa"])
-            elif "pressure" in data:
-                kpa = _to_float(data["pressure"])
-            elif "pressao_volts" in data:
-                v = _to_float(data["pressao_volts"])
-                if not math.isnan(v):
-                    kpa = CAL_PRESSURE.apply(v)
-
-            temp = data.get("temperatura_C") or data.get("temperature")
-            dist = data.get("distancia_mm") or data.get("distance")
-            if dist is None:
-                dist = data.get("distance")
-            if dist is None:
-                dist = -1.0
-            ir_bread = data.get("IR_pao") if "IR_pao" in data else data.get("ir_bread")
-            ir_hand  = data.get("IR_mao") if "IR_mao" in data else data.get("ir_hand")
+@router.post("/fake/stop")
+async def fake_stop_route(request: Request):
+    cluster = request.app.state.cluster
+    if not _fake_running() and cluster is not None:
+        pids = [w["pid"] for w in cluster.peers() if w["info"].get("fake")]
+        if pids:
+            cluster.ctl("fake_stop")
+            return {"ok": True, "stopped": True, "workers": pids}
+    out = await fake_stop()
+    _report(request)
+    return out
 
-            # persistência primeiro
-            now = datetime.now(timezone.utc)
-            try:
-                if temp is not None:
-                    asyncio.run_coroutine_threadsafe(
-                        usecase.ingest(SensorReading(device_id=device_id, sensor="temperature",
-                                                     value=float(_to_float(temp)), unit="C", ts=now)),
-                        loop
-                    ).result(timeout=2)
-                if kpa is not None and not math.isnan(kpa):
-                    asyncio.run_coroutine_threadsafe(
-                        usecase.ingest(SensorReading(device_id=device_id, sensor="pressure",
-                                                     value=float(kpa), unit="kPa", ts=now)),
-                        loop
-                    ).result(timeout=2)
-                if dist is not None:
-                    asyncio.run_coroutine_threadsafe(
-                        usecase.ingest(SensorReading(device_id=device_id, sensor="distance",
-                                                     value=float(_to_float(dist)), unit="mm", ts=now)),
-                        loop
-                    ).result(timeout=2)
-                if ir_bread is not None:
-                    v = _to_float(ir_bread)
-                    asyncio.run_coroutine_threadsafe(
-                        usecase.ingest(SensorReading(device_id=device_id, sensor="ir_bread",
-                                                    value=1.0 if v > 0.5 else 0.0, unit=None, ts=now)),
-                        loop
-                    ).result(timeout=2)
-
-                if ir_hand is not None:
-                    v = _to_float(ir_hand)
-                    asyncio.run_coroutine_threadsafe(
-                        usecase.ingest(SensorReading(device_id=device_id, sensor="ir_hand",
-                                                    value=1.0 if v > 0.5 else 0.0, unit=None, ts=now)),
-                        loop
-                    ).result(timeout=2)
-            except Exception as e:
-                print("[serial] erro persistindo leitura:", e)
-
-            # broadcast único
-            reading = {
-                "device_id": device_id,
-                **({"temperature": temp} if temp is not None else {}),
-                **({"pressao_kPa": kpa} if kpa is not None else {}),
-                **({"distance": dist} if dist is not None else {}),
-                **({"ir_bread": ir_bread} if ir_bread is not None else {}),
-                **({"ir_hand":  ir_hand } if ir_hand  is not None else {}),
-            }
-            try:
-                asyncio.run_coroutine_threadsafe(
-                    _broadcast({"event": "ingest", "reading": reading}), loop
-                ).result(timeout=2)
-            except Exception as e:
-                print("[serial] erro no broadcast:", e)
+def _report(request: Request):
+    """Com SHARED_STATE: publica já as fontes deste worker (sem esperar o próximo SHARED_REPORT_S)."""
+    cluster = request.app.state.cluster
+    if cluster is not None:
+        cluster.report()
 
-    finally:
-        try:
-            ser.close()
-        except Exception:
-            pass
-        _serial_port_opened = None
-        print("[serial] fechado")
+def worker_sources(app) -> dict:
+    """Fontes rodando neste processo: base do /status e o que vai para a tabela do cluster."""
+    return {
+        "fake": _fake_running(),
+        "serial": {s["port"]: s["device_id"] for s in app.state.serial_manager.sessions()["sessions"] if s["running"]},
+        "replays": app.state.replay_manager.summary(),
+    }
 
+# =============================================================================
+# SERIAL REAL: uma sessão por porta (SerialSessionManager em app.state), ingest compartilhado
+# =============================================================================
 @router.post("/serial/start")
 async def serial_start(request: Request, body: dict = Body(...)):
-    if serial is None:
-        raise HTTPException(500, "pyserial não disponível (pip install pyserial).")
-
-    global _serial_thread, _serial_stop_event
-    if _serial_thread and _serial_thread.is_alive():
-        raise HTTPException(409, f"Serial já rodando em {_serial_port_opened}.")
+    if serial_asyncio is None:
+        raise HTTPException(500, "pyserial-asyncio não disponível (pip install pyserial-asyncio).")
 
     port = (body.get("port") or "").strip()
     if not port:
@@ -363,48 +305,510 @@ async def serial_start(request: Request, body: dict = Body(...)):
     baud = int(body.get("baudrate") or 9600)
     device_id = (body.get("device_id") or "sim-arduino-01").strip()
 
-    loop = asyncio.get_running_loop()
-    usecase = request.app.state.usecase
-    _serial_stop_event = threading.Event()
-    _serial_thread = threading.Thread(target=_serial_loop, args=(port, baud, device_id, loop, usecase), daemon=True)
-    _serial_thread.start()
+    cluster = request.app.state.cluster
+    for w in cluster.peers() if cluster is not None else ():
+        ser = w["info"].get("serial") or {}
+        if port in ser or device_id in ser.values():
+            raise HTTPException(409, f"Serial {port} / device {device_id} já em uso no worker {w['pid']}.")
+    try:
+        request.app.state.serial_manager.start(port, baud, device_id)
+    except SessionConflict as e:
+        raise HTTPException(409, str(e))
+    _report(request)
     return {"ok": True, "mode": "serial", "port": port, "baudrate": baud, "device_id": device_id}
 
 @router.post("/serial/stop")
-async def serial_stop():
-    global _serial_thread, _serial_stop_event
-    if not _serial_thread or not _serial_thread.is_alive():
+async def serial_stop(request: Request, body: dict = Body(default={})):
+    """Para a sessão de 'port' ou 'device_id'; sem nenhum dos dois, para todas."""
+    mgr = request.app.state.serial_manager
+    port = (body.get("port") or "").strip() or None
+    device_id = (body.get("device_id") or "").strip() or None
+    ports = mgr.find(port, device_id)
+    if not ports:
+        cluster = request.app.state.cluster
+        remote = {}
+        for w in cluster.peers() if cluster is not None else ():
+            for p, did in (w["info"].get("serial") or {}).items():
+                if (port is None or p == port) and (device_id is None or did == device_id):
+                    remote[p] = w["pid"]
+        if remote:
+            cluster.ctl("serial_stop", port=port, device_id=device_id)
+            return {"ok": True, "stopped": True, "ports": list(remote), "workers": sorted(set(remote.values()))}
         return {"ok": True, "status": "serial já parado"}
-    _serial_stop_event.set()
-    _serial_thread.join(timeout=2.0)
-    _serial_thread = None
-    return {"ok": True, "stopped": True}
+    for p in ports:
+        await mgr.stop(p)
+    _report(request)
+    return {"ok": True, "stopped": True, "ports": ports}
+
+@router.get("/serial/sessions")
+async def serial_sessions(request: Request):
+    """Estado por sessão: conexão, frames/s, linhas, erros de parse, reconexões, último erro."""
+    return request.app.state.serial_manager.sessions()
+
+def _live_devices(app) -> dict:
+    """device -> fonte ao vivo que grava nele agora (replay/serial deste e, com SHARED_STATE, dos outros workers)."""
+    workers = [(None, worker_sources(app))]
+    if app.state.cluster is not None:
+        workers += [(w["pid"], w["info"]) for w in app.state.cluster.peers()]
+    out = {}
+    for pid, src in workers:
+        where = f" no worker {pid}" if pid else ""
+        for rid, rep in (src.get("replays") or {}).items():
+            for d in rep.get("devices", ()):
+                out[d] = f"replay {rid}{where}"
+        for port, did in (src.get("serial") or {}).items():
+            out[did] = f"serial {port}{where}"
+    return out
 
-@router.get("/status")
-async def get_status():
-    if _fake_thread and _fake_thread.is_alive():
+def _check_backfill_targets(request: Request, devices):
+    live = _live_devices(request.app)
+    for d in devices:
+        if d in live:
+            raise HTTPException(409, f"device {d} em uso ({live[d]}); backfill gravaria no meio das leituras ao vivo")
+
+@router.post("/replay/backfill")
+async def replay_backfill(request: Request, body: dict = Body(...)):
+    """
+    Replay sem timing direto no repositório (ts originais), para backfill/benchmark.
+      {"files": "data/*__*.csv", "clones": 1, "device_prefix": "replay-", "shift_s": 0}
+      {"path": "gravacao.csv", "device_id": "arduino-01", "start": "2025-01-01T08:00:00Z"}
+    Responde com linhas/s alcançadas. 409 se um device de destino está num replay/serial
+    rodando ou se os dados começam antes do fim do que já está gravado (CSV fora de ordem).
+    """
+    repo = request.app.state.repo
+    loop = asyncio.get_running_loop()
+    files = expand(body["files"]) if body.get("files") else []
+    if files:
+        if not all(is_repo_csv(f) for f in files):
+            raise HTTPException(400, "'files' deve listar só CSVs do repositório (ts,value,unit)")
+        session = ReplaySession.from_spec(
+            files,
+            clones=int(body.get("clones", 1)),
+            device_prefix=body.get("device_prefix", REPLAY_DEVICE_PREFIX),
+        )
+        _check_backfill_targets(request, session.devices())
+        try:
+            return await loop.run_in_executor(
+                None, session.backfill, repo, int(float(body.get("shift_s", 0)) * 1e9))
+        except ValueError as e:
+            raise HTTPException(409, str(e))
+
+    path = body.get("path")
+    if not path or not os.path.isfile(path):
+        raise HTTPException(400, "informe 'files' (CSVs do repositório) ou 'path' (gravação do firmware)")
+    start_ns = None
+    if body.get("start") is not None:
+        start_ns = parse_iso_ns(str(body["start"]))
+        if start_ns is None:
+            raise HTTPException(400, "start inválido (ISO-8601)")
+    device_id = (body.get("device_id") or os.getenv("SERIAL_DEVICE_ID", "arduino-01")).strip()
+    _check_backfill_targets(request, (device_id,))
+    try:
+        return await loop.run_in_executor(None, backfill_file, path, repo, device_id, start_ns)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+
+def _get_replay(request: Request, replay_id):
+    """
+    (replay deste processo, None) ou, com SHARED_STATE, (None, (pid, id)) quando o replay
+    roda em outro worker: a rota valida o pedido e repassa com _forward_replay.
+    """
+    mgr = request.app.state.replay_manager
+    try:
+        return mgr.get(replay_id), None
+    except LookupError as e:
+        err = e
+    cluster = request.app.state.cluster
+    if cluster is not None:
+        remote = [(w["pid"], rid) for w in cluster.peers() for rid in (w["info"].get("replays") or {})
+                  if replay_id is None or rid == replay_id]
+        # sem id: só se o único replay rodando no cluster é de outro worker
+        if remote and (replay_id is not None or (len(remote) == 1 and not mgr.running())):
+            return None, remote[0]
+    raise HTTPException(404, str(err))
+
+def _forward_replay(request: Request, remote, op: str, **args):
+    pid, rid = remote
+    request.app.state.cluster.ctl("replay", op=op, id=rid, **args)
+    return {"ok": True, "id": rid, "worker": pid, "forwarded": op}
+
+async def replay_ctl(app, op: str, id=None, **args):
+    """Comando "replay" do cluster: a operação de /replay/* no worker que roda o replay."""
+    mgr = app.state.replay_manager
+    if op == "stop":
+        if id is None:
+            await mgr.stop_all()
+        else:
+            await mgr.stop(id)
+        return
+    try:
+        rp = mgr.get(id)
+    except LookupError:
+        return      # já terminou
+    if op == "pause":
+        if args.get("paused", True):
+            rp.clock.pause()
+        else:
+            rp.clock.resume()
+    elif op == "seek":
+        if args.get("ts_ns") is not None:
+            t0 = rp.t0_ns() if isinstance(rp, ReplaySession) else None
+            if t0 is None:
+                raise ValueError(f"replay {id}: ts só vale para sessões do repositório")
+            rp.seek((args["ts_ns"] - t0) / 1e9)
+        else:
+            rp.seek(args["offset_s"])
+    elif op == "speed":
+        rp.clock.set_speed(args["speed"])
+
+@router.post("/replay/start")
+async def replay_start(request: Request, body: dict = Body(...)):
+    """
+    Inicia um replay dentro do servidor (sem reiniciar: WS e _last continuam).
+      {"files": "data/*__*.csv", "speed": 2, "loop": true, "clones": 1, "device_prefix": "replay-", "id": "r1"}
+      {"path": "gravacao.csv", "device_id": "arduino-01", "speed": 1}
+    """
+    mgr = request.app.state.replay_manager
+    cluster = request.app.state.cluster
+    busy = None
+    if cluster is not None:
+        # ids e devices dos replays/seriais dos outros workers (tabela atrasada até SHARED_REPORT_S)
+        for w in cluster.peers():
+            if body.get("id") is not None and body["id"] in (w["info"].get("replays") or {}):
+                raise HTTPException(409, f"replay {body['id']} já está rodando no worker {w['pid']}")
+        busy = {d: v for d, v in _live_devices(request.app).items() if " no worker " in v}
+    try:
+        rid = mgr.start(
+            files=body.get("files"),
+            path=body.get("path"),
+            device_id=body.get("device_id"),
+            speed=body.get("speed", REPLAY_SPEED),
+            loop_=bool(body.get("loop", REPLAY_LOOP)),
+            clones=int(body.get("clones", REPLAY_CLONES)),
+            device_prefix=body.get("device_prefix", REPLAY_DEVICE_PREFIX),
+            replay_id=body.get("id"),
+            busy=busy,
+        )
+    except ReplayConflict as e:
+        raise HTTPException(409, str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, str(e))
+    _report(request)
+    return {"ok": True, **mgr.status(rid)}
+
+@router.post("/replay/stop")
+async def replay_stop(request: Request, body: dict = Body(default={})):
+    """Para o replay 'id'; sem id, para todos (com SHARED_STATE, de todos os workers)."""
+    mgr = request.app.state.replay_manager
+    cluster = request.app.state.cluster
+    rid = body.get("id")
+    if rid is None:
+        await mgr.stop_all()
+        if cluster is not None:
+            cluster.ctl("replay", op="stop")
+        _report(request)
+        return {"ok": True, "stopped": "all"}
+    if not await mgr.stop(rid):
+        _, remote = _get_replay(request, rid)
+        return _forward_replay(request, remote, "stop")
+    _report(request)
+    return {"ok": True, "stopped": rid}
+
+@router.post("/replay/pause")
+async def replay_pause(request: Request, body: dict = Body(default={})):
+    """{"id": ..., "paused": true|false} (padrão: pausa)."""
+    rp, remote = _get_replay(request, body.get("id"))
+    if remote:
+        return _forward_replay(request, remote, "pause", paused=bool(body.get("paused", True)))
+    if body.get("paused", True):
+        rp.clock.pause()
+    else:
+        rp.clock.resume()
+    return {"ok": True, **rp.status()}
+
+@router.post("/replay/resume")
+async def replay_resume(request: Request, body: dict = Body(default={})):
+    rp, remote = _get_replay(request, body.get("id"))
+    if remote:
+        return _forward_replay(request, remote, "pause", paused=False)
+    rp.clock.resume()
+    return {"ok": True, **rp.status()}
+
+@router.post("/replay/seek")
+async def replay_seek(request: Request, body: dict = Body(...)):
+    """
+    {"id": ..., "offset_s": 120} -> segundos desde o início da gravação;
+    {"id": ..., "ts": "2025-08-19T18:30:00Z"} -> só para sessões do repositório.
+    """
+    rp, remote = _get_replay(request, body.get("id"))
+    if body.get("ts") is not None:
+        ns = parse_iso_ns(str(body["ts"]))
+        if remote and ns is not None:
+            return _forward_replay(request, remote, "seek", ts_ns=ns)
+        t0 = rp.t0_ns() if isinstance(rp, ReplaySession) else None
+        if t0 is None or ns is None:
+            raise HTTPException(400, "ts só vale para sessões do repositório, em ISO-8601")
+        offset = (ns - t0) / 1e9
+    else:
+        try:
+            offset = float(body["offset_s"])
+        except (KeyError, TypeError, ValueError):
+            raise HTTPException(400, "informe offset_s (número) ou ts")
+    if remote:
+        return _forward_replay(request, remote, "seek", offset_s=offset)
+    rp.seek(offset)
+    return {"ok": True, "offset_s": max(0.0, offset)}
+
+@router.post("/replay/speed")
+async def replay_speed(request: Request, body: dict = Body(...)):
+    rp, remote = _get_replay(request, body.get("id"))
+    try:
+        speed = float(body["speed"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(400, "informe speed (número)")
+    if not (0 < speed < math.inf):
+        raise HTTPException(400, "speed deve ser finito e > 0")
+    if remote:
+        return _forward_replay(request, remote, "speed", speed=speed)
+    rp.clock.set_speed(speed)
+    return {"ok": True, **rp.status()}
+
+@router.get("/replay/status")
+async def replay_status(request: Request, id: str | None = None):
+    """
+    Posição (s na gravação), atraso vs agenda (lag_s/lag_max_s) e linhas/s por replay.
+    Com SHARED_STATE, replays de outros workers entram com o resumo da tabela (+ "worker").
+    """
+    cluster = request.app.state.cluster
+    remote = {rid: {"id": rid, "running": True, "worker": w["pid"], **rep}
+              for w in (cluster.peers() if cluster is not None else ())
+              for rid, rep in (w["info"].get("replays") or {}).items()}
+    try:
+        out = request.app.state.replay_manager.status(id)
+    except LookupError as e:
+        if id in remote:
+            return remote[id]
+        raise HTTPException(404, str(e))
+    if id is None and remote:
+        out["replays"] += [r for rid, r in remote.items() if rid not in {x["id"] for x in out["replays"]}]
+        out["count"] = len(out["replays"])
+        out["running"] = sum(1 for r in out["replays"] if r["running"])
+    return out
+
+@router.get("/metrics")
+def get_metrics(format: str = "prometheus"):
+    """
+    Latência por estágio (queue, parse, filter, persist, persist_hop, fanout, twin,
+    ingest, line, flush, ws_send), ingest por device e profundidade das filas.
+    ?format=json -> resumo com média/p50/p99 por estágio.
+    """
+    if format == "json":
+        return metrics.summary()
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _source_status(src: dict):
+    if src.get("fake"):
         return {"running": True, "source": "fake"}
-    if _serial_thread and _serial_thread.is_alive():
-        return {"running": True, "source": "serial"}
+    if src.get("serial"):
+        return {"running": True, "source": "serial", "sessions": list(src["serial"])}
+    if src.get("replays"):
+        return {"running": True, "source": "replay", "replays": list(src["replays"])}
+    return None
+
+@router.get("/status")
+async def get_status(request: Request):
+    st = _source_status(worker_sources(request.app))
+    if st is not None:
+        return st
+    # SHARED_STATE: a fonte pode estar em outro worker do uvicorn
+    cluster = request.app.state.cluster
+    for w in cluster.peers() if cluster is not None else ():
+        st = _source_status(w["info"])
+        if st is not None:
+            return {**st, "worker": w["pid"]}
     return {"running": False, "source": None}
 
 @debug.get("/debug/last")
 def debug_last(request: Request, device_id: str = "sim-arduino-01"):
     repo = request.app.state.repo
     out = {}
-    for r in repo.get_all_last(device_id):
+    for r in map(SensorReading.from_reading, repo.get_all_last(device_id)):
         out[r.sensor] = {"ts": r.ts.isoformat(), "value": r.value, "unit": r.unit}
     return out
 
+@debug.get("/debug/repo")
+def debug_repo(request: Request):
+    """Contadores do write-behind do repositório (linhas em buffer, latência de flush, bytes) e do cache recente."""
+    repo = request.app.state.repo
+    return {**repo.stats(), "recent": repo.recent.stats()}
+
+@debug.get("/debug/cluster")
+def debug_cluster(request: Request):
+    """SHARED_STATE: bus (broker, msgs, descartes), tabela compartilhada e fontes de cada worker."""
+    cluster = request.app.state.cluster
+    if cluster is None:
+        raise HTTPException(404, "SHARED_STATE desligado.")
+    return cluster.stats()
+
 @debug.get("/debug/tail")
 def debug_tail(request: Request, device_id: str = "sim-arduino-01", sensor: str = "temperature", n: int = Query(5, ge=1, le=200)):
     repo = request.app.state.repo
     p = repo._csv(device_id, sensor)
     if not os.path.exists(p):
         return {"file": p, "exists": False}
-    with open(p, "r", encoding="utf-8") as f:
-        lines = f.readlines()[-n:]
-    return {"file": p, "exists": True, "last_lines": [ln.rstrip("\n") for ln in lines]}
+    repo.flush()
+    return {"file": p, "exists": True, "last_lines": tail_lines(p, n)}
+
+# =============================================================================
+# HISTÓRICO: faixa de tempo via índice esparso (CSV) ou memmap (colunar)
+# =============================================================================
+def _parse_time_ns(v: str | None, name: str):
+    """Aceita ISO-8601 ou epoch em segundos (int/float)."""
+    if v is None or v == "":
+        return None
+    try:
+        return int(float(v) * 1e9)
+    except OverflowError:   # inf, 1e300
+        ns = None
+    except ValueError:
+        ns = parse_iso_ns(v)
+    if ns is None:
+        raise HTTPException(400, f"'{name}' inválido: use ISO-8601 ou epoch em segundos.")
+    return ns
+
+def _json_float(v):
+    v = float(v)
+    return None if math.isnan(v) or math.isinf(v) else v
+
+@router.get("/sensor/history")
+def sensor_history(
+    request: Request,
+    device_id: str,
+    sensor: str,
+    t_from: str | None = Query(None, alias="from"),
+    t_to: str | None = Query(None, alias="to"),
+    limit: int | None = Query(None, ge=1, le=1_000_000),
+    points: int | None = Query(None, ge=3, le=10_000),
+    bucket: float | None = Query(None, gt=0),
+):
+    """
+    Leituras de (device_id, sensor) entre 'from' e 'to'.
+    Sem 'from' retorna as últimas 'limit' leituras (até 'to'), lidas a partir do fim do arquivo.
+    Downsampling no servidor:
+      - bucket=<s>  -> min/max/mean/last/count por janela de <s> segundos
+      - points=<n>  -> série decimada por LTTB com ~n pontos
+    """
+    if points is not None and bucket is not None:
+        raise HTTPException(400, "Use 'points' ou 'bucket', não ambos.")
+    repo = request.app.state.repo
+    lo = _parse_time_ns(t_from, "from")
+    hi = _parse_time_ns(t_to, "to")
+    if lo is not None and hi is not None and lo > hi:
+        raise HTTPException(400, "'from' deve ser <= 'to'.")
+
+    downsample = points is not None or bucket is not None
+    # sem downsampling o limite padrão protege o payload; com downsampling lê a faixa inteira
+    ts, values, unit = repo.history(device_id, sensor, lo, hi, limit if (limit or downsample) else 1000)
+    out = {"device_id": device_id, "sensor": sensor, "unit": unit or None}
+
+    if bucket is not None:
+        agg = bucket_aggregate(ts, values, int(bucket * 1e9))
+        out.update({
+            "source_count": len(ts),
+            "bucket_s": bucket,
+            "count": len(agg["ts"]),
+            "ts": [from_epoch_ns(t).isoformat() for t in agg["ts"].tolist()],
+            **{k: [_json_float(v) for v in agg[k].tolist()] for k in ("min", "max", "mean", "last")},
+            "n": agg["count"].tolist(),
+        })
+        return out
+
+    if points is not None:
+        src = len(ts)
+        ts, values = lttb(ts, values, points)
+        out.update({"source_count": src, "downsample": "lttb"})
+        ts, values = ts.tolist(), values.tolist()
+
+    out.update({
+        "count": len(ts),
+        "ts": [from_epoch_ns(t).isoformat() for t in ts],
+        "value": [_json_float(v) for v in values],
+    })
+    return out
+
+@router.get("/sensor/recent")
+def sensor_recent(
+    request: Request,
+    device_id: str,
+    sensor: str | None = None,
+    seconds: float | None = Query(None, gt=0),
+    limit: int | None = Query(None, ge=1, le=1_000_000),
+):
+    """
+    Histórico recente da memória (ring buffer por série; não lê os CSVs).
+    Sem 'sensor' retorna todos os sensores do device. 'seconds' corta a janela
+    (até RECENT_WINDOW_S), 'limit' fica com as últimas N leituras.
+    """
+    recent = request.app.state.repo.recent
+    since = int((time.time() - seconds) * 1e9) if seconds else None
+
+    def one(s):
+        ts, values, unit = recent.read(device_id, s, since, limit)
+        return {
+            "unit": unit,
+            "count": len(ts),
+            "ts": [from_epoch_ns(t).isoformat() for t in ts.tolist()],
+            "value": [_json_float(v) for v in values.tolist()],
+        }
+
+    if sensor:
+        return {"device_id": device_id, "sensor": sensor, **one(sensor)}
+    return {"device_id": device_id, "sensors": {s: one(s) for s in recent.sensors(device_id)}}
+
+# =============================================================================
+# TWIN: KPIs e estado do gêmeo, calculados no ingest (usecase.analytics / usecase.twin)
+# =============================================================================
+@router.get("/twin/kpis")
+async def twin_kpis(request: Request, device_id: str | None = None):
+    """
+    Estatísticas por sensor (Welford, min/max, taxa), ciclos da prensa, bordas dos IR e
+    aquecimento; sem device_id retorna todos os devices. async: lê no event loop, onde o
+    estágio de analytics escreve (com INGEST_SHARDS, pergunta aos shards).
+    """
+    shards, analytics = request.app.state.shards, request.app.state.analytics
+    if device_id is None:
+        return {"devices": await shards.kpis() if shards is not None else analytics.kpis()}
+    out = await shards.kpis(device_id) if shards is not None else analytics.kpis(device_id)
+    if out is None:
+        raise HTTPException(404, f"Sem leituras de '{device_id}'.")
+    return out
+
+@router.get("/twin/state")
+async def twin_state(request: Request, device_id: str | None = None, since: int = Query(0, ge=0)):
+    """
+    Estado do gêmeo (internal.sensor.usecase.twin). since=<versão> retorna só os campos
+    alterados depois dela ('full': false); since=0 ou maior que a versão atual -> estado completo.
+    """
+    shards = request.app.state.shards
+    if shards is not None:
+        out = await shards.twin_state(device_id, since)
+        if out is None:
+            raise HTTPException(404, f"Sem leituras de '{device_id}'.")
+        return out
+    twin = request.app.state.twin
+    if device_id is not None and device_id not in twin.devices:
+        raise HTTPException(404, f"Sem leituras de '{device_id}'.")
+    return twin.state(device_id, since)
+
+@router.post("/twin/kpis/reset")
+async def twin_kpis_reset(request: Request, device_id: str | None = None):
+    """Zera os KPIs (de um device ou de todos); a linha de base da distância é recalculada."""
+    shards = request.app.state.shards
+    if shards is not None:
+        await shards.kpis_reset(device_id)
+    else:
+        request.app.state.analytics.reset(device_id)
+    return {"ok": True, "device_id": device_id}
 
 # ---- exporter para outros módulos (ex.: main.py / replayer) ----
 def get_broadcaster():
@@ -0,0 +1,286 @@
+# internal/sensor/delivery/ws_hub.py
+"""
+Fan-out dos WebSockets: cada cliente tem uma fila de saída limitada e uma task
+de envio própria. O broadcast só enfileira (não bloqueia) e conflaciona por
+device e evento: se o cliente está atrasado, fica só a msg mais recente de cada par.
+Cada mensagem é serializada UMA vez (internal.shared.codec) e o mesmo texto é
+compartilhado por todos os clientes; clientes ?format=bin recebem o frame
+empacotado (binary_protocol), também codificado uma única vez.
+"""
+from collections import OrderedDict, defaultdict, deque
+from time import monotonic, perf_counter
+import asyncio
+import os
+
+from fastapi import WebSocket
+
+from internal.shared import codec, metrics
+from internal.sensor.delivery import binary_protocol
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+MAX_FPS             = float(os.getenv("WS_MAX_FPS", "20"))          # máx atualizações/s por device por cliente
+MIN_FPS             = float(os.getenv("WS_MIN_FPS", "1"))           # piso do downgrade antes de derrubar o cliente
+QUEUE_MAX           = int(os.getenv("WS_QUEUE_MAX", "64"))          # msgs não-conflacionáveis pendentes por cliente
+SEND_TIMEOUT_S      = float(os.getenv("WS_SEND_TIMEOUT_S", "5.0"))  # send travado além disso -> derruba
+SLOW_TICKS          = int(os.getenv("WS_SLOW_TICKS", "20"))         # ticks seguidos acima do orçamento -> downgrade
+HEARTBEAT_S         = float(os.getenv("WS_HEARTBEAT_S", "30"))
+
+MIN_DT = 1.0 / MAX_FPS
+_M_SEND = metrics.stage("ws_send")
+_KEEPALIVE = codec.dumps({"type": "keepalive"})
+
+_clients_all = set()
+_subs = defaultdict(set)
+_ws_state = {}
+
+_metrics = {
+    "broadcasts": 0,
+    "enqueued": 0,
+    "conflated": 0,          # msgs substituídas por uma mais nova do mesmo device antes de sair
+    "dropped": 0,            # msgs descartadas por fila cheia
+    "sent": 0,
+    "send_errors": 0,
+    "downgrades": 0,
+    "clients_dropped_slow": 0,
+    "broadcast_us_last": 0.0,
+    "broadcast_us_max": 0.0,
+    "encode_us_total": 0.0,
+}
+
+
+class _WsClient:
+    """Estado de um cliente: últimas msgs (já serializadas) por device (conflação) + fila FIFO limitada."""
+    __slots__ = ("ws", "binary", "latest", "queue", "wake", "sender", "hb_task", "min_dt",
+                 "last_sent", "slow_ticks", "sent", "conflated", "dropped", "downgraded")
+
+    def __init__(self, ws: WebSocket, binary: bool = False):
+        self.ws = ws
+        self.binary = binary
+        self.latest = OrderedDict()
+        self.queue = deque()
+        self.wake = asyncio.Event()
+        self.sender = None
+        self.hb_task = None
+        self.min_dt = MIN_DT
+        self.last_sent = 0.0
+        self.slow_ticks = 0
+        self.sent = 0
+        self.conflated = 0
+        self.dropped = 0
+        self.downgraded = 0
+
+    def offer(self, key, data):
+        """Enfileira (str ou bytes) sem bloquear. key=(evento, device_id) conflaciona; key=None vai para a fila FIFO."""
+        if key is None:
+            if len(self.queue) >= QUEUE_MAX:
+                self.queue.popleft()
+                self.dropped += 1
+                _metrics["dropped"] += 1
+            self.queue.append(data)
+        else:
+            if key in self.latest:
+                self.conflated += 1
+                _metrics["conflated"] += 1
+            self.latest[key] = data
+        _metrics["enqueued"] += 1
+        self.wake.set()
+
+    def depth(self):
+        return len(self.queue) + len(self.latest)
+
+
+async def _send(c: _WsClient, data):
+    t0 = perf_counter()
+    if isinstance(data, bytes):
+        await asyncio.wait_for(c.ws.send_bytes(data), timeout=SEND_TIMEOUT_S)
+    else:
+        await asyncio.wait_for(c.ws.send_text(data), timeout=SEND_TIMEOUT_S)
+    _M_SEND.observe(perf_counter() - t0)
+    c.sent += 1
+    _metrics["sent"] += 1
+
+async def _sender(c: _WsClient):
+    """Um tick a cada min_dt: drena a fila e 1 msg (a mais recente) por device."""
+    try:
+        while True:
+            await c.wake.wait()
+            c.wake.clear()
+            wait = c.min_dt - (monotonic() - c.last_sent)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if c.ws.client_state.name != "CONNECTED":
+                break
+
+            t0 = monotonic()
+            while c.queue:
+                await _send(c, c.queue.popleft())
+            batch, c.latest = c.latest, OrderedDict()
+            for data in batch.values():
+                await _send(c, data)
+            c.last_sent = monotonic()
+
+            # cliente lento: o tick não coube no orçamento de min_dt
+            if c.last_sent - t0 > c.min_dt:
+                c.slow_ticks += 1
+                if c.slow_ticks >= SLOW_TICKS:
+                    c.slow_ticks = 0
+                    if c.min_dt >= 1.0 / MIN_FPS:
+                        _metrics["clients_dropped_slow"] += 1
+                        break
+                    c.min_dt = min(c.min_dt * 2, 1.0 / MIN_FPS)
+                    c.downgraded += 1
+                    _metrics["downgrades"] += 1
+            else:
+                c.slow_ticks = 0
+            if c.queue or c.latest:
+                c.wake.set()
+    except asyncio.CancelledError:
+        return
+    except asyncio.TimeoutError:
+        _metrics["clients_dropped_slow"] += 1
+    except Exception:
+        # desconectou ou erro de envio
+        _metrics["send_errors"] += 1
+    await _drop(c.ws)
+
+async def _heartbeat(c: _WsClient):
+    try:
+        while True:
+            await asyncio.sleep(HEARTBEAT_S)
+            c.offer(None, _KEEPALIVE)
+    except asyncio.CancelledError:
+        pass
+
+async def _drop(ws: WebSocket):
+    c = _ws_state.get(ws)
+    await cleanup(ws)
+    if c is not None:
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+# =============================================================================
+# API usada pelo http_handler
+# =============================================================================
+def register(ws: WebSocket, devices=None, binary: bool = False):
+    """
+    Registra um cliente já aceito (devices=None -> recebe tudo) e inicia as tasks de envio.
+    binary=True: recebe o schema agora e os frames "ingest" empacotados.
+    """
+    c = _WsClient(ws, binary)
+    _ws_state[ws] = c
+    if devices:
+        for did in devices:
+            _subs[did].add(ws)
+    else:
+        _clients_all.add(ws)
+    if binary:
+        c.offer(None, encode(binary_protocol.schema()))
+    c.sender = asyncio.create_task(_sender(c))
+    c.hb_task = asyncio.create_task(_heartbeat(c))
+    return c
+
+def encode(msg: dict) -> str:
+    t0 = perf_counter()
+    text = codec.dumps(msg)
+    _metrics["encode_us_total"] += (perf_counter() - t0) * 1e6
+    return text
+
+def send_to(ws: WebSocket, msg: dict):
+    c = _ws_state.get(ws)
+    if c is not None:
+        c.offer(None, encode(msg))
+
+def send_encoded(ws: WebSocket, text: str):
+    """Como send_to, para msgs já serializadas (compartilhadas entre clientes)."""
+    c = _ws_state.get(ws)
+    if c is not None:
+        c.offer(None, text)
+
+async def cleanup(ws: WebSocket):
+    _clients_all.discard(ws)
+    for s in _subs.values():
+        s.discard(ws)
+    c = _ws_state.pop(ws, None)
+    if c is None:
+        return
+    me = asyncio.current_task()
+    for task in (c.sender, c.hb_task):
+        if task and task is not me:
+            task.cancel()
+
+def _pack(msg: dict):
+    """Frame binário (uma vez por broadcast); b"" se a msg não é um frame de leitura."""
+    t0 = perf_counter()
+    res = binary_protocol.encode_frame(msg)
+    _metrics["encode_us_total"] += (perf_counter() - t0) * 1e6
+    if res is None:
+        return b""
+    data, announce = res
+    if announce is not None:
+        # anuncia o device novo a todos os clientes binários antes do 1º frame (FIFO sai antes)
+        ann = encode(announce)
+        for c in _ws_state.values():
+            if c.binary:
+                c.offer(None, ann)
+    return data
+
+def broadcast_nowait(msg: dict):
+    """Fan-out não bloqueante: serializa uma vez e só enfileira em cada cliente interessado."""
+    t0 = perf_counter()
+    _metrics["broadcasts"] += 1
+    did = (msg.get("reading") or {}).get("device_id") or msg.get("device_id")
+    targets = _clients_all
+    if did and did in _subs:
+        targets = _clients_all | _subs[did]
+    if not targets:
+        return
+    # conflação por (evento, device): um "kpis" não substitui o "ingest" pendente do mesmo device
+    key = (msg.get("event"), did) if did else None
+    text = packed = None
+    for ws in targets:
+        c = _ws_state.get(ws)
+        if c is None:
+            continue
+        if c.binary:
+            if packed is None:
+                packed = _pack(msg)
+            if packed:
+                c.offer(key, packed)
+                continue
+        if text is None:
+            text = encode(msg)
+        c.offer(key, text)
+    us = (perf_counter() - t0) * 1e6
+    _metrics["broadcast_us_last"] = us
+    if us > _metrics["broadcast_us_max"]:
+        _metrics["broadcast_us_max"] = us
+
+async def broadcast(msg: dict):
+    broadcast_nowait(msg)
+
+def _queue_depths():
+    for ws, c in list(_ws_state.items()):
+        client = f"{ws.client.host}:{ws.client.port}" if getattr(ws, "client", None) else str(id(ws))
+        yield (client, "bin" if c.binary else "json"), c.depth()
+
+metrics.gauge("twin_ws_clients", "Clientes WebSocket conectados", (), lambda: [((), len(_ws_state))])
+metrics.gauge("twin_ws_queue_depth", "Msgs pendentes por cliente WebSocket", ("client", "format"), _queue_depths)
+
+def stats():
+    clients = []
+    for ws, c in list(_ws_state.items()):
+        clients.append({
+            "client": f"{ws.client.host}:{ws.client.port}" if getattr(ws, "client", None) else None,
+            "format": "bin" if c.binary else "json",
+            "fps": round(1.0 / c.min_dt, 2),
+            "queue_depth": c.depth(),
+            "sent": c.sent,
+            "conflated": c.conflated,
+            "dropped": c.dropped,
+            "downgraded": c.downgraded,
+        })
+    return {"clients": len(_ws_state), "encoder": codec.ENCODER_NAME, **_metrics, "per_client": clients}
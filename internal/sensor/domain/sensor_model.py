@@ -1,6 +1,30 @@
 # internal/sensor/domain/sensor_model.py
+from dataclasses import dataclass, field
 from pydantic import BaseModel, Field
-from datetime import datetime
+from datetime import datetime, timezone
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass(slots=True)
+class Reading:
+    """
+    Leitura interna do hot path (serial/fake/replay -> repositório -> broadcast).
+    Sem validação: quem cria garante value float e ts datetime (UTC).
+    O Pydantic (SensorReading) fica só na borda HTTP.
+    """
+    device_id: str
+    sensor: str
+    value: float
+    unit: str | None = None
+    ts: datetime = field(default_factory=_utcnow)
+
+    def to_model(self) -> "SensorReading":
+        return SensorReading(device_id=self.device_id, sensor=self.sensor,
+                             value=self.value, unit=self.unit, ts=self.ts)
+
 
 class SensorReading(BaseModel):
     device_id: str
@@ -8,3 +32,10 @@ class SensorReading(BaseModel):
     value: float
     unit: str | None = None
     ts: datetime = Field(default_factory=datetime.utcnow)
+
+    @classmethod
+    def from_reading(cls, r) -> "SensorReading":
+        """Reading (ou SensorReading) -> modelo validado, para respostas HTTP."""
+        if isinstance(r, cls):
+            return r
+        return cls(device_id=r.device_id, sensor=r.sensor, value=r.value, unit=r.unit, ts=r.ts)
@@ -0,0 +1,352 @@
+import json, os, re, threading, time
+from array import array
+from collections import OrderedDict
+
+import numpy as np
+
+from internal.sensor.repository.csv_store import FLUSH_ROWS, FLUSH_INTERVAL_S, MAX_OPEN_FILES, WRITE_BEHIND, FSYNC_ON_CLOSE, iter_csv_blocks
+from internal.shared.timeutil import to_epoch_ns
+
+# =============================================================================
+# Config via ENV (colunar binário)
+# =============================================================================
+COLUMNAR_DIR      = os.getenv("REPO_COLUMNAR_DIR", "columnar")              # subpasta dentro de base_path
+CHUNK_ROWS        = int(os.getenv("REPO_COLUMNAR_CHUNK_ROWS", "1048576"))   # linhas por chunk (8 MiB por coluna)
+
+TS_DTYPE = np.dtype("<i8")    # epoch ns
+VAL_DTYPE = np.dtype("<f8")
+
+_CHUNK_RE = re.compile(r"^chunk-(\d{6})\.ts$")
+_CSV_NAME_RE = re.compile(r"^(?P<device>.+?)__(?P<sensor>.+)\.csv$")
+
+
+class _Series:
+    """
+    Uma série (device_id, sensor) em disco:
+      <base>/columnar/<device>__<sensor>/chunk-000000.ts   int64 epoch-ns (append-only)
+      <base>/columnar/<device>__<sensor>/chunk-000000.val  float64        (append-only)
+      <base>/columnar/<device>__<sensor>/meta.json         unit / sorted (só muda quando precisa)
+    """
+    __slots__ = ("dir", "meta", "meta_saved", "chunk", "chunk_rows", "fh_ts", "fh_val",
+                 "rows_ts", "rows_val", "first_ts", "last_ns")
+
+    def __init__(self, path):
+        self.dir = path
+        os.makedirs(path, exist_ok=True)
+        self.meta = _read_meta(path)
+        self.meta_saved = os.path.exists(os.path.join(path, "meta.json"))
+        chunks = _list_chunks(path)
+        self.chunk = chunks[-1] if chunks else 0
+        self.chunk_rows = _chunk_len(path, self.chunk)
+        self.last_ns = _last_ts(path, self.chunk, self.chunk_rows)
+        self.fh_ts = None
+        self.fh_val = None
+        self.rows_ts = array("q")
+        self.rows_val = array("d")
+        self.first_ts = 0.0
+
+    def open(self):
+        if self.fh_ts is None:
+            self.fh_val = open(_chunk_path(self.dir, self.chunk, "val"), "ab")
+            self.fh_ts = open(_chunk_path(self.dir, self.chunk, "ts"), "ab")
+
+    def close(self):
+        for fh in (self.fh_val, self.fh_ts):
+            if fh is not None:
+                fh.close()
+        self.fh_ts = self.fh_val = None
+
+    def roll(self):
+        self.close()
+        self.chunk += 1
+        self.chunk_rows = 0
+
+
+def _chunk_path(d, idx, col):
+    return os.path.join(d, f"chunk-{idx:06d}.{col}")
+
+def _list_chunks(d):
+    try:
+        names = os.listdir(d)
+    except FileNotFoundError:
+        return []
+    return sorted(int(m.group(1)) for m in map(_CHUNK_RE.match, names) if m)
+
+def _chunk_len(d, idx):
+    """Linhas válidas do chunk = menor das duas colunas (tolera escrita interrompida)."""
+    try:
+        n_ts = os.path.getsize(_chunk_path(d, idx, "ts")) // TS_DTYPE.itemsize
+        n_val = os.path.getsize(_chunk_path(d, idx, "val")) // VAL_DTYPE.itemsize
+    except OSError:
+        return 0
+    return min(n_ts, n_val)
+
+def _last_ts(d, idx, n):
+    if n <= 0:
+        return None
+    with open(_chunk_path(d, idx, "ts"), "rb") as f:
+        f.seek((n - 1) * TS_DTYPE.itemsize)
+        return int(np.frombuffer(f.read(TS_DTYPE.itemsize), dtype=TS_DTYPE)[0])
+
+def _read_meta(d):
+    try:
+        with open(os.path.join(d, "meta.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"unit": None, "sorted": True}
+
+def _write_meta(d, meta):
+    tmp = os.path.join(d, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(d, "meta.json"))
+
+def _memmap(path, dtype, n):
+    if n <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+
+class ColumnarStore:
+    """
+    Backend binário colunar, append-only e em chunks (int64 epoch-ns + float64),
+    lido via np.memmap. A unidade fica no meta.json da série, não em cada linha.
+    """
+    name = "columnar"
+
+    def __init__(self, base_path="data"):
+        self.base_path = base_path
+        self.root = os.path.join(base_path, COLUMNAR_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "rows_appended": 0,
+            "rows_written": 0,
+            "flushes": 0,
+            "bytes_written": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_max": 0.0,
+            "flush_ms_last": 0.0,
+            "chunks_rolled": 0,
+        }
+
+    def path(self, device_id, sensor):
+        return os.path.join(self.root, f"{device_id}__{sensor}")
+
+    def series(self):
+        """Lista (device_id, sensor) das séries existentes em disco."""
+        out = []
+        for name in sorted(os.listdir(self.root)):
+            dev, sep, sen = name.partition("__")
+            if sep and os.path.isdir(os.path.join(self.root, name)):
+                out.append((dev, sen))
+        return out
+
+    # -------------------------------------------------------------------------
+    # Escrita
+    # -------------------------------------------------------------------------
+    def _get(self, key):
+        s = self._series.get(key)
+        if s is not None:
+            self._series.move_to_end(key)
+            return s
+        # 2 handles por série
+        while len(self._series) >= max(1, MAX_OPEN_FILES // 2):
+            _, old = self._series.popitem(last=False)
+            self._flush_series(old)
+            old.close()
+        s = _Series(self.path(*key))
+        self._series[key] = s
+        return s
+
+    def _note(self, s, unit, ts_first):
+        changed = False
+        if unit and s.meta.get("unit") != unit:
+            s.meta["unit"] = unit; changed = True
+        if s.meta.get("sorted", True) and s.last_ns is not None and ts_first < s.last_ns:
+            s.meta["sorted"] = False; changed = True
+        if changed or not s.meta_saved:
+            _write_meta(s.dir, s.meta)
+            s.meta_saved = True
+
+    def _write(self, s, ts, val):
+        """Grava colunas (array('q')/array('d') ou ndarray) respeitando CHUNK_ROWS."""
+        t0 = time.perf_counter()
+        n = len(ts); i = 0; nbytes = 0
+        while i < n:
+            room = CHUNK_ROWS - s.chunk_rows
+            if room <= 0:
+                s.roll()
+                self._stats["chunks_rolled"] += 1
+                continue
+            j = min(n, i + room)
+            s.open()
+            # valor antes do ts: o número de linhas válidas é ditado pela coluna ts
+            b_val = memoryview(val[i:j]).cast("B") if isinstance(val, array) else np.ascontiguousarray(val[i:j], dtype=VAL_DTYPE).tobytes()
+            b_ts = memoryview(ts[i:j]).cast("B") if isinstance(ts, array) else np.ascontiguousarray(ts[i:j], dtype=TS_DTYPE).tobytes()
+            s.fh_val.write(b_val); s.fh_ts.write(b_ts)
+            s.fh_val.flush(); s.fh_ts.flush()
+            nbytes += len(b_val) + len(b_ts)
+            s.chunk_rows += j - i
+            i = j
+        if n:
+            s.last_ns = int(ts[n - 1])
+        ms = (time.perf_counter() - t0) * 1000.0
+        st = self._stats
+        st["rows_written"] += n
+        st["bytes_written"] += nbytes
+        st["flushes"] += 1
+        st["flush_ms_total"] += ms
+        st["flush_ms_last"] = ms
+        if ms > st["flush_ms_max"]:
+            st["flush_ms_max"] = ms
+
+    def _flush_series(self, s, durable=False):
+        if s.rows_ts:
+            self._write(s, s.rows_ts, s.rows_val)
+            s.rows_ts = array("q"); s.rows_val = array("d")
+        if durable and s.fh_ts is not None:
+            os.fsync(s.fh_val.fileno()); os.fsync(s.fh_ts.fileno())
+
+    def append(self, readings):
+        now = time.monotonic()
+        with self._lock:
+            for r in readings:
+                s = self._get((r.device_id, r.sensor))
+                ns = to_epoch_ns(r.ts)
+                if (not s.meta_saved or (r.unit and r.unit != s.meta.get("unit"))
+                        or (s.last_ns is not None and ns < s.last_ns and s.meta.get("sorted", True))):
+                    self._note(s, r.unit, ns)
+                if not s.rows_ts:
+                    s.first_ts = now
+                s.rows_ts.append(ns)
+                s.rows_val.append(float(r.value))
+                s.last_ns = ns
+                self._stats["rows_appended"] += 1
+                if (not WRITE_BEHIND or len(s.rows_ts) >= FLUSH_ROWS
+                        or now - s.first_ts >= FLUSH_INTERVAL_S):
+                    self._flush_series(s)
+
+    def append_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        """Grava colunas inteiras de uma vez (migração / backfill), sem passar pelo buffer."""
+        ts_ns = np.asarray(ts_ns, dtype=TS_DTYPE)
+        values = np.asarray(values, dtype=VAL_DTYPE)
+        if not len(ts_ns):
+            return 0
+        with self._lock:
+            s = self._get((device_id, sensor))
+            self._flush_series(s)
+            self._note(s, unit, int(ts_ns[0]))
+            if s.meta.get("sorted", True) and len(ts_ns) > 1 and bool(np.any(np.diff(ts_ns) < 0)):
+                s.meta["sorted"] = False
+                _write_meta(s.dir, s.meta)
+            s.last_ns = int(ts_ns[-1]) if s.last_ns is None else max(s.last_ns, int(ts_ns[-1]))
+            self._write(s, ts_ns, values)
+            self._stats["rows_appended"] += len(ts_ns)
+        return len(ts_ns)
+
+    def flush_due(self):
+        now = time.monotonic()
+        with self._lock:
+            for s in self._series.values():
+                if s.rows_ts and now - s.first_ts >= FLUSH_INTERVAL_S:
+                    self._flush_series(s)
+
+    def flush(self, durable=False):
+        with self._lock:
+            for s in self._series.values():
+                self._flush_series(s, durable=durable)
+
+    def close(self):
+        with self._lock:
+            for s in self._series.values():
+                try:
+                    self._flush_series(s, durable=FSYNC_ON_CLOSE)
+                finally:
+                    s.close()
+            self._series.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["rows_buffered"] = sum(len(s.rows_ts) for s in self._series.values())
+            out["open_series"] = len(self._series)
+        out["flush_ms_avg"] = out["flush_ms_total"] / out["flushes"] if out["flushes"] else 0.0
+        out["chunk_rows"] = CHUNK_ROWS
+        return out
+
+    # -------------------------------------------------------------------------
+    # Leitura (memmap)
+    # -------------------------------------------------------------------------
+    def has(self, device_id, sensor):
+        return (device_id, sensor) in self._series or os.path.isdir(self.path(device_id, sensor))
+
+    def unit(self, device_id, sensor):
+        return _read_meta(self.path(device_id, sensor)).get("unit")
+
+    def read(self, device_id, sensor, t_from_ns=None, t_to_ns=None):
+        """
+        Retorna (ts_ns, values) como ndarrays (views de memmap quando possível),
+        filtrando [t_from_ns, t_to_ns]. Linhas ainda em buffer são descarregadas antes.
+        """
+        key = (device_id, sensor)
+        d = self.path(device_id, sensor)
+        with self._lock:
+            s = self._series.get(key)
+            if s is not None:
+                self._flush_series(s)
+        meta = _read_meta(d)
+        lo = -(1 << 63) if t_from_ns is None else int(t_from_ns)
+        hi = (1 << 63) - 1 if t_to_ns is None else int(t_to_ns)
+
+        parts_ts, parts_val = [], []
+        for idx in _list_chunks(d):
+            n = _chunk_len(d, idx)
+            if n <= 0:
+                continue
+            ts = _memmap(_chunk_path(d, idx, "ts"), TS_DTYPE, n)
+            val = _memmap(_chunk_path(d, idx, "val"), VAL_DTYPE, n)
+            if meta.get("sorted", True):
+                if ts[-1] < lo or ts[0] > hi:
+                    continue
+                a = int(np.searchsorted(ts, lo, side="left"))
+                b = int(np.searchsorted(ts, hi, side="right"))
+                parts_ts.append(ts[a:b]); parts_val.append(val[a:b])
+            else:
+                m = (ts >= lo) & (ts <= hi)
+                parts_ts.append(np.asarray(ts[m])); parts_val.append(np.asarray(val[m]))
+
+        if not parts_ts:
+            return np.empty(0, dtype=TS_DTYPE), np.empty(0, dtype=VAL_DTYPE)
+        if len(parts_ts) == 1:
+            ts, val = parts_ts[0], parts_val[0]
+        else:
+            ts, val = np.concatenate(parts_ts), np.concatenate(parts_val)
+        if not meta.get("sorted", True):
+            order = np.argsort(ts, kind="stable")
+            ts, val = ts[order], val[order]
+        return ts, val
+
+
+# =============================================================================
+# Migração: data/<device>__<sensor>.csv -> colunar
+# =============================================================================
+def migrate_csv(csv_path, store, device_id=None, sensor=None, block_rows=65536):
+    """
+    Converte um CSV do repositório (ts,value,unit) numa série colunar.
+    device/sensor são inferidos do nome <device>__<sensor>.csv se não informados.
+    Retorna o número de linhas gravadas.
+    """
+    if device_id is None or sensor is None:
+        m = _CSV_NAME_RE.match(os.path.basename(csv_path))
+        if not m:
+            raise ValueError(f"nome fora do padrão <device>__<sensor>.csv: {csv_path}")
+        device_id = device_id or m.group("device")
+        sensor = sensor or m.group("sensor")
+
+    total = 0
+    for ts_ns, values, unit in iter_csv_blocks(csv_path, block_rows):
+        total += store.append_arrays(device_id, sensor, ts_ns, values, unit)
+    return total
@@ -0,0 +1,512 @@
+import csv, os, threading, time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+
+import numpy as np
+
+from internal.shared.timeutil import to_epoch_ns, parse_iso_ns
+from internal.shared import metrics
+
+# =============================================================================
+# Config via ENV (write-behind do CSV)
+# =============================================================================
+WRITE_BEHIND      = os.getenv("REPO_WRITE_BEHIND", "true").lower() in ("1","true","yes","on")
+FLUSH_ROWS        = int(os.getenv("REPO_FLUSH_ROWS", "256"))          # flush quando o buffer do sensor atingir N linhas
+FLUSH_INTERVAL_S  = float(os.getenv("REPO_FLUSH_INTERVAL_S", "1.0"))  # ... ou quando a linha mais antiga tiver X s
+MAX_OPEN_FILES    = int(os.getenv("REPO_MAX_OPEN_FILES", "256"))      # handles abertos (LRU)
+FSYNC_ON_CLOSE    = os.getenv("REPO_FSYNC_ON_CLOSE", "true").lower() in ("1","true","yes","on")
+INDEX_EVERY       = int(os.getenv("REPO_INDEX_EVERY", "256"))         # 1 entrada (ts_ns, offset) a cada N linhas
+
+_M_FLUSH = metrics.stage("flush")
+
+HEADER = b"ts,value,unit\n"
+_BLOCK = 64 * 1024
+
+# =============================================================================
+# Índice esparso: <csv>.idx = pares int64 (ts_ns, byte_offset) da 1ª linha de cada bloco de INDEX_EVERY linhas
+# =============================================================================
+def _idx_path(path):
+    return path + ".idx"
+
+def _read_index(path):
+    a = array("q")
+    try:
+        with open(_idx_path(path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return a
+    # outro processo pode estar no meio de um append: só pares (ts, offset) completos
+    a.frombytes(data[:len(data) // 16 * 16])
+    return a
+
+def index_offset(path, ts_ns):
+    """Offset da entrada do índice com ts < ts_ns (início de onde ler para chegar a ts_ns); 0 sem índice."""
+    idx = _read_index(path)
+    i = bisect_left(idx[0::2], ts_ns) - 1     # ts repetido pode começar no bloco anterior
+    return idx[2*i + 1] if i >= 0 else 0
+
+def _header_end(f):
+    f.seek(0)
+    return len(f.readline())
+
+def _scan_index(path, every=None):
+    """
+    Índice do arquivo inteiro sem gravar nada: reaproveita as entradas de <csv>.idx e
+    escaneia só a partir da última. Retorna (índice completo, entradas novas,
+    reconstruído?, linhas depois da última entrada).
+    """
+    every = every or INDEX_EVERY
+    idx = _read_index(path)
+    size = os.path.getsize(path)
+    rebuilt = False
+    with open(path, "rb") as f:
+        hdr = _header_end(f)
+        if idx and (idx[-1] >= size or idx[-1] < hdr):
+            idx = array("q")  # índice velho/inconsistente -> reconstrói
+            rebuilt = True
+        start = idx[-1] if idx else hdr
+        count = 0 if idx else -1  # -1: a próxima linha ainda não foi indexada
+        f.seek(start)
+        new = array("q")
+        off = start
+        for line in f:
+            if count == -1 or count >= every:
+                ns = parse_iso_ns(line.split(b",", 1)[0].decode("ascii", "ignore"))
+                if ns is not None:
+                    new.extend((ns, off))
+                    count = 0
+            if count >= 0:
+                count += 1
+            off += len(line)
+    idx.extend(new)
+    return idx, new, rebuilt, (max(0, count) if count != -1 else every)
+
+def _sync_index(path, every=None):
+    """
+    Garante que <csv>.idx cobre o arquivo inteiro (grava as entradas que faltam).
+    Retorna quantas linhas existem depois da última entrada (para o writer continuar a contagem).
+    """
+    idx, new, rebuilt, count = _scan_index(path, every)
+    if rebuilt:
+        with open(_idx_path(path), "wb") as fi:
+            fi.write(idx.tobytes())
+    elif new:
+        with open(_idx_path(path), "ab") as fi:
+            fi.write(new.tobytes())
+    return count
+
+def _last_ns(path):
+    """ts (epoch ns) da última linha válida do CSV; None se só tem o cabeçalho."""
+    with open(path, "rb") as f:
+        hdr = _header_end(f)
+        f.seek(0, os.SEEK_END)
+        for line in _iter_lines_backwards(f, f.tell(), hdr):
+            row = _parse_line(line)
+            if row is not None:
+                return row[0]
+    return None
+
+
+class OutOfOrder(ValueError):
+    """Bloco do append_arrays com ts anterior ao fim do arquivo (o .idx e o read_range exigem ordem)."""
+
+
+def _format_unit(unit):
+    u = unit or ""
+    if "," in u or '"' in u or "\n" in u:
+        u = '"' + u.replace('"', '""') + '"'
+    return u
+
+def _format_row(ts, value, unit):
+    return f"{ts.isoformat()},{value},{_format_unit(unit)}\n".encode("utf-8")
+
+def _parse_line(line):
+    """b'ts,value,unit' -> (ts_ns, value, unit) ou None."""
+    parts = line.rstrip(b"\r\n").split(b",", 2)
+    if len(parts) < 2:
+        return None
+    ns = parse_iso_ns(parts[0].decode("ascii", "ignore"))
+    if ns is None:
+        return None
+    try:
+        v = float(parts[1])
+    except ValueError:
+        v = float("nan")
+    u = parts[2].decode("utf-8", "ignore").strip('"') if len(parts) > 2 else ""
+    return ns, v, u
+
+def _iter_lines_backwards(f, end, start=0, block=_BLOCK):
+    """Lê de trás pra frente (de 'end' até 'start'), devolvendo linhas sem o '\\n'."""
+    pos = end
+    rest = b""
+    while pos > start:
+        n = min(block, pos - start)
+        pos -= n
+        f.seek(pos)
+        chunk = f.read(n) + rest
+        lines = chunk.split(b"\n")
+        rest = lines[0]
+        for ln in reversed(lines[1:]):
+            if ln:
+                yield ln
+    if rest:
+        yield rest
+
+def tail_lines(path, n):
+    """Últimas n linhas do arquivo (texto), lendo blocos a partir do fim."""
+    out = []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        for ln in _iter_lines_backwards(f, f.tell()):
+            out.append(ln.decode("utf-8", "ignore").rstrip("\r"))
+            if len(out) >= n:
+                break
+    out.reverse()
+    return out
+
+
+def parse_ts_block(strs):
+    """ISO -> epoch ns vetorizado (numpy); cai para parse por linha se houver offsets != UTC."""
+    cleaned = []
+    for s in strs:
+        if s.endswith("+00:00"):
+            s = s[:-6]
+        elif s.endswith("Z"):
+            s = s[:-1]
+        cleaned.append(s)
+    try:
+        return np.array(cleaned, dtype="datetime64[ns]").astype(np.int64)
+    except ValueError:
+        return np.array([parse_iso_ns(s) or 0 for s in strs], dtype=np.int64)
+
+def iter_csv_blocks(path, block_rows=65536):
+    """CSV do repositório em blocos: (ts_ns int64[], values float64[], unit) — migração e backfill."""
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        rd = csv.reader(f)
+        next(rd, None)  # header
+        ts_buf, val_buf, unit = [], [], None
+        for row in rd:
+            if len(row) < 2 or not row[0]:
+                continue
+            ts_buf.append(row[0])
+            try:
+                val_buf.append(float(row[1]))
+            except ValueError:
+                val_buf.append(float("nan"))
+            if unit is None and len(row) > 2 and row[2]:
+                unit = row[2]
+            if len(ts_buf) >= block_rows:
+                yield parse_ts_block(ts_buf), np.array(val_buf), unit
+                ts_buf, val_buf = [], []
+        if ts_buf:
+            yield parse_ts_block(ts_buf), np.array(val_buf), unit
+
+
+class _CsvSink:
+    """Handle aberto + linhas pendentes (+ índice esparso) de um (device_id, sensor)."""
+    __slots__ = ("path", "fh", "fh_idx", "rows", "first_ts", "size", "since_idx", "last_ns")
+
+    def __init__(self, path):
+        self.path = path
+        self.fh = open(path, "ab")
+        self.size = self.fh.tell()
+        if self.size == 0:
+            self.fh.write(HEADER)
+            self.size = len(HEADER)
+            self.since_idx = INDEX_EVERY
+            with open(_idx_path(path), "wb"):
+                pass
+        else:
+            with open(path, "rb") as f:
+                f.seek(self.size - 1)
+                if f.read(1) != b"\n":  # última linha truncada (queda no meio da escrita)
+                    self.fh.write(b"\n")
+                    self.size += 1
+            self.fh.flush()
+            self.since_idx = _sync_index(path)
+        self.fh.flush()
+        self.fh_idx = open(_idx_path(path), "ab")
+        self.rows = []
+        self.first_ts = 0.0
+        self.last_ns = None     # ts da última linha gravada (None = ler do arquivo quando precisar)
+
+    def close(self):
+        self.fh.close()
+        self.fh_idx.close()
+
+
+class CsvStore:
+    """
+    Backend texto: data/<device>__<sensor>.csv (ts ISO, value, unit).
+    Write-behind: um handle aberto por (device_id, sensor), linhas em buffer
+    até FLUSH_ROWS ou FLUSH_INTERVAL_S. Mantém um índice esparso <csv>.idx
+    para leituras por faixa de tempo sem varrer o arquivo.
+    """
+    name = "csv"
+
+    def __init__(self, base_path="data"):
+        self.base_path = base_path
+        os.makedirs(base_path, exist_ok=True)
+
+        # um sink por (device_id, sensor), em ordem LRU
+        self._sinks = OrderedDict()
+        # True quando outro processo pode estar gravando os mesmos arquivos (SHARED_STATE):
+        # leitura de arquivo sem sink aqui não grava no .idx (o dono dele é quem escreve)
+        self.shared_files = False
+        self._lock = threading.Lock()
+        self._stats = {
+            "rows_appended": 0,
+            "rows_written": 0,
+            "flushes": 0,
+            "bytes_written": 0,
+            "flush_ms_total": 0.0,
+            "flush_ms_max": 0.0,
+            "flush_ms_last": 0.0,
+            "files_opened": 0,
+            "files_evicted": 0,
+        }
+
+    def path(self, device_id, sensor):
+        return os.path.join(self.base_path, f"{device_id}__{sensor}.csv")
+
+    def _sink(self, key):
+        s = self._sinks.get(key)
+        if s is not None:
+            self._sinks.move_to_end(key)
+            return s
+        # 2 handles por sink (csv + idx)
+        while len(self._sinks) >= max(1, MAX_OPEN_FILES // 2):
+            _, old = self._sinks.popitem(last=False)
+            self._flush_sink(old)
+            old.close()
+            self._stats["files_evicted"] += 1
+        s = _CsvSink(self.path(*key))
+        self._sinks[key] = s
+        self._stats["files_opened"] += 1
+        return s
+
+    def _flush_sink(self, s, durable=False):
+        if s.rows:
+            t0 = time.perf_counter()
+            buf = []
+            idx = array("q")
+            off = s.size
+            for ts, value, unit in s.rows:
+                if s.since_idx >= INDEX_EVERY:
+                    idx.extend((to_epoch_ns(ts), off))
+                    s.since_idx = 0
+                line = _format_row(ts, value, unit)
+                buf.append(line)
+                off += len(line)
+                s.since_idx += 1
+            s.fh.write(b"".join(buf))
+            s.fh.flush()
+            if idx:
+                s.fh_idx.write(idx.tobytes())
+                s.fh_idx.flush()
+            if durable:
+                os.fsync(s.fh.fileno())
+                os.fsync(s.fh_idx.fileno())
+            dt = time.perf_counter() - t0
+            _M_FLUSH.observe(dt)
+            ms = dt * 1000.0
+            st = self._stats
+            st["rows_written"] += len(s.rows)
+            st["bytes_written"] += off - s.size
+            st["flushes"] += 1
+            st["flush_ms_total"] += ms
+            st["flush_ms_last"] = ms
+            if ms > st["flush_ms_max"]:
+                st["flush_ms_max"] = ms
+            s.size = off
+            s.last_ns = to_epoch_ns(s.rows[-1][0])
+            s.rows = []
+        elif durable:
+            s.fh.flush()
+            os.fsync(s.fh.fileno())
+
+    def append(self, readings):
+        now = time.monotonic()
+        with self._lock:
+            for r in readings:
+                s = self._sink((r.device_id, r.sensor))
+                if not s.rows:
+                    s.first_ts = now
+                s.rows.append((r.ts, r.value, r.unit))
+                self._stats["rows_appended"] += 1
+                if (not WRITE_BEHIND or len(s.rows) >= FLUSH_ROWS
+                        or now - s.first_ts >= FLUSH_INTERVAL_S):
+                    self._flush_sink(s)
+
+    def append_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        """
+        Grava colunas inteiras de uma vez (backfill), sem passar pelo buffer nem por
+        Reading; mantém o índice esparso. ts em epoch ns (gravado como ISO UTC).
+        OutOfOrder se o bloco não está em ordem ou começa antes da última linha do arquivo.
+        """
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        n = len(ts_ns)
+        if not n:
+            return 0
+        if n > 1 and bool(np.any(np.diff(ts_ns) < 0)):
+            raise OutOfOrder(f"{device_id}/{sensor}: bloco fora de ordem de tempo")
+        stamps = np.datetime_as_string(ts_ns.view("datetime64[ns]"), unit="us").tolist()
+        u = _format_unit(unit)
+        lines = [f"{t}+00:00,{v},{u}\n".encode("utf-8")
+                 for t, v in zip(stamps, np.asarray(values, dtype=np.float64).tolist())]
+        with self._lock:
+            s = self._sink((device_id, sensor))
+            self._flush_sink(s)   # o que estava em buffer vai antes (ordem do arquivo)
+            if s.last_ns is None and s.size > len(HEADER):
+                s.last_ns = _last_ns(s.path)
+            if s.last_ns is not None and int(ts_ns[0]) < s.last_ns:
+                raise OutOfOrder(f"{device_id}/{sensor}: bloco começa antes da última linha de {s.path}")
+            t0 = time.perf_counter()
+            offs = list(accumulate(map(len, lines), initial=s.size))   # offs[i] = início da linha i; offs[n] = fim
+            first = (INDEX_EVERY - s.since_idx) if s.since_idx < INDEX_EVERY else 0
+            pos = range(first, n, INDEX_EVERY)
+            idx = array("q")
+            for i in pos:
+                idx.extend((int(ts_ns[i]), offs[i]))
+            s.since_idx = n - pos[-1] if len(pos) else s.since_idx + n
+            s.fh.write(b"".join(lines))
+            s.fh.flush()
+            if idx:
+                s.fh_idx.write(idx.tobytes())
+                s.fh_idx.flush()
+            end = offs[n]
+            st = self._stats
+            ms = (time.perf_counter() - t0) * 1000.0
+            st["rows_appended"] += n
+            st["rows_written"] += n
+            st["bytes_written"] += end - s.size
+            st["flushes"] += 1
+            st["flush_ms_total"] += ms
+            st["flush_ms_last"] = ms
+            if ms > st["flush_ms_max"]:
+                st["flush_ms_max"] = ms
+            s.size = end
+            s.last_ns = int(ts_ns[-1])
+        return n
+
+    def flush_due(self):
+        now = time.monotonic()
+        with self._lock:
+            for s in self._sinks.values():
+                if s.rows and now - s.first_ts >= FLUSH_INTERVAL_S:
+                    self._flush_sink(s)
+
+    def flush(self, durable=False, key=None):
+        with self._lock:
+            if key is not None:
+                s = self._sinks.get(key)
+                if s is not None:
+                    self._flush_sink(s, durable=durable)
+                return
+            for s in self._sinks.values():
+                self._flush_sink(s, durable=durable)
+
+    def close(self):
+        with self._lock:
+            for s in self._sinks.values():
+                try:
+                    self._flush_sink(s, durable=FSYNC_ON_CLOSE)
+                finally:
+                    s.close()
+            self._sinks.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["rows_buffered"] = sum(len(s.rows) for s in self._sinks.values())
+            out["open_files"] = len(self._sinks)
+        out["flush_ms_avg"] = out["flush_ms_total"] / out["flushes"] if out["flushes"] else 0.0
+        out["write_behind"] = WRITE_BEHIND
+        out["flush_rows"] = FLUSH_ROWS
+        out["flush_interval_s"] = FLUSH_INTERVAL_S
+        return out
+
+    # -------------------------------------------------------------------------
+    # Leitura (índice esparso)
+    # -------------------------------------------------------------------------
+    def _prepare_read(self, device_id, sensor):
+        key = (device_id, sensor)
+        p = self.path(device_id, sensor)
+        with self._lock:
+            s = self._sinks.get(key)
+            if s is not None:
+                self._flush_sink(s)   # sink aberto mantém o .idx em dia
+            elif os.path.exists(p):
+                if self.shared_files:
+                    idx = _scan_index(p)[0]   # só em memória
+                    return p, (idx[0::2], idx[1::2])
+                _sync_index(p)
+        if not os.path.exists(p):
+            return p, None
+        idx = _read_index(p)
+        return p, (idx[0::2], idx[1::2])
+
+    def read_range(self, device_id, sensor, t_from_ns=None, t_to_ns=None, limit=None):
+        """
+        Linhas com t_from_ns <= ts <= t_to_ns (até 'limit'), em ordem crescente.
+        Faz seek direto para o bloco do índice que contém o primeiro ts >= t_from_ns.
+        Retorna (ts_ns, values, unit).
+        """
+        p, idx = self._prepare_read(device_id, sensor)
+        ts_out, val_out, unit = [], [], ""
+        if idx is None:
+            return ts_out, val_out, unit
+        idx_ts, idx_off = idx
+        with open(p, "rb") as f:
+            start = _header_end(f)
+            if t_from_ns is not None and idx_ts:
+                i = bisect_left(idx_ts, t_from_ns) - 1   # ts igual pode estar no fim do bloco anterior
+                if i >= 0:
+                    start = idx_off[i]
+            f.seek(start)
+            for line in f:
+                row = _parse_line(line)
+                if row is None:
+                    continue
+                ns, v, u = row
+                if t_from_ns is not None and ns < t_from_ns:
+                    continue
+                if t_to_ns is not None and ns > t_to_ns:
+                    break
+                ts_out.append(ns); val_out.append(v); unit = u or unit
+                if limit and len(ts_out) >= limit:
+                    break
+        return ts_out, val_out, unit
+
+    def tail(self, device_id, sensor, n, t_to_ns=None):
+        """
+        Últimas n linhas (ts <= t_to_ns), lendo de trás pra frente a partir do EOF
+        (ou do bloco do índice logo após t_to_ns). Retorna (ts_ns, values, unit) em ordem crescente.
+        """
+        p, idx = self._prepare_read(device_id, sensor)
+        ts_out, val_out, unit = [], [], ""
+        if idx is None:
+            return ts_out, val_out, unit
+        idx_ts, idx_off = idx
+        with open(p, "rb") as f:
+            hdr = _header_end(f)
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            if t_to_ns is not None and idx_ts:
+                i = bisect_right(idx_ts, t_to_ns)
+                if i < len(idx_off):
+                    end = idx_off[i]
+            for line in _iter_lines_backwards(f, end, hdr):
+                row = _parse_line(line)
+                if row is None:
+                    continue
+                ns, v, u = row
+                if t_to_ns is not None and ns > t_to_ns:
+                    continue
+                ts_out.append(ns); val_out.append(v); unit = unit or u
+                if len(ts_out) >= n:
+                    break
+        ts_out.reverse(); val_out.reverse()
+        return ts_out, val_out, unit
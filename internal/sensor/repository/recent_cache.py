@@ -0,0 +1,214 @@
+# internal/sensor/repository/recent_cache.py
+"""
+Histórico recente em memória: um ring buffer NumPy (ts int64 epoch-ns + valor float64)
+por (device_id, sensor), alimentado pelo save_batch/save_arrays do repositório.
+
+  - cada série guarda no máx. RECENT_MAX_SAMPLES amostras; a leitura corta em
+    RECENT_WINDOW_S antes da amostra mais nova da série
+  - o buffer começa pequeno e dobra até o limite (séries esparsas não reservam tudo)
+  - RECENT_MAX_BYTES limita o total: passando disso, sai a série escrita há mais tempo
+  - RECENT_MAX_SAMPLES=0 desliga o cache
+
+Serve o /sensor/recent e o snapshot inicial do /sensor/ws sem tocar nos CSVs.
+"""
+from collections import OrderedDict
+import os
+import threading
+
+import numpy as np
+
+from internal.shared.timeutil import to_epoch_ns
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+MAX_SAMPLES = int(os.getenv("RECENT_MAX_SAMPLES", "6000"))              # por série (5 min a 20 Hz)
+WINDOW_S    = float(os.getenv("RECENT_WINDOW_S", "300"))                # idade máx. servida, relativa à amostra mais nova
+MAX_BYTES   = int(os.getenv("RECENT_MAX_BYTES", str(64 * 1024 * 1024))) # teto de memória de todas as séries
+# snapshot enviado ao cliente do /sensor/ws ao assinar (?snapshot=<s>, 0 desliga)
+SNAPSHOT_S      = float(os.getenv("RECENT_SNAPSHOT_S", "60"))
+SNAPSHOT_POINTS = int(os.getenv("RECENT_SNAPSHOT_POINTS", "600"))     # máx. pontos por série (LTTB acima disso)
+SNAPSHOT_TTL_S  = float(os.getenv("RECENT_SNAPSHOT_TTL_S", "0.5"))    # reconexões em rajada reusam o mesmo texto
+
+_INITIAL = 256
+_ROW_BYTES = 16   # int64 + float64
+
+
+class _Ring:
+    __slots__ = ("ts", "val", "unit", "start", "n")
+
+    def __init__(self, cap):
+        self.ts = np.empty(cap, dtype=np.int64)
+        self.val = np.empty(cap, dtype=np.float64)
+        self.unit = None
+        self.start = 0
+        self.n = 0
+
+    @property
+    def nbytes(self):
+        return self.ts.nbytes + self.val.nbytes
+
+    def _ordered(self):
+        """(ts, val) em ordem de chegada (cópias)."""
+        end = self.start + self.n
+        cap = len(self.ts)
+        if end <= cap:
+            return self.ts[self.start:end].copy(), self.val[self.start:end].copy()
+        k = end - cap
+        return (np.concatenate((self.ts[self.start:], self.ts[:k])),
+                np.concatenate((self.val[self.start:], self.val[:k])))
+
+    def _grow(self, need):
+        """Dobra a capacidade até caber 'need' (no máx. MAX_SAMPLES); retorna bytes a mais."""
+        cap = len(self.ts)
+        if need <= cap or cap >= MAX_SAMPLES:
+            return 0
+        new = min(MAX_SAMPLES, max(need, cap * 2))
+        ts, val = self._ordered()
+        self.ts = np.empty(new, dtype=np.int64)
+        self.val = np.empty(new, dtype=np.float64)
+        self.ts[:self.n] = ts
+        self.val[:self.n] = val
+        self.start = 0
+        return (new - cap) * _ROW_BYTES
+
+    def push(self, ts_ns, value):
+        grown = self._grow(self.n + 1) if self.n == len(self.ts) else 0
+        cap = len(self.ts)
+        i = self.start + self.n
+        if i >= cap:
+            i -= cap
+        self.ts[i] = ts_ns
+        self.val[i] = value
+        if self.n < cap:
+            self.n += 1
+        else:
+            self.start = self.start + 1 if self.start + 1 < cap else 0
+        return grown
+
+    def newest(self):
+        """ts da amostra mais nova (None se vazio)."""
+        if not self.n:
+            return None
+        i = self.start + self.n - 1
+        return int(self.ts[i - len(self.ts) if i >= len(self.ts) else i])
+
+    def extend(self, ts_ns, values):
+        """Bloco de colunas (backfill): só as últimas 'cap' amostras importam."""
+        grown = self._grow(self.n + len(ts_ns))
+        cap = len(self.ts)
+        if len(ts_ns) >= cap:
+            self.ts[:] = ts_ns[-cap:]
+            self.val[:] = values[-cap:]
+            self.start, self.n = 0, cap
+            return grown
+        for t, v in zip(ts_ns.tolist(), values.tolist()):
+            self.push(t, v)
+        return grown
+
+    def read(self, since_ns=None, limit=None):
+        ts, val = self._ordered()
+        if not len(ts):
+            return ts, val
+        lo = int(ts[-1]) - int(WINDOW_S * 1e9)
+        if since_ns is not None and since_ns > lo:
+            lo = since_ns
+        keep = ts >= lo
+        if not keep.all():
+            ts, val = ts[keep], val[keep]
+        if limit and len(ts) > limit:
+            ts, val = ts[-limit:], val[-limit:]
+        return ts, val
+
+
+class RecentCache:
+    """Ring buffers por (device_id, sensor), thread-safe (escrita vem do thread pool do save_batch)."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.enabled = MAX_SAMPLES > 0
+        self.max_bytes = max_bytes
+        self._rings = OrderedDict()   # ordem = escrita mais antiga primeiro (LRU)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"appended": 0, "series_evicted": 0}
+
+    def _ring(self, key, unit):
+        r = self._rings.get(key)
+        if r is None:
+            r = self._rings[key] = _Ring(min(_INITIAL, MAX_SAMPLES))
+            self._bytes += r.nbytes
+        else:
+            self._rings.move_to_end(key)
+        if unit:
+            r.unit = unit
+        return r
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._rings) > 1:
+            _, r = self._rings.popitem(last=False)
+            self._bytes -= r.nbytes
+            self._stats["series_evicted"] += 1
+
+    def append(self, readings):
+        """Frame de Reading (mesmo formato do save_batch)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            prev_ts = ns = None
+            for r in readings:
+                if r.ts is not prev_ts:
+                    prev_ts, ns = r.ts, to_epoch_ns(r.ts)
+                ring = self._ring((r.device_id, r.sensor), r.unit)
+                self._bytes += ring.push(ns, r.value)
+            self._stats["appended"] += len(readings)
+            self._evict()
+
+    def append_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        if not self.enabled or not len(ts_ns):
+            return
+        ts_ns = np.asarray(ts_ns, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        with self._lock:
+            ring = self._ring((device_id, sensor), unit)
+            last = ring.newest()
+            if last is not None:
+                # backfill de um trecho mais antigo não entra no ring (a leitura assume ordem)
+                keep = ts_ns >= last
+                if not keep.all():
+                    ts_ns, values = ts_ns[keep], values[keep]
+                    if not len(ts_ns):
+                        return
+            grown = ring.extend(ts_ns, values)
+            self._bytes += grown
+            self._stats["appended"] += len(ts_ns)
+            self._evict()
+
+    def read(self, device_id, sensor, since_ns=None, limit=None):
+        """(ts_ns, values, unit) da série; arrays vazios se não estiver em memória."""
+        with self._lock:
+            r = self._rings.get((device_id, sensor))
+            if r is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64), None
+            ts, val = r.read(since_ns, limit)
+            return ts, val, r.unit
+
+    def sensors(self, device_id):
+        with self._lock:
+            return [s for (dev, s) in self._rings if dev == device_id]
+
+    def devices(self):
+        with self._lock:
+            return sorted({dev for dev, _ in self._rings})
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "series": len(self._rings),
+                "samples": sum(r.n for r in self._rings.values()),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_samples": MAX_SAMPLES,
+                "window_s": WINDOW_S,
+                **self._stats,
+            }
@@ -1,29 +1,157 @@
-import csv, os
+import os
+from time import perf_counter
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.sensor.repository.csv_store import CsvStore, FLUSH_INTERVAL_S
+from internal.sensor.repository.recent_cache import RecentCache
+from internal.shared.timeutil import to_epoch_ns, from_epoch_ns
+from internal.shared import metrics
+
+_M_PERSIST = metrics.stage("persist")
+
+# =============================================================================
+# Config via ENV (backends de persistência)
+# =============================================================================
+# Lista separada por vírgula: csv | columnar | csv,columnar
+REPO_BACKEND = os.getenv("REPO_BACKEND", "csv")
+
+def make_backends(base_path, spec=REPO_BACKEND):
+    """Instancia os backends de armazenamento a partir de 'csv', 'columnar' ou 'csv,columnar'."""
+    out = []
+    for name in (x.strip().lower() for x in spec.split(",")):
+        if name == "csv":
+            out.append(CsvStore(base_path))
+        elif name == "columnar":
+            # import tardio: numpy só é necessário se o backend colunar for usado
+            from internal.sensor.repository.columnar_store import ColumnarStore
+            out.append(ColumnarStore(base_path))
+        elif name:
+            raise ValueError(f"REPO_BACKEND desconhecido: {name}")
+    return out
+
 
 class SensorRepository:
-    def __init__(self, base_path="data"):
+    def __init__(self, base_path="data", backends=None, recent=True):
         self.base_path = base_path
         os.makedirs(base_path, exist_ok=True)
         self._last = {}
+        # histórico recente em memória (/sensor/recent, snapshot do WS); None nos shards de ingest
+        self.recent = RecentCache() if recent else None
+        # tabela de última leitura entre processos (SHARED_STATE, internal.shared.shm_table); None = só _last
+        self.shared = None
+        self.backends = make_backends(base_path) if backends is None else list(backends)
 
     def _csv(self, device_id, sensor):
         return os.path.join(self.base_path, f"{device_id}__{sensor}.csv")
 
+    def backend(self, name):
+        """Retorna o backend pelo nome ('csv' / 'columnar') ou None se não estiver ativo."""
+        for b in self.backends:
+            if b.name == name:
+                return b
+        return None
+
     def save_last(self, r):
         self._last[(r.device_id, r.sensor)] = r
+        if self.shared is not None:
+            self.shared.put(r.device_id, r.sensor, r.value, r.unit, to_epoch_ns(r.ts))
 
     def get_last(self, device_id, sensor):
+        if self.shared is not None:
+            got = self.shared.get(device_id, sensor)
+            if got is not None:
+                return Reading(device_id, sensor, got[1], got[2], from_epoch_ns(got[0]))
         return self._last.get((device_id, sensor))
 
     def append_csv(self, r):
-        p = self._csv(r.device_id, r.sensor)
-        new = not os.path.exists(p)
-        with open(p, "a", newline="") as f:
-            w = csv.writer(f)
-            if new: w.writerow(["ts","value","unit"])
-            w.writerow([r.ts.isoformat(), r.value, r.unit or ""])
-        print(f"[repo] wrote {p}: {r.ts.isoformat()} {r.value} {r.unit or ''}")
-    
+        # nome histórico: grava em todos os backends ativos
+        for b in self.backends:
+            b.append((r,))
+
+    def save_batch(self, readings):
+        """save_last + append de um frame inteiro em todos os backends."""
+        t0 = perf_counter()
+        for r in readings:
+            self._last[(r.device_id, r.sensor)] = r
+        if self.shared is not None:
+            prev = ns = None
+            for r in readings:
+                if r.ts is not prev:
+                    prev, ns = r.ts, to_epoch_ns(r.ts)
+                self.shared.put(r.device_id, r.sensor, r.value, r.unit, ns)
+        if self.recent is not None:
+            self.recent.append(readings)
+        for b in self.backends:
+            b.append(readings)
+        _M_PERSIST.observe(perf_counter() - t0)
+
+    def save_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        """Backfill: colunas inteiras (ts epoch ns + valores) em todos os backends, sem Reading por linha."""
+        n = 0
+        for b in self.backends:
+            n = b.append_arrays(device_id, sensor, ts_ns, values, unit)
+        if n:
+            self._keep_arrays(device_id, sensor, ts_ns, values, unit)
+        return n
+
+    def _keep_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        """Memória (cache recente + última leitura) de um bloco gravado por save_arrays."""
+        if self.recent is not None:
+            self.recent.append_arrays(device_id, sensor, ts_ns, values, unit or None)
+        prev = self._last.get((device_id, sensor))
+        if prev is not None and to_epoch_ns(prev.ts) > int(ts_ns[-1]):
+            return      # bloco mais antigo que a última leitura: não volta o _last no tempo
+        self._last[(device_id, sensor)] = Reading(
+            device_id=device_id, sensor=sensor, value=float(values[-1]), unit=unit or None,
+            ts=from_epoch_ns(int(ts_ns[-1])),
+        )
+        if self.shared is not None:
+            self.shared.put(device_id, sensor, float(values[-1]), unit or None, int(ts_ns[-1]))
+
+    def flush_due(self):
+        """Descarrega buffers cuja linha mais antiga passou de FLUSH_INTERVAL_S (chamar periodicamente)."""
+        for b in self.backends:
+            b.flush_due()
+
+    def flush(self, durable=False):
+        """Descarrega todos os buffers; durable=True faz fsync de cada arquivo."""
+        for b in self.backends:
+            b.flush(durable=durable)
+
+    def close(self):
+        """Flush durável + fecha todos os handles (shutdown)."""
+        for b in self.backends:
+            b.close()
+
+    def stats(self):
+        """Contadores de cada backend (linhas em buffer, latência de flush, bytes gravados)."""
+        return {b.name: b.stats() for b in self.backends}
+
+    def history(self, device_id, sensor, t_from_ns=None, t_to_ns=None, limit=None):
+        """
+        Leituras de um sensor numa faixa de tempo -> (ts_ns, values, unit).
+        - com t_from_ns: as primeiras 'limit' linhas a partir de t_from_ns
+        - sem t_from_ns: as últimas 'limit' linhas até t_to_ns (tail)
+        Usa a série colunar se existir; senão o CSV com índice esparso.
+        """
+        col = self.backend("columnar")
+        if col is not None and col.has(device_id, sensor):
+            ts, val = col.read(device_id, sensor, t_from_ns, t_to_ns)
+            if limit and len(ts) > limit:
+                sl = slice(0, limit) if t_from_ns is not None else slice(len(ts) - limit, None)
+                ts, val = ts[sl], val[sl]
+            return ts, val, col.unit(device_id, sensor) or ""
+
+        csv = self.backend("csv")
+        if csv is None:
+            return [], [], ""
+        if t_from_ns is None and limit:
+            return csv.tail(device_id, sensor, limit, t_to_ns)
+        return csv.read_range(device_id, sensor, t_from_ns, t_to_ns, limit)
+
     def get_all_last(self, device_id: str):
         """Retorna uma lista com as últimas leituras (1 por sensor) do device informado."""
+        if self.shared is not None:
+            return [Reading(device_id, sensor, value, unit, from_epoch_ns(ns))
+                    for sensor, (ns, value, unit) in self.shared.device(device_id).items()]
         return [r for (dev, _), r in self._last.items() if dev == device_id]
@@ -0,0 +1,40 @@
+from internal.sensor.repository.sensor_repository import SensorRepository
+
+
+class ShardedRepository(SensorRepository):
+    """
+    Repositório do processo da API com INGEST_SHARDS > 0 (internal.shared.shard_pool).
+    save_batch só mantém a memória (última leitura + cache recente, sem backends);
+    backfill, flush e histórico vão ao shard dono do device, o único que escreve
+    nos arquivos dele. Chamadas bloqueantes: usar fora do event loop (thread pool).
+    """
+
+    def __init__(self, pool, base_path="data"):
+        super().__init__(base_path, backends=[])
+        self.pool = pool
+
+    def save_arrays(self, device_id, sensor, ts_ns, values, unit=None):
+        n = self.pool.call(self.pool.shard_of(device_id), "arrays", device_id, sensor, ts_ns, values, unit).result()
+        if n:
+            self._keep_arrays(device_id, sensor, ts_ns, values, unit)
+        return n
+
+    def flush_due(self):
+        # cada shard faz o próprio flush periódico
+        pass
+
+    def flush(self, durable=False):
+        for fut in [self.pool.call(i, "flush", durable) for i in range(self.pool.n)]:
+            fut.result()
+
+    def close(self):
+        """Flush durável em todos os shards + encerra os processos."""
+        self.pool.close()
+
+    def stats(self):
+        """Contadores de cada backend por shard ("csv@0", ...), enviados pelos shards a cada ~1 s."""
+        return {f"{name}@{i}": st for i, by_name in enumerate(self.pool.stats) for name, st in by_name.items()}
+
+    def history(self, device_id, sensor, t_from_ns=None, t_to_ns=None, limit=None):
+        return self.pool.call(self.pool.shard_of(device_id), "history",
+                              device_id, sensor, t_from_ns, t_to_ns, limit).result()
@@ -0,0 +1,245 @@
+# internal/sensor/usecase/analytics.py
+"""
+Analytics incremental no ingest (estágio do SensorUsecase, sem tocar em disco):
+
+  - por sensor: média/variância (Welford), min/max, último valor e taxa de variação
+    (derivada entre amostras suavizada por EMA), tudo O(1) por leitura
+  - ciclos da prensa pela distância: o pistão sai da linha de base (média das
+    primeiras leituras, como o distancia_inicial do main.cpp) e volta
+  - bordas de subida de ir_bread / ir_hand (mão durante a prensagem = violação)
+  - aquecimento: tempo do cruzamento de ANALYTICS_HEAT_FROM_C (subindo) até ANALYTICS_HEAT_TO_C
+
+Tempo = ts das leituras (replays e seriais dão o mesmo resultado). O resultado sai
+em /twin/kpis e como {"event":"kpis",...} no WS: no máx. 1 a cada ANALYTICS_PUSH_S
+por device, ou na hora quando um ciclo/aquecimento termina.
+"""
+from collections import deque
+from time import monotonic
+import os
+
+from internal.shared.timeutil import to_epoch_ns, from_epoch_ns
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+PUSH_S          = float(os.getenv("ANALYTICS_PUSH_S", "1.0"))        # 0 = não publica no WS
+RATE_ALPHA      = float(os.getenv("ANALYTICS_RATE_ALPHA", "0.2"))    # EMA da taxa de variação
+BASELINE_N      = int(os.getenv("ANALYTICS_BASELINE_N", "5"))        # leituras p/ linha de base da distância
+EXTEND_MM       = float(os.getenv("ANALYTICS_EXTEND_MM", "10"))      # |d - base| acima disso: pistão avançado
+RETRACT_MM      = float(os.getenv("ANALYTICS_RETRACT_MM", "4"))      # ... abaixo disso: recolhido (histerese)
+BASELINE_ALPHA  = float(os.getenv("ANALYTICS_BASELINE_ALPHA", "0.01"))  # deriva da base enquanto recolhido
+HEAT_FROM_C     = float(os.getenv("ANALYTICS_HEAT_FROM_C", "100"))
+HEAT_TO_C       = float(os.getenv("ANALYTICS_HEAT_TO_C", "150"))     # corte do relé do aquecedor no main.cpp
+
+_CYCLE_WINDOW_NS = 60 * 10**9
+
+
+class RunningStats:
+    __slots__ = ("n", "nan", "mean", "m2", "min", "max", "last", "last_ns", "rate")
+
+    def __init__(self):
+        self.n = 0
+        self.nan = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = self.max = self.last = self.rate = None
+        self.last_ns = None
+
+    def push(self, x: float, ns: int):
+        if x != x:
+            self.nan += 1
+            return
+        if self.last_ns is not None and ns > self.last_ns:
+            r = (x - self.last) * 1e9 / (ns - self.last_ns)
+            self.rate = r if self.rate is None else self.rate + RATE_ALPHA * (r - self.rate)
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        if self.min is None or x < self.min:
+            self.min = x
+        if self.max is None or x > self.max:
+            self.max = x
+        self.last = x
+        self.last_ns = ns
+
+    def to_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "nan": self.nan,
+            "mean": round(self.mean, 4) if self.n else None,
+            "std": round((self.m2 / (self.n - 1)) ** 0.5, 4) if self.n > 1 else None,
+            "min": self.min,
+            "max": self.max,
+            "last": self.last,
+            "rate_per_s": round(self.rate, 4) if self.rate is not None else None,
+        }
+
+
+class DeviceKpis:
+    """KPIs de um device, atualizados leitura a leitura."""
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.stats = {}
+        self.last_ns = None
+        # ciclos (distância)
+        self.baseline = None
+        self._warm = []
+        self.extended = False
+        self.cycle_start = None
+        self.cycles = 0
+        self.last_cycle_s = None
+        self.last_period_s = None
+        self._starts = deque(maxlen=64)
+        # IR
+        self._ir = {}
+        self.bread_edges = 0
+        self.hand_edges = 0
+        self.hand_during_press = 0
+        # aquecimento
+        self.heating = False
+        self.heat_start = None
+        self._below = None      # (ns, x) da última leitura abaixo de HEAT_FROM_C
+        self.heatups = 0
+        self.last_heatup_s = None
+
+    def update(self, sensor: str, x: float, ns: int) -> bool:
+        """Atualiza com uma leitura; True se fechou um ciclo ou um aquecimento."""
+        st = self.stats.get(sensor)
+        if st is None:
+            st = self.stats[sensor] = RunningStats()
+        st.push(x, ns)
+        self.last_ns = ns
+        if x != x:
+            return False
+        if sensor == "distance":
+            return self._distance(x, ns)
+        if sensor == "temperature":
+            return self._temperature(x, ns)
+        if sensor in ("ir_bread", "ir_hand"):
+            on = x > 0.5
+            if on and not self._ir.get(sensor, False):
+                if sensor == "ir_bread":
+                    self.bread_edges += 1
+                else:
+                    self.hand_edges += 1
+                    if self.extended:
+                        self.hand_during_press += 1
+            self._ir[sensor] = on
+        return False
+
+    def _distance(self, x: float, ns: int) -> bool:
+        if self.baseline is None:
+            self._warm.append(x)
+            if len(self._warm) >= BASELINE_N:
+                self.baseline = sum(self._warm) / len(self._warm)
+                self._warm = []
+            return False
+        dev = abs(x - self.baseline)
+        if not self.extended:
+            if dev > EXTEND_MM:
+                self.extended = True
+                if self._starts:
+                    self.last_period_s = (ns - self._starts[-1]) / 1e9
+                self._starts.append(ns)
+                self.cycle_start = ns
+            else:
+                self.baseline += BASELINE_ALPHA * (x - self.baseline)
+            return False
+        if dev <= RETRACT_MM:
+            self.extended = False
+            self.cycles += 1
+            self.last_cycle_s = (ns - self.cycle_start) / 1e9
+            return True
+        return False
+
+    def _temperature(self, x: float, ns: int) -> bool:
+        if x < HEAT_FROM_C:
+            # abaixo do início: (re)arma; o aquecimento conta a partir do cruzamento
+            self.heating = False
+            self._below = (ns, x)
+            return False
+        if not self.heating:
+            if self._below is None:
+                return False    # já estava acima de HEAT_FROM_C: início desconhecido
+            b_ns, b_x = self._below
+            self._below = None
+            self.heating = True
+            # instante do cruzamento de HEAT_FROM_C (interpolação linear entre as leituras)
+            self.heat_start = b_ns + int((ns - b_ns) * (HEAT_FROM_C - b_x) / (x - b_x))
+        if x >= HEAT_TO_C:
+            self.heating = False
+            self.heatups += 1
+            self.last_heatup_s = (ns - self.heat_start) / 1e9
+            return True
+        return False
+
+    def to_dict(self) -> dict:
+        ns = self.last_ns
+        return {
+            "device_id": self.device_id,
+            "ts": from_epoch_ns(ns).isoformat() if ns is not None else None,
+            "sensors": {s: st.to_dict() for s, st in self.stats.items()},
+            "cycles": {
+                "count": self.cycles,
+                "extended": self.extended,
+                "baseline_mm": round(self.baseline, 2) if self.baseline is not None else None,
+                "last_duration_s": self.last_cycle_s,
+                "last_period_s": self.last_period_s,
+                "per_min": sum(1 for t in self._starts if ns - t <= _CYCLE_WINDOW_NS) if ns else 0,
+            },
+            "ir": {
+                "bread_edges": self.bread_edges,
+                "hand_edges": self.hand_edges,
+                "hand_during_press": self.hand_during_press,
+            },
+            "heat": {
+                "heating": self.heating,
+                "heatups": self.heatups,
+                "last_heatup_s": self.last_heatup_s,
+                "elapsed_s": (ns - self.heat_start) / 1e9 if self.heating else None,
+            },
+        }
+
+
+class PressAnalytics:
+    """Estágio do SensorUsecase: update(frame) -> msg "kpis" para o broadcast (ou None)."""
+
+    def __init__(self, push_s: float = PUSH_S):
+        self.push_s = push_s
+        self.devices = {}
+        self._pushed = {}   # device_id -> monotonic do último push
+
+    def update(self, readings):
+        device_id = readings[0].device_id
+        dev = self.devices.get(device_id)
+        if dev is None:
+            dev = self.devices[device_id] = DeviceKpis(device_id)
+        prev_ts = ns = None
+        closed = False
+        for r in readings:
+            if r.ts is not prev_ts:
+                prev_ts, ns = r.ts, to_epoch_ns(r.ts)
+            closed |= dev.update(r.sensor, r.value, ns)
+        if self.push_s <= 0:
+            return None
+        now = monotonic()
+        if closed or now - self._pushed.get(device_id, 0.0) >= self.push_s:
+            self._pushed[device_id] = now
+            return {"event": "kpis", "device_id": device_id, "kpis": dev.to_dict()}
+        return None
+
+    def kpis(self, device_id=None):
+        if device_id is not None:
+            dev = self.devices.get(device_id)
+            return dev.to_dict() if dev else None
+        return {did: dev.to_dict() for did, dev in self.devices.items()}
+
+    def reset(self, device_id=None):
+        if device_id is None:
+            self.devices.clear()
+            self._pushed.clear()
+        else:
+            self.devices.pop(device_id, None)
+            self._pushed.pop(device_id, None)
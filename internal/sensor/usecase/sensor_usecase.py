@@ -1,36 +1,110 @@
 from __future__ import annotations
 import asyncio
 import inspect
-from typing import Optional, Callable
-from internal.sensor.domain.sensor_model import SensorReading
+from time import perf_counter
+from typing import Optional, Callable, List, Sequence, Tuple
+from internal.sensor.domain.sensor_model import Reading
+from internal.shared import metrics
+from internal.shared.ratelog import log_event
+from internal.shared.timeutil import to_epoch_ns
+
+_M_PERSIST_HOP = metrics.stage("persist_hop")   # espera + execução no thread pool
+_M_FANOUT = metrics.stage("fanout")
+_M_TWIN = metrics.stage("twin")
+_M_INGEST = metrics.stage("ingest")
+
+# sensores digitais: vão como bool no broadcast
+_DIGITAL = frozenset(("ir_bread", "ir_hand"))
+
+def frame_message(readings: Sequence[Reading]) -> dict:
+    """
+    Frame -> msg única de broadcast {"event":"ingest","ts":epoch_s,"reading":{device_id, <sensor>: valor, ...}}.
+    ts = instante da leitura (latência ingest -> cliente).
+    """
+    reading = {"device_id": readings[0].device_id}
+    for r in readings:
+        v = r.value
+        if r.sensor in _DIGITAL:
+            v = None if v != v else v > 0.5
+        reading[r.sensor] = v
+    return {"event": "ingest", "ts": to_epoch_ns(readings[0].ts) / 1e9, "reading": reading}
+
+async def _call(fn, *args):
+    """Chama função sync ou async."""
+    res = fn(*args)
+    if inspect.iscoroutine(res):
+        await res
 
 class SensorUsecase:
     def __init__(self, repo):
         self.repo = repo
         self.broadcaster: Optional[Callable] = None
         self.twin_updater: Optional[Callable] = None
+        self.stages: List[Tuple[str, Callable, object]] = []
+
+    def add_stage(self, name: str, fn: Callable):
+        """
+        Registra um estágio síncrono fn(frame) -> dict | None, chamado no event loop
+        depois do broadcast do frame (tem que ser O(1) por leitura, sem I/O).
+        Um dict retornado vai para o broadcaster; o tempo entra em twin_stage_seconds{stage=name}.
+        """
+        self.stages.append((name, fn, metrics.stage(name)))
 
-    async def ingest(self, reading: SensorReading):
+    async def ingest(self, reading: Reading):
+        """Ingere uma leitura avulsa (frame de 1 elemento)."""
+        await self.ingest_batch((reading,))
+
+    async def ingest_batch(self, readings: Sequence[Reading]):
         """
-        Persiste leitura sem bloquear o event loop.
-        - save_last / append_csv: executam em thread pool (I/O síncrono)
-        - twin_updater: suporta função/coroutine
+        Persiste um frame inteiro (todas as leituras de uma linha do Arduino)
+        sem bloquear o event loop.
+        - save_batch (save_last + append_csv): UM hop no thread pool por frame
+        - broadcaster: UMA msg por frame (ver frame_message), para todas as fontes (serial, fake, replay)
+        - stages (add_stage): analytics em memória; a msg que devolvem também vai ao broadcaster
+        - twin_updater: recebe o frame (lista de leituras) como unidade; suporta função/coroutine
         """
+        if not readings:
+            return
         loop = asyncio.get_running_loop()
+        t0 = perf_counter()
+        device_id = readings[0].device_id
+        metrics.INGEST_FRAMES.labels(device_id).inc()
+        metrics.INGEST_READINGS.labels(device_id).inc(len(readings))
+
+        # Offload da persistência síncrona para o thread pool (1x por frame)
+        await loop.run_in_executor(None, self.repo.save_batch, readings)
+        t1 = perf_counter()
+        _M_PERSIST_HOP.observe(t1 - t0)
 
-        # Offload das chamadas síncronas para o thread pool
-        await loop.run_in_executor(None, self.repo.save_last, reading)
-        await loop.run_in_executor(None, self.repo.append_csv, reading)
+        if self.broadcaster:
+            try:
+                await _call(self.broadcaster, frame_message(readings))
+            except Exception as e:
+                log_event("usecase.broadcast_failed", level="error", device_id=device_id, error=e)
+            t2 = perf_counter()
+            _M_FANOUT.observe(t2 - t1)
+            t1 = t2
+
+        for name, fn, hist in self.stages:
+            try:
+                msg = fn(readings)
+                if msg and self.broadcaster:
+                    await _call(self.broadcaster, msg)
+            except Exception as e:
+                log_event("usecase.stage_failed", level="error", key=f"usecase.stage_failed.{name}",
+                          stage=name, device_id=device_id, error=e)
+            t2 = perf_counter()
+            hist.observe(t2 - t1)
+            t1 = t2
 
         # Opcional: atualizar o “gêmeo digital” (aceita sync ou async)
         if self.twin_updater:
             try:
-                if inspect.iscoroutinefunction(self.twin_updater):
-                    await self.twin_updater(reading)
-                else:
-                    res = self.twin_updater(reading)
-                    if inspect.iscoroutine(res):
-                        await res
+                await _call(self.twin_updater, readings)
             except Exception as e:
                 # Não derruba o pipeline se o twin falhar
-                print("[usecase] twin_updater falhou:", e)
\ No newline at end of file
+                log_event("usecase.twin_failed", level="error", device_id=device_id, error=e)
+            t2 = perf_counter()
+            _M_TWIN.observe(t2 - t1)
+            t1 = t2
+        _M_INGEST.observe(t1 - t0)
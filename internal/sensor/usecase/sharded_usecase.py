@@ -0,0 +1,123 @@
+# internal/sensor/usecase/sharded_usecase.py
+"""
+Usecase do processo da API com INGEST_SHARDS > 0: mesma interface do SensorUsecase
+(ingest / ingest_batch / broadcaster / repo) para as fontes, mas persistência,
+analytics e gêmeo rodam no shard do device (internal.shared.shard_pool).
+
+  - frame de fake/replay: vai ao shard; aqui só memória (ShardedRepository.save_batch)
+    e o broadcast do frame
+  - linha serial (ingest_line, chamado pelo consume_lines): vai bruta; parse e filtros
+    ficam no shard, e o frame filtrado volta para o broadcast
+  - msgs "kpis"/"twin" dos shards: direto para o broadcaster
+
+Depois do await do ingest_batch o frame está no pipe, não necessariamente no disco
+(back-pressure por INGEST_SHARD_INFLIGHT). KPIs e estado do gêmeo: kpis() /
+twin_state() consultam os shards.
+"""
+import asyncio
+from time import perf_counter
+
+from internal.sensor.usecase.sensor_usecase import frame_message, _call
+from internal.shared import metrics
+from internal.shared.ratelog import log_event
+from internal.shared.shard_pool import pack_frame, unpack_frame
+
+_M_SUBMIT = metrics.stage("shard_submit")   # espera de back-pressure + enfileirar no pipe
+_M_FANOUT = metrics.stage("fanout")
+_M_INGEST = metrics.stage("ingest")
+
+
+class ShardedUsecase:
+    def __init__(self, repo, pool):
+        self.repo = repo            # ShardedRepository
+        self.pool = pool
+        self.broadcaster = None
+        self._readers = {}          # porta -> SerialReader (contadores da sessão)
+
+    def start(self):
+        """Sobe os shards (startup: precisa do event loop rodando)."""
+        self.pool.start(asyncio.get_running_loop(), self._on_out)
+
+    async def ingest(self, reading):
+        await self.ingest_batch((reading,))
+
+    async def ingest_batch(self, readings):
+        if not readings:
+            return
+        t0 = perf_counter()
+        await self.pool.submit(self.pool.shard_of(readings[0].device_id), ("f", pack_frame(readings)))
+        _M_SUBMIT.observe(perf_counter() - t0)
+        await self._local(readings)
+        _M_INGEST.observe(perf_counter() - t0)
+
+    async def ingest_line(self, reader, raw):
+        """Linha serial bruta -> shard do device da sessão (parse + filtros lá)."""
+        self._readers[reader.port] = reader
+        await self.pool.submit(self.pool.shard_of(reader.device_id), ("l", reader.port, reader.device_id, raw))
+
+    async def _local(self, readings):
+        device_id = readings[0].device_id
+        metrics.INGEST_FRAMES.labels(device_id).inc()
+        metrics.INGEST_READINGS.labels(device_id).inc(len(readings))
+        self.repo.save_batch(readings)
+        if self.broadcaster:
+            t0 = perf_counter()
+            try:
+                await _call(self.broadcaster, frame_message(readings))
+            except Exception as e:
+                log_event("usecase.broadcast_failed", level="error", device_id=device_id, error=e)
+            _M_FANOUT.observe(perf_counter() - t0)
+
+    async def _on_out(self, frames, msgs, counters):
+        """Resposta de um lote do shard (no event loop): frames das linhas seriais + msgs do WS."""
+        for frame in frames:
+            await self._local(unpack_frame(frame))
+        for port, (n_frames, parse_errors) in counters.items():
+            r = self._readers.get(port)
+            if r is None:
+                continue
+            r.stats["parse_errors"] += parse_errors
+            for _ in range(n_frames):
+                r._count_frame()
+        if self.broadcaster:
+            for msg in msgs:
+                try:
+                    await _call(self.broadcaster, msg)
+                except Exception as e:
+                    log_event("usecase.broadcast_failed", level="error", device_id=msg.get("device_id"), error=e)
+
+    # ------------------------------------------------------------------ consultas
+    async def _one(self, device_id, method, *args):
+        return await self.pool.acall(self.pool.shard_of(device_id), method, *args)
+
+    async def kpis(self, device_id=None):
+        """Como PressAnalytics.kpis: um device (None se não existe) ou {device_id: kpis} de todos os shards."""
+        if device_id is not None:
+            return await self._one(device_id, "kpis", device_id)
+        out = {}
+        for part in await self.pool.acall_all("kpis", None):
+            out.update(part)
+        return out
+
+    async def kpis_reset(self, device_id=None):
+        if device_id is not None:
+            await self._one(device_id, "kpis_reset", device_id)
+        else:
+            await self.pool.acall_all("kpis_reset", None)
+
+    async def twin_state(self, device_id=None, since: int = 0, devices=None):
+        """
+        Como TwinEngine.state (None se device_id não tem leituras). Vários shards: devices
+        juntos e a menor versão (versões são de relógio, ver twin.py); se algum shard
+        respondeu estado completo, todos respondem completo.
+        """
+        if device_id is not None:
+            return await self._one(device_id, "twin_state", device_id, since, None)
+        parts = await self.pool.acall_all("twin_state", None, since, devices)
+        if since > 0 and any(p["full"] for p in parts):
+            since = 0
+            parts = await self.pool.acall_all("twin_state", None, 0, devices)
+        out = {}
+        for p in parts:
+            out.update(p["devices"])
+        return {"version": min(p["version"] for p in parts), "since": since, "full": since <= 0, "devices": out}
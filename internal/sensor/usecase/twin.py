@@ -0,0 +1,252 @@
+# internal/sensor/usecase/twin.py
+"""
+Gêmeo digital da prensa pneumática aquecida, atualizado leitura a leitura
+(SensorUsecase.twin_updater). Estado por device, inferido dos sensores:
+
+  - térmico: temperatura, taxa (°C/s), aquecedor ligado (mesma histerese do
+    main.cpp: liga < TWIN_HEATER_ON_C, desliga >= TWIN_HEATER_OFF_C) e fase
+    cold / heating / cooling / ready / overheat
+  - pistão: curso (mm) em relação à linha de base da distância e fase
+    retracted / extending / extended / retracting
+  - válvula: aberta se o pistão saiu da base ou a pressão passou da base + delta
+  - IR (pão / mão) e ready_to_press (pão, sem mão, recolhido e na temperatura)
+
+Versionamento: relógio em µs (time_ns // 1000), estritamente crescente a cada campo
+que muda; cada campo guarda a versão da última mudança. Valores contínuos são
+quantizados (ruído não gera mudança), então state(since=v) devolve só os campos
+alterados depois de v. Versões de relógio são comparáveis entre engines (um por
+shard de ingest, ver internal.shared.shard_pool): o state() de vários shards é
+mesclado com a menor versão.
+No WS sai {"event":"twin","device_id","version","base","delta":{...}} com os campos
+alterados depois de 'base' (valores absolutos): o cliente aplica se base <= versão
+que ele tem do device; senão (msg conflacionada por lentidão) pede /twin/state?since=.
+Ao assinar o /sensor/ws o cliente recebe {"event":"twin_state",...} (estado completo).
+"""
+from time import monotonic, time_ns
+import os
+
+from internal.sensor.usecase.analytics import BASELINE_N, EXTEND_MM, RETRACT_MM, HEAT_FROM_C
+from internal.shared.timeutil import to_epoch_ns, from_epoch_ns
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+HEATER_ON_C      = float(os.getenv("TWIN_HEATER_ON_C", "140"))      # main.cpp: liga abaixo disso
+HEATER_OFF_C     = float(os.getenv("TWIN_HEATER_OFF_C", "150"))     # main.cpp: desliga a partir disso
+OVERHEAT_C       = float(os.getenv("TWIN_OVERHEAT_C", "230"))
+VALVE_DELTA_KPA  = float(os.getenv("TWIN_VALVE_DELTA_KPA", "20"))   # pressão acima da base -> válvula aberta
+PUSH_S           = float(os.getenv("TWIN_PUSH_S", "0.1"))           # delta no WS no máx. a cada N s por device; 0 desliga
+                                                                   # (mudança de fase/válvula/aquecedor sai na hora)
+
+_MISSING = object()
+_MOVE_MM = 1.0          # variação de curso entre leituras abaixo disso = parado
+_P_ALPHA = 0.05         # EMA da pressão de base (válvula fechada e pistão recolhido)
+_RATE_ALPHA = 0.2
+
+# quantização dos campos contínuos (passo)
+_Q = {"temperature_c": 0.1, "temp_rate_c_s": 0.05, "pressure_kpa": 0.5, "piston_mm": 0.5}
+# campos discretos: mudança publica na hora
+_DISCRETE = frozenset(("heater_on", "thermal", "piston", "valve_open", "bread", "hand", "ready_to_press"))
+
+
+def _q(key, v):
+    step = _Q[key]
+    return round(round(v / step) * step, 3)
+
+
+class DeviceTwin:
+    __slots__ = ("device_id", "vals", "vers", "version", "last_ns", "pushed",
+                 "_pushed_at", "_urgent", "_warm", "_base_mm", "_travel", "_p_base",
+                 "_temp", "_temp_ns", "_rate")
+
+    def __init__(self, device_id: str):
+        self.device_id = device_id
+        self.vals = {}
+        self.vers = {}
+        self.version = 0        # versão (global) da última mudança deste device
+        self.last_ns = None
+        self.pushed = 0         # versão enviada no último push do WS
+        self._pushed_at = 0.0
+        self._urgent = False
+        self._warm = []
+        self._base_mm = None
+        self._travel = None
+        self._p_base = None
+        self._temp = self._temp_ns = self._rate = None
+
+    def delta(self, since: int) -> dict:
+        return {k: v for k, v in self.vals.items() if self.vers[k] > since}
+
+
+class TwinEngine:
+    """Estado de todos os devices; update(frame) é o twin_updater do SensorUsecase."""
+
+    def __init__(self, publish=None, push_s: float = PUSH_S):
+        self.publish = publish      # async fn(msg) (broadcaster) ou None
+        self.push_s = push_s
+        self.devices = {}
+        self.version = 0
+
+    # ------------------------------------------------------------------ update
+    def _set(self, dev: DeviceTwin, key: str, value):
+        if dev.vals.get(key, _MISSING) != value:
+            self.version = max(time_ns() // 1000, self.version + 1)
+            dev.vals[key] = value
+            dev.vers[key] = self.version
+            dev.version = self.version
+            if key in _DISCRETE:
+                dev._urgent = True
+
+    def apply(self, readings) -> DeviceTwin:
+        """Aplica um frame (síncrono, sem I/O) e retorna o device."""
+        did = readings[0].device_id
+        dev = self.devices.get(did)
+        if dev is None:
+            dev = self.devices[did] = DeviceTwin(did)
+        prev_ts = ns = None
+        vals = {}
+        for r in readings:
+            if r.ts is not prev_ts:
+                prev_ts, ns = r.ts, to_epoch_ns(r.ts)
+            if r.value == r.value:
+                vals[r.sensor] = r.value
+        dev.last_ns = ns
+
+        if "temperature" in vals:
+            self._thermal(dev, vals["temperature"], ns)
+        if "distance" in vals:
+            self._piston(dev, vals["distance"])
+        if "pressure" in vals:
+            self._pressure(dev, vals["pressure"])
+        if "ir_bread" in vals:
+            self._set(dev, "bread", vals["ir_bread"] > 0.5)
+        if "ir_hand" in vals:
+            self._set(dev, "hand", vals["ir_hand"] > 0.5)
+
+        v = dev.vals
+        self._set(dev, "ready_to_press", bool(
+            v.get("bread") and not v.get("hand") and v.get("piston") == "retracted" and v.get("thermal") == "ready"))
+        return dev
+
+    def _thermal(self, dev: DeviceTwin, t: float, ns: int):
+        if dev._temp_ns is not None and ns > dev._temp_ns:
+            r = (t - dev._temp) * 1e9 / (ns - dev._temp_ns)
+            dev._rate = r if dev._rate is None else dev._rate + _RATE_ALPHA * (r - dev._rate)
+        dev._temp, dev._temp_ns = t, ns
+        rate = dev._rate or 0.0
+
+        heater = dev.vals.get("heater_on", False)
+        if t < HEATER_ON_C:
+            heater = True
+        elif t >= HEATER_OFF_C:
+            heater = False
+
+        if t > OVERHEAT_C:
+            phase = "overheat"
+        elif t < HEAT_FROM_C:
+            phase = "cold"
+        elif t >= HEATER_ON_C:
+            phase = "ready"
+        else:
+            phase = "heating" if heater and rate >= 0 else "cooling"
+
+        self._set(dev, "temperature_c", _q("temperature_c", t))
+        self._set(dev, "temp_rate_c_s", _q("temp_rate_c_s", rate))
+        self._set(dev, "heater_on", heater)
+        self._set(dev, "thermal", phase)
+
+    def _piston(self, dev: DeviceTwin, d: float):
+        if dev._base_mm is None:
+            dev._warm.append(d)
+            if len(dev._warm) >= BASELINE_N:
+                dev._base_mm = sum(dev._warm) / len(dev._warm)
+                dev._warm = []
+            return
+        travel = abs(d - dev._base_mm)
+        prev = dev._travel if dev._travel is not None else travel
+        dev._travel = travel
+        if travel <= RETRACT_MM:
+            phase = "retracted"
+        elif travel >= EXTEND_MM and abs(travel - prev) < _MOVE_MM:
+            phase = "extended"
+        else:
+            phase = "extending" if travel > prev else "retracting"
+        self._set(dev, "piston_mm", _q("piston_mm", travel))
+        self._set(dev, "piston", phase)
+        self._valve(dev)
+
+    def _pressure(self, dev: DeviceTwin, p: float):
+        if dev._p_base is None:
+            dev._p_base = p
+        elif not dev.vals.get("valve_open") and dev.vals.get("piston", "retracted") == "retracted":
+            dev._p_base += _P_ALPHA * (p - dev._p_base)
+        self._set(dev, "pressure_kpa", _q("pressure_kpa", p))
+        self._valve(dev, p)
+
+    def _valve(self, dev: DeviceTwin, p=None):
+        if p is None:
+            p = dev.vals.get("pressure_kpa")
+        moving = dev.vals.get("piston") in ("extending", "extended")
+        high = p is not None and dev._p_base is not None and p - dev._p_base > VALVE_DELTA_KPA
+        self._set(dev, "valve_open", bool(moving or high))
+
+    def step(self, readings):
+        """Aplica o frame -> delta para o WS se deve sair agora (limitado por push_s), senão None."""
+        dev = self.apply(readings)
+        if self.push_s <= 0 or dev.version <= dev.pushed:
+            return None
+        if dev._urgent or monotonic() - dev._pushed_at >= self.push_s:
+            return self.delta_message(dev)
+        return None
+
+    async def update(self, readings):
+        """twin_updater: aplica o frame e publica o delta (limitado por push_s)."""
+        if self.publish is None:
+            self.apply(readings)
+            return
+        msg = self.step(readings)
+        if msg is not None:
+            await self.publish(msg)
+
+    def delta_message(self, dev: DeviceTwin) -> dict:
+        msg = {
+            "event": "twin",
+            "device_id": dev.device_id,
+            "version": dev.version,
+            "base": dev.pushed,
+            "ts": dev.last_ns / 1e9 if dev.last_ns is not None else None,
+            "delta": dev.delta(dev.pushed),
+        }
+        dev.pushed = dev.version
+        dev._pushed_at = monotonic()
+        dev._urgent = False
+        return msg
+
+    # ------------------------------------------------------------------ leitura
+    def state(self, device_id=None, since: int = 0, devices=None) -> dict:
+        """
+        Campos alterados depois de 'since' (0 = estado completo), por device
+        (device_id, lista 'devices' ou todos). A versão devolvida é o "até quando"
+        da resposta (relógio atual - 1 µs): toda mudança futura tem versão maior.
+        since no futuro (ex.: relógio voltou) -> estado completo.
+        """
+        version = max(self.version, time_ns() // 1000 - 1)
+        full = since <= 0 or since > version
+        if full:
+            since = 0
+        if device_id is not None:
+            devices = (device_id,)
+        if devices is None:
+            devs = list(self.devices.values())
+        else:
+            devs = [self.devices[d] for d in devices if d in self.devices]
+        out = {}
+        for dev in devs:
+            if dev.version > since:
+                out[dev.device_id] = {
+                    "version": dev.version,
+                    "ts": from_epoch_ns(dev.last_ns).isoformat() if dev.last_ns is not None else None,
+                    "state": dev.delta(since),
+                }
+        return {"version": version, "since": since, "full": full, "devices": out}
+
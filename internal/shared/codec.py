@@ -0,0 +1,48 @@
+# internal/shared/codec.py
+"""
+Encoder JSON plugável para mensagens de broadcast.
+
+NaN/Infinity não existem em JSON e o JSON.parse dos painéis rejeita a linha
+inteira; por isso viram null (o replayer emite NaN com REPLAY_NAN_POLICY=keep).
+WS_JSON_ENCODER=auto|orjson|json (auto usa orjson se estiver instalado).
+"""
+import json
+import math
+import os
+
+WS_JSON_ENCODER = os.getenv("WS_JSON_ENCODER", "auto").lower()
+
+try:
+    import orjson  # opcional: pip install orjson
+except Exception:
+    orjson = None
+
+def _sanitize(o):
+    if isinstance(o, float):
+        return None if math.isnan(o) or math.isinf(o) else o
+    if isinstance(o, dict):
+        return {k: _sanitize(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_sanitize(v) for v in o]
+    return o
+
+def _dumps_std(msg) -> str:
+    try:
+        return json.dumps(msg, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        # só paga o custo do sanitize quando há NaN/inf na mensagem
+        return json.dumps(_sanitize(msg), separators=(",", ":"), allow_nan=False)
+
+def _dumps_orjson(msg) -> str:
+    # orjson já serializa NaN/inf como null
+    return orjson.dumps(msg, option=orjson.OPT_NON_STR_KEYS).decode()
+
+def get_encoder():
+    """Retorna (nome, função msg->str) conforme WS_JSON_ENCODER."""
+    if WS_JSON_ENCODER in ("auto", "orjson") and orjson is not None:
+        return "orjson", _dumps_orjson
+    if WS_JSON_ENCODER == "orjson":
+        print("[codec] orjson não instalado; usando json da stdlib")
+    return "json", _dumps_std
+
+ENCODER_NAME, dumps = get_encoder()
@@ -0,0 +1,70 @@
+# internal/shared/downsample.py
+import numpy as np
+
+def _as_arrays(ts_ns, values):
+    ts = np.asarray(ts_ns, dtype=np.int64)
+    v = np.asarray(values, dtype=np.float64)
+    return ts, v
+
+def bucket_aggregate(ts_ns, values, bucket_ns: int):
+    """
+    Agrega por janelas de tempo fixas (alinhadas ao epoch), ignorando NaN.
+    Espera ts_ns em ordem crescente. Retorna dict de arrays:
+      ts (início do bucket), min, max, mean, last, count
+    """
+    ts, v = _as_arrays(ts_ns, values)
+    bucket_ns = max(1, int(bucket_ns))
+    empty = np.empty(0)
+    if not len(ts):
+        return {"ts": ts[:0], "min": empty, "max": empty, "mean": empty, "last": empty, "count": ts[:0]}
+
+    ids = ts // bucket_ns
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(ids)) + 1))
+
+    ok = ~np.isnan(v)
+    v0 = np.where(ok, v, 0.0)
+    count = np.add.reduceat(ok.astype(np.int64), starts)
+    total = np.add.reduceat(v0, starts)
+    # fmin/fmax ignoram NaN (só dão NaN se o bucket inteiro for NaN)
+    vmin = np.fmin.reduceat(v, starts)
+    vmax = np.fmax.reduceat(v, starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+    # último valor válido do bucket
+    last_i = np.maximum.reduceat(np.where(ok, np.arange(len(v)), -1), starts)
+    last = np.where(last_i >= 0, v[np.maximum(last_i, 0)], np.nan)
+
+    return {"ts": ids[starts] * bucket_ns, "min": vmin, "max": vmax, "mean": mean, "last": last, "count": count}
+
+def lttb(ts_ns, values, n_out: int):
+    """
+    Largest-Triangle-Three-Buckets: reduz a série para n_out pontos preservando a forma.
+    NaN são descartados antes. Retorna (ts_ns, values) decimados.
+    """
+    ts, v = _as_arrays(ts_ns, values)
+    ok = ~np.isnan(v)
+    if not ok.all():
+        ts, v = ts[ok], v[ok]
+    n = len(ts)
+    if n_out >= n or n_out < 3:
+        return ts, v
+
+    # x em segundos relativos (evita perda de precisão com epoch-ns em float)
+    x = (ts - ts[0]).astype(np.float64) / 1e9
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # n_out-2 buckets sobre data[1:-1]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # média do próximo bucket (ou o último ponto)
+        nlo, nhi = hi, (edges[i + 2] if i + 2 < len(edges) else n)
+        avg_x = x[nlo:nhi].mean()
+        avg_y = v[nlo:nhi].mean()
+        # área do triângulo (a, candidato, média do próximo) — vetorizado no bucket
+        area = np.abs((x[a] - avg_x) * (v[lo:hi] - v[a]) - (x[a] - x[lo:hi]) * (avg_y - v[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    out[-1] = n - 1
+    return ts[out], v[out]
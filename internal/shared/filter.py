@@ -1,8 +1,11 @@
 # internal/shared/filter.py
+from bisect import bisect_left, insort
 from collections import deque
-from typing import Deque, Dict, Optional
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
 import os
 
+HAMPEL_MAX_WIN = 1001   # a janela é uma lista ordenada (O(w) por amostra): acima disso o memmove pesa
+
 class EMAFilter:
     def __init__(self, alpha: float):
         if not (0.0 < alpha <= 1.0):
@@ -79,6 +82,155 @@ class SensorFilter:
         self._y_prev = y
         return y
 
+def _kth_dist(s: List[float], med: float, p: int, k: int) -> float:
+    """
+    k-ésimo menor (0-based) de |x - med| para x na lista ordenada s, sem montar a lista:
+    à esquerda de p as distâncias (med - s[p-1-i]) crescem com i, à direita (s[p+j] - med)
+    também; busca binária de quantas vêm da esquerda -> O(log n).
+    """
+    nb = len(s) - p
+    lo, hi = max(0, k + 1 - nb), min(p, k + 1)
+    while lo < hi:
+        i = (lo + hi) >> 1
+        if med - s[p - 1 - i] < s[p + k - i] - med:
+            lo = i + 1
+        else:
+            hi = i
+    j = k + 1 - lo
+    if lo == 0:
+        return s[p + j - 1] - med
+    a = med - s[p - lo]
+    if j == 0:
+        return a
+    b = s[p + j - 1] - med
+    return a if a > b else b
+
+class HampelFilter:
+    """
+    Hampel incremental (mediana + MAD numa janela deslizante de 'window' amostras).
+
+    A janela válida (sem NaN) fica numa lista ordenada: mediana em O(1) e a MAD em
+    O(log w) — as distâncias |x - mediana| são duas sequências já ordenadas (lados
+    esquerdo e direito da mediana), então basta o k-ésimo da união, sem montar lista.
+    Cada amostra custa O(w): insort/del deslocam a lista (memmove, barato até
+    centenas de amostras); por isso window > HAMPEL_MAX_WIN é recusada.
+
+      causal=False: janela centrada (mesmo resultado do _hampel sobre a série toda);
+                    add() devolve a saída atrasada de window//2 amostras (None no início)
+                    e flush() devolve o restante no fim.
+      causal=True : janela = últimas 'window' amostras; add() devolve a amostra atual
+                    já filtrada (caminho ao vivo, sem atraso).
+
+    Amostra fora de k*1.4826*MAD da mediana vira a mediana. Janela par/<3 -> passa direto.
+    """
+    def __init__(self, window: int = 11, k: float = 3.0, causal: bool = False):
+        if int(window) > HAMPEL_MAX_WIN:
+            raise ValueError(f"janela do Hampel deve ser <= {HAMPEL_MAX_WIN} (recebido {window})")
+        self.window = int(window)
+        self.k = float(k)
+        self.causal = causal
+        self.enabled = self.window >= 3 and self.window % 2 == 1
+        self.half = self.window // 2
+        self.reset()
+
+    def reset(self):
+        self._buf: Deque[float] = deque()
+        self._sorted: List[float] = []
+        self._n = 0
+
+    def _push(self, x: float):
+        self._buf.append(x)
+        if x == x:
+            insort(self._sorted, x)
+
+    def _pop(self):
+        x = self._buf.popleft()
+        if x == x:
+            del self._sorted[bisect_left(self._sorted, x)]
+
+    def _test(self, x: float) -> float:
+        s = self._sorted
+        n = len(s)
+        if n < 3 or x != x:
+            return x
+        m = n // 2
+        med = s[m] if n % 2 else (s[m - 1] + s[m]) / 2
+        p = bisect_left(s, med)
+        if n % 2:
+            mad = _kth_dist(s, med, p, m)
+        else:
+            mad = (_kth_dist(s, med, p, m - 1) + _kth_dist(s, med, p, m)) / 2
+        mad = mad or 1e-9
+        return med if abs(x - med) > self.k * 1.4826 * mad else x
+
+    def add(self, x: float) -> Optional[float]:
+        x = float(x)
+        if not self.enabled:
+            return x
+        self._push(x)
+        self._n += 1
+        if self.causal:
+            if len(self._buf) > self.window:
+                self._pop()
+            return self._test(x)
+        if len(self._buf) > self.window:
+            self._pop()
+        if self._n <= self.half:
+            return None
+        # centro = amostra (n-1-half); janela = [n-window, n-1] truncada no início
+        return self._test(self._buf[-1 - self.half])
+
+    def flush(self) -> List[float]:
+        """Janela centrada: saídas das últimas window//2 amostras (janela truncada no fim)."""
+        if not self.enabled or self.causal:
+            return []
+        out = []
+        n = self._n
+        start = n - len(self._buf)
+        for i in range(max(0, n - self.half), n):
+            while start < i - self.half:
+                self._pop()
+                start += 1
+            out.append(self._test(self._buf[i - start]))
+        self.reset()
+        return out
+
+def hampel_iter(values: Iterable[float], window: int, k: float) -> Iterator[float]:
+    """Hampel centrado sobre uma série inteira: HampelFilter(causal=False) + flush()."""
+    f = HampelFilter(window, k)
+    for x in values:
+        y = f.add(x)
+        if y is not None:
+            yield y
+    yield from f.flush()
+
+class DeadbandSlew:
+    """
+    Pós-filtro do replay, amostra a amostra: ignora variações <= deadband e limita a
+    taxa a max_per_s * dt. NaN não muda o estado; hold_nan=True repete o último valor.
+    (Versão em array: filter_np.deadband_slew.)
+    """
+    def __init__(self, deadband: float, max_per_s: float, hold_nan: bool = False):
+        self.deadband = deadband
+        self.max_per_s = max_per_s
+        self.hold_nan = hold_nan
+        self._y: Optional[float] = None
+
+    def step(self, x: float, dt_s: float) -> float:
+        y = self._y
+        if x != x:
+            return y if self.hold_nan and y is not None else x
+        if y is not None:
+            if abs(x - y) <= self.deadband:
+                x = y
+            d = self.max_per_s * max(dt_s, 1e-6)
+            if x > y + d:
+                x = y + d
+            elif x < y - d:
+                x = y - d
+        self._y = x
+        return x
+
 class MultiFieldFilter:
     def __init__(self, window_size: int = 500):
         self.window_size = window_size
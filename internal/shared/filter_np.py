@@ -0,0 +1,134 @@
+# internal/shared/filter_np.py
+"""
+Filtros do replay sobre arrays inteiros (NumPy), com a mesma semântica das
+versões em listas do serial_reader:
+
+  range_mask   -> NaN fora de [lo, hi]
+  warmup_index -> 1º índice com t - t0 >= warmup
+  hampel       -> janela centrada truncada nas bordas, ignora NaN, precisa de >= 3 válidos
+  ema / movavg -> ignoram NaN (saída NaN na posição, estado segue)
+  deadband_slew-> pós-filtro amostra a amostra (recursivo; um laço só, sobre floats)
+
+hampel e range/warmup dão resultado idêntico; ema/movavg diferem só no
+arredondamento (tests/test_filters.py; tempos em scripts/bench_filters.py).
+"""
+import numpy as np
+
+HAMPEL_BLOCK = 1 << 16   # linhas por bloco no Hampel (limita a memória do sort)
+EMA_BLOCK = 128          # tamanho do bloco da EMA em forma fechada
+
+
+def _f64(v):
+    return np.asarray(v, dtype=np.float64)
+
+def range_mask(v, lo: float, hi: float):
+    v = _f64(v)
+    with np.errstate(invalid="ignore"):
+        return np.where((v >= lo) & (v <= hi), v, np.nan)
+
+def warmup_index(t_ms, warmup_s: float) -> int:
+    t = _f64(t_ms)
+    if not len(t) or warmup_s <= 0:
+        return 0
+    hit = np.flatnonzero((t - t[0]) >= warmup_s * 1000.0)
+    # sem amostra após o warmup: não corta nada (como a versão em listas)
+    return int(hit[0]) if len(hit) else 0
+
+def _row_median(srt, cnt):
+    """Mediana por linha de uma matriz ordenada com NaN no fim e cnt válidos por linha."""
+    rows = np.arange(len(srt))
+    lo = srt[rows, np.maximum(cnt - 1, 0) // 2]
+    hi = srt[rows, cnt // 2]
+    return np.where(cnt % 2 == 1, lo, (lo + hi) / 2)
+
+def hampel(v, w: int, k: float, block: int = HAMPEL_BLOCK):
+    v = _f64(v)
+    if w < 3 or w % 2 == 0 or not len(v):
+        return v.copy()
+    half = w // 2
+    n = len(v)
+    padded = np.concatenate((np.full(half, np.nan), v, np.full(half, np.nan)))
+    win = np.lib.stride_tricks.sliding_window_view(padded, w)   # (n, w), sem cópia
+    out = v.copy()
+    thr = k * 1.4826
+    for a in range(0, n, block):
+        b = min(n, a + block)
+        srt = np.sort(win[a:b], axis=1)                         # NaN vão para o fim
+        cnt = np.count_nonzero(~np.isnan(srt), axis=1)
+        med = _row_median(srt, cnt)
+        dev = np.sort(np.abs(srt - med[:, None]), axis=1)
+        mad = _row_median(dev, cnt)
+        mad = np.where(mad == 0, 1e-9, mad)
+        x = v[a:b]
+        with np.errstate(invalid="ignore"):
+            hit = (cnt >= 3) & ~np.isnan(x) & (np.abs(x - med) > thr * mad)
+        out[a:b][hit] = med[hit]
+    return out
+
+def ema(v, alpha: float, block: int = EMA_BLOCK):
+    """
+    y0 = x0; y = a*x + (1-a)*y, pulando NaN. Em blocos de B amostras a recursão vira
+    um produto por uma matriz triangular BxB fixa (mais o termo do estado anterior).
+    """
+    v = _f64(v)
+    out = np.full(len(v), np.nan)
+    idx = np.flatnonzero(~np.isnan(v))
+    if not len(idx):
+        return out
+    x = v[idx]
+    y = np.empty_like(x)
+    y[0] = x[0]
+    b = 1.0 - alpha
+    B = block
+    e = np.arange(B)
+    powers = b ** (e + 1)                                   # peso do estado anterior
+    lag = e[:, None] - e[None, :]
+    L = np.where(lag >= 0, alpha * b ** np.maximum(lag, 0), 0.0)
+    prev = x[0]
+    for a in range(1, len(x), B):
+        chunk = x[a:a + B]
+        m = len(chunk)
+        y[a:a + m] = L[:m, :m] @ chunk + powers[:m] * prev
+        prev = y[a + m - 1]
+    out[idx] = y
+    return out
+
+def movavg(v, w: int):
+    """Média das últimas w amostras válidas (NaN fica NaN e não entra na janela)."""
+    v = _f64(v)
+    if w <= 1:
+        return v.copy()
+    out = np.full(len(v), np.nan)
+    idx = np.flatnonzero(~np.isnan(v))
+    if not len(idx):
+        return out
+    cs = np.concatenate(([0.0], np.cumsum(v[idx])))
+    i = np.arange(1, len(idx) + 1)
+    lo = np.maximum(i - w, 0)
+    out[idx] = (cs[i] - cs[lo]) / (i - lo)
+    return out
+
+def deadband_slew(v, dt_s, deadband: float, max_per_s: float, hold_nan: bool = False):
+    """
+    Pós-filtro recursivo do replay: ignora variações <= deadband e limita a taxa a
+    max_per_s * dt. NaN não muda o estado; hold_nan=True repete o último valor.
+    """
+    xs = _f64(v).tolist()
+    dts = np.broadcast_to(_f64(dt_s), (len(xs),)).tolist()
+    out = [float("nan")] * len(xs)
+    y = None
+    for i, x in enumerate(xs):
+        if x != x:
+            if hold_nan and y is not None and y == y:
+                out[i] = y
+            continue
+        if y is not None and y == y:
+            if abs(x - y) <= deadband:
+                x = y
+            d = max_per_s * max(dts[i], 1e-6)
+            if x > y + d:
+                x = y + d
+            elif x < y - d:
+                x = y - d
+        y = out[i] = x
+    return np.asarray(out)
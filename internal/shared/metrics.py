@@ -0,0 +1,214 @@
+# internal/shared/metrics.py
+"""
+Métricas do pipeline de ingest em memória, expostas em texto Prometheus (/metrics),
+sem dependência externa.
+
+  - Histogram: buckets fixos (10 µs .. ~10 s, x2); observe() = bisect + 2 somas,
+    sem lock (entre threads do executor um incremento raro pode se perder; ok para métrica)
+  - Counter: por label (ex.: device_id); gera também <nome>_per_second, a taxa
+    desde o scrape anterior
+  - gauge(): valores lidos na hora do scrape por uma função (filas, buffers)
+
+METRICS_ENABLED=false troca tudo por no-ops (observe/inc viram uma chamada vazia).
+"""
+from bisect import bisect_left
+from time import monotonic
+from typing import Callable, Dict, Iterable, Tuple
+import math
+import os
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+BUCKETS = tuple(1e-5 * 2 ** i for i in range(21))   # 10 µs .. 10.5 s
+_LE = tuple('le="%.6g"' % b for b in BUCKETS) + ('le="+Inf"',)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)   # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimativa pelo limite superior do bucket (resumo JSON)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else math.inf
+        return math.inf
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class _Noop:
+    __slots__ = ()
+
+    def observe(self, seconds):
+        pass
+
+    def inc(self, n=1):
+        pass
+
+_NOOP = _Noop()
+
+
+class _Family:
+    def __init__(self, name: str, help_: str, kind: str, labels: Tuple[str, ...], cls):
+        self.name = name
+        self.help = help_
+        self.kind = kind
+        self.label_names = labels
+        self.cls = cls
+        self.children: Dict[Tuple[str, ...], object] = {}
+        self._rate_prev: Dict[Tuple[str, ...], Tuple[float, float]] = {}
+        self._rates: Dict[Tuple[str, ...], float] = {}
+
+    def labels(self, *values):
+        """Filho para os valores de label (criado na 1ª vez; guarde a referência no hot path)."""
+        if not METRICS_ENABLED:
+            return _NOOP
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            child = self.children[key] = self.cls()
+        return child
+
+
+_families: Dict[str, _Family] = {}
+_gauges: Dict[str, Tuple[str, Tuple[str, ...], Callable[[], Iterable]]] = {}
+
+
+def histogram(name: str, help_: str, labels: Tuple[str, ...] = ()) -> _Family:
+    fam = _families.get(name)
+    if fam is None:
+        fam = _families[name] = _Family(name, help_, "histogram", labels, Histogram)
+    return fam
+
+def counter(name: str, help_: str, labels: Tuple[str, ...] = ()) -> _Family:
+    fam = _families.get(name)
+    if fam is None:
+        fam = _families[name] = _Family(name, help_, "counter", labels, Counter)
+    return fam
+
+def gauge(name: str, help_: str, labels: Tuple[str, ...], fn: Callable[[], Iterable]):
+    """fn() -> [(valores de label, valor)], chamada a cada scrape. Registrar de novo substitui."""
+    _gauges[name] = (help_, labels, fn)
+
+
+def _labels(names, values, extra="") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _esc(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _num(v) -> str:
+    if v != v:
+        return "NaN"
+    if v in (math.inf, -math.inf):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def render() -> str:
+    """Texto no formato de exposição do Prometheus (0.0.4)."""
+    out = []
+    now = monotonic()
+    for fam in list(_families.values()):
+        out.append(f"# HELP {fam.name} {fam.help}")
+        out.append(f"# TYPE {fam.name} {fam.kind}")
+        for key, child in list(fam.children.items()):
+            if fam.kind == "histogram":
+                acc = 0
+                for le, c in zip(_LE, child.counts):
+                    acc += c
+                    out.append(f"{fam.name}_bucket{_labels(fam.label_names, key, le)} {acc}")
+                out.append(f"{fam.name}_sum{_labels(fam.label_names, key)} {_num(child.sum)}")
+                out.append(f"{fam.name}_count{_labels(fam.label_names, key)} {child.count}")
+            else:
+                out.append(f"{fam.name}{_labels(fam.label_names, key)} {child.value}")
+        if fam.kind == "counter" and fam.children:
+            rate = fam.name[:-6] if fam.name.endswith("_total") else fam.name
+            out.append(f"# HELP {rate}_per_second {fam.help} (taxa desde o scrape anterior)")
+            out.append(f"# TYPE {rate}_per_second gauge")
+            for key, value in _rates(fam, now):
+                out.append(f"{rate}_per_second{_labels(fam.label_names, key)} {_num(value)}")
+
+    for name, (help_, labels, fn) in list(_gauges.items()):
+        try:
+            rows = list(fn())
+        except Exception:
+            continue
+        out.append(f"# HELP {name} {help_}")
+        out.append(f"# TYPE {name} gauge")
+        for key, value in rows:
+            out.append(f"{name}{_labels(labels, key)} {_num(value)}")
+    return "\n".join(out) + "\n"
+
+def _rates(fam: _Family, now: float):
+    """Taxa por label entre scrapes (janela mínima de 1 s; scrapes mais próximos repetem a anterior)."""
+    for key, child in list(fam.children.items()):
+        prev = fam._rate_prev.get(key)
+        if prev is None:
+            fam._rate_prev[key] = (now, child.value)
+            fam._rates[key] = 0.0
+        elif now - prev[0] >= 1.0:
+            fam._rates[key] = (child.value - prev[1]) / (now - prev[0])
+            fam._rate_prev[key] = (now, child.value)
+        yield key, fam._rates[key]
+
+
+def summary() -> dict:
+    """Resumo em JSON (média e p50/p99 aproximados por histograma, totais dos contadores)."""
+    out = {}
+    for fam in list(_families.values()):
+        items = {}
+        for key, child in list(fam.children.items()):
+            label = ",".join(key) or "_"
+            if fam.kind == "histogram":
+                items[label] = {
+                    "count": child.count,
+                    "mean_ms": round(child.sum / child.count * 1e3, 4) if child.count else 0.0,
+                    "p50_ms": round(child.quantile(0.5) * 1e3, 4),
+                    "p99_ms": round(child.quantile(0.99) * 1e3, 4),
+                }
+            else:
+                items[label] = child.value
+        out[fam.name] = items
+    return out
+
+
+# =============================================================================
+# Métricas do pipeline (compartilhadas pelos módulos do hot path)
+# =============================================================================
+STAGE = histogram("twin_stage_seconds", "Duração de cada estágio do ingest", ("stage",))
+INGEST_FRAMES = counter("twin_ingest_frames_total", "Frames ingeridos por device", ("device_id",))
+INGEST_READINGS = counter("twin_ingest_readings_total", "Leituras ingeridas por device", ("device_id",))
+
+def stage(name: str):
+    """Histograma de um estágio (queue, parse, filter, persist, persist_hop, fanout, analytics, twin, ingest, shard_submit, cluster, flush, ws_send, line)."""
+    return STAGE.labels(name)
@@ -0,0 +1,149 @@
+# internal/shared/press_sim.py
+"""
+Simulador físico da prensa pneumática aquecida, vetorizado em NumPy: N prensas
+avançam juntas a cada step(dt) (um array por variável de estado, shape (N,)).
+
+Modelo (primeira ordem, passo exato x += (alvo - x)·(1 - e^(-dt/tau))):
+  - térmico: resistência liga/desliga com a histerese do main.cpp (liga < 140 °C,
+    desliga >= 150 °C, decidido pela leitura do termopar); a placa tende a
+    ambiente + ganho com o relé ligado, e o termopar segue a placa com atraso
+    próprio (por isso passa um pouco do corte, como na bancada)
+  - pneumático: botão do operador em instantes aleatórios; a válvula abre se
+    há pão, sem mão, pistão recolhido e passou o cooldown (2 s aberta + 5 s,
+    como no main.cpp); a pressão vai à de alimentação com a válvula aberta
+  - pistão: curso segue a pressão acima da de repouso (até SIM_STROKE_MM); o
+    HC-SR04 vê base - curso, com ruído e eco perdido (NaN) ocasional
+  - IR: operador põe o pão com o pistão recolhido e tira após o ciclo; mão entra
+    na área de vez em quando
+
+Cada prensa tem base, ganho térmico e constantes de tempo sorteadas (±SIM_SPREAD),
+para N devices não andarem idênticos. Mesma semente -> mesma série.
+"""
+import math
+import os
+
+import numpy as np
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+AMBIENT_C      = float(os.getenv("SIM_AMBIENT_C", "25"))
+HEATER_GAIN_C  = float(os.getenv("SIM_HEATER_GAIN_C", "320"))   # placa em regime com o relé sempre ligado = ambiente + ganho
+TAU_THERMAL_S  = float(os.getenv("SIM_TAU_THERMAL_S", "240"))
+TAU_SENSOR_S   = float(os.getenv("SIM_TAU_SENSOR_S", "8"))      # atraso do termopar
+HEATER_ON_C    = float(os.getenv("SIM_HEATER_ON_C", "140"))     # main.cpp
+HEATER_OFF_C   = float(os.getenv("SIM_HEATER_OFF_C", "150"))    # main.cpp
+P_IDLE_KPA     = float(os.getenv("SIM_P_IDLE_KPA", "185"))
+P_SUPPLY_KPA   = float(os.getenv("SIM_P_SUPPLY_KPA", "250"))
+TAU_P_S        = float(os.getenv("SIM_TAU_P_S", "0.2"))
+STROKE_MM      = float(os.getenv("SIM_STROKE_MM", "40"))
+TAU_PISTON_S   = float(os.getenv("SIM_TAU_PISTON_S", "0.35"))
+BASE_MM        = float(os.getenv("SIM_BASE_MM", "300"))
+VALVE_OPEN_S   = float(os.getenv("SIM_VALVE_OPEN_S", "2.0"))    # main.cpp
+COOLDOWN_S     = float(os.getenv("SIM_COOLDOWN_S", "5.0"))      # main.cpp
+PRESS_EVERY_S  = float(os.getenv("SIM_PRESS_EVERY_S", "10"))    # média entre apertos do botão
+LOAD_S         = float(os.getenv("SIM_LOAD_S", "2"))            # média até o operador pôr o pão
+HAND_EVERY_S   = float(os.getenv("SIM_HAND_EVERY_S", "60"))     # média entre entradas da mão
+DIST_DROPOUT   = float(os.getenv("SIM_DIST_DROPOUT", "0.002"))  # prob. de eco perdido por leitura
+SPREAD         = float(os.getenv("SIM_SPREAD", "0.05"))         # variação entre prensas
+NOISE          = float(os.getenv("SIM_NOISE", "1.0"))           # escala do ruído dos sensores (0 = sem ruído)
+
+RETRACTED_MM = 2.0   # main.cpp: |d - distancia_inicial| <= 2 mm
+
+SENSORS = (("temperature", "C"), ("pressure", "kPa"), ("distance", "mm"), ("ir_bread", None), ("ir_hand", None))
+
+
+def _alpha(dt, tau):
+    return 1.0 - np.exp(-dt / tau)
+
+
+class PressSim:
+    """N prensas em lockstep; step(dt) -> dict sensor -> array (N,) com as leituras do tick."""
+
+    def __init__(self, n: int, seed=None, temp0_c: float = AMBIENT_C):
+        self.n = n
+        self.rng = rng = np.random.default_rng(seed)
+        var = lambda v: v * (1.0 + SPREAD * rng.uniform(-1, 1, n))
+        # parâmetros por prensa
+        self.gain_c = var(HEATER_GAIN_C)
+        self.tau_th = var(TAU_THERMAL_S)
+        self.tau_p = var(TAU_P_S)
+        self.tau_x = var(TAU_PISTON_S)
+        self.base_mm = var(BASE_MM)
+        # estado
+        self.t = 0.0
+        self.plate_c = np.full(n, float(temp0_c))
+        self.sensor_c = self.plate_c.copy()
+        self.heater = np.zeros(n, dtype=bool)
+        self.valve = np.zeros(n, dtype=bool)
+        self.valve_t = np.full(n, -math.inf)
+        self.cooldown_t = np.full(n, -math.inf)
+        self.press_kpa = np.full(n, P_IDLE_KPA)
+        self.x_mm = np.zeros(n)
+        self.bread = np.zeros(n, dtype=bool)
+        self.pressed = np.zeros(n, dtype=bool)     # ciclo feito com este pão (tira ao recolher)
+        self.hand_until = np.full(n, -math.inf)
+        self.next_press = rng.exponential(PRESS_EVERY_S, n)
+        self.cycles = np.zeros(n, dtype=np.int64)
+
+    def step(self, dt: float) -> dict:
+        rng, n = self.rng, self.n
+        self.t = t = self.t + dt
+
+        # --- térmico: relé decide pela leitura do termopar (histerese do main.cpp)
+        self.heater = np.where(self.sensor_c < HEATER_ON_C, True,
+                               np.where(self.sensor_c >= HEATER_OFF_C, False, self.heater))
+        target = AMBIENT_C + self.gain_c * self.heater
+        self.plate_c += (target - self.plate_c) * _alpha(dt, self.tau_th)
+        self.sensor_c += (self.plate_c - self.sensor_c) * _alpha(dt, TAU_SENSOR_S)
+
+        # --- operador: mão, pão e botão
+        hand_in = rng.random(n) < dt / HAND_EVERY_S
+        self.hand_until = np.where(hand_in, t + rng.uniform(0.5, 2.0, n), self.hand_until)
+        hand = t < self.hand_until
+        retracted = self.x_mm <= RETRACTED_MM
+        # tira o pão já prensado quando o pistão volta; põe outro com o pistão recolhido
+        done = self.pressed & retracted & ~self.valve
+        self.bread &= ~done
+        self.pressed &= ~done
+        self.bread |= retracted & ~self.valve & (rng.random(n) < dt / LOAD_S)
+
+        button = t >= self.next_press
+        self.next_press = np.where(button, t + rng.exponential(PRESS_EVERY_S, n), self.next_press)
+        open_now = (button & ~self.valve & (t - self.cooldown_t > COOLDOWN_S)
+                    & self.bread & ~hand & retracted)
+        self.valve |= open_now
+        self.valve_t = np.where(open_now, t, self.valve_t)
+        self.pressed |= open_now
+        self.cycles += open_now
+        close = self.valve & (t - self.valve_t > VALVE_OPEN_S)
+        self.valve &= ~close
+        self.cooldown_t = np.where(close, t, self.cooldown_t)
+
+        # --- pneumático + pistão
+        p_target = np.where(self.valve, P_SUPPLY_KPA, P_IDLE_KPA)
+        self.press_kpa += (p_target - self.press_kpa) * _alpha(dt, self.tau_p)
+        frac = np.clip((self.press_kpa - P_IDLE_KPA) / (P_SUPPLY_KPA - P_IDLE_KPA), 0.0, 1.0)
+        self.x_mm += (STROKE_MM * frac - self.x_mm) * _alpha(dt, self.tau_x)
+
+        # --- sensores (MAX6675 em passos de 0,25 °C; HC-SR04 em 0,1 mm)
+        temp = np.round((self.sensor_c + NOISE * 0.25 * rng.standard_normal(n)) * 4.0) / 4.0
+        press = np.round(self.press_kpa + NOISE * 1.5 * rng.standard_normal(n), 2)
+        dist = np.round(self.base_mm - self.x_mm + NOISE * 0.5 * rng.standard_normal(n), 1)
+        if DIST_DROPOUT > 0:
+            dist[rng.random(n) < DIST_DROPOUT] = np.nan
+        return {
+            "temperature": temp,
+            "pressure": press,
+            "distance": dist,
+            "ir_bread": self.bread.astype(np.float64),
+            "ir_hand": hand.astype(np.float64),
+        }
+
+    def run(self, steps: int, dt: float) -> dict:
+        """steps ticks de uma vez -> dict sensor -> array (steps, N) (modo offline)."""
+        out = {s: np.empty((steps, self.n)) for s, _ in SENSORS}
+        for i in range(steps):
+            for s, v in self.step(dt).items():
+                out[s][i] = v
+        return out
@@ -0,0 +1,61 @@
+# internal/shared/ratelog.py
+"""
+Log estruturado (logfmt) com limite de taxa, para erros no hot path: no máximo uma
+linha por chave a cada LOG_EVERY_S; as ocorrências suprimidas saem como
+'suppressed=N' na próxima linha da mesma chave.
+
+    log_event("serial.parse_error", level="warning", port=port, error=e)
+    -> ts=2025-01-01T12:00:00.123Z level=warning event=serial.parse_error port=/dev/ttyUSB0 error="..." suppressed=41
+"""
+from datetime import datetime, timezone
+from time import monotonic
+import logging
+import os
+import sys
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+LOG_LEVEL   = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_EVERY_S = float(os.getenv("LOG_EVERY_S", "5"))
+
+_log = logging.getLogger("twin")
+if not _log.handlers:
+    _h = logging.StreamHandler(sys.stderr)
+    _h.setFormatter(logging.Formatter("%(message)s"))
+    _log.addHandler(_h)
+    _log.propagate = False
+_log.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+
+_LEVELS = {"debug": logging.DEBUG, "info": logging.INFO, "warning": logging.WARNING, "error": logging.ERROR}
+_last = {}   # chave -> (monotonic do último log, suprimidas desde então)
+
+
+def _fmt(v) -> str:
+    s = str(v)
+    if not s or any(c in s for c in ' "=\n'):
+        s = '"' + s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+    return s
+
+def log_event(event: str, level: str = "info", key=None, every_s: float = LOG_EVERY_S, **fields) -> bool:
+    """
+    Loga 'event' com os campos; key (padrão: event) agrupa o limite de taxa.
+    Retorna False se a linha foi suprimida.
+    """
+    lvl = _LEVELS.get(level, logging.INFO)
+    if not _log.isEnabledFor(lvl):
+        return False
+    k = key if key is not None else event
+    now = monotonic()
+    prev = _last.get(k)
+    if prev is not None and now - prev[0] < every_s:
+        _last[k] = (prev[0], prev[1] + 1)
+        return False
+    _last[k] = (now, 0)
+    ts = datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    parts = [f"ts={ts}", f"level={level}", f"event={event}"]
+    parts.extend(f"{name}={_fmt(v)}" for name, v in fields.items())
+    if prev is not None and prev[1]:
+        parts.append(f"suppressed={prev[1]}")
+    _log.log(lvl, " ".join(parts))
+    return True
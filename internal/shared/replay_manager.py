@@ -0,0 +1,180 @@
+# internal/shared/replay_manager.py
+"""
+Replays controlados em runtime (sem reiniciar o uvicorn: WS e _last continuam).
+
+Cada replay é uma ReplaySession (CSVs do repositório) ou um FileReplay (gravação do
+firmware) rodando como task asyncio, identificado por um id. Pausa, velocidade e
+seek agem no relógio virtual do replay; status traz posição, atraso e linhas/s.
+"""
+from typing import Dict, Optional
+import asyncio
+import math
+import os
+import time
+
+from internal.shared.ratelog import log_event
+from internal.shared.replay_session import (
+    ReplaySession, REPLAY_CLONES, REPLAY_DEVICE_PREFIX, REPLAY_LOOP, REPLAY_SPEED, expand, is_repo_csv,
+)
+from internal.shared.serial_reader import FileReplay
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+REPLAY_MAX_RUNNING = int(os.getenv("REPLAY_MAX_RUNNING", "16"))
+
+
+class ReplayConflict(Exception):
+    """id ou device já em uso por outro replay rodando."""
+
+
+class _Entry:
+    __slots__ = ("replay", "task", "started", "error", "reported")
+
+    def __init__(self, replay, task: asyncio.Task):
+        self.replay = replay
+        self.task = task
+        self.started = time.time()
+        self.error = None       # exceção que encerrou o replay (str), se houver
+        self.reported = False   # já saiu num status() depois de terminar
+
+
+class ReplayManager:
+    def __init__(self, usecase):
+        self.usecase = usecase
+        self._replays: Dict[str, _Entry] = {}
+        self._seq = 0
+        self.id_prefix = "r"    # ids automáticos: r1, r2... (SHARED_STATE: único por worker)
+
+    def _running(self):
+        return {rid: e for rid, e in self._replays.items() if not e.task.done()}
+
+    def start(
+        self,
+        files=None,
+        path: Optional[str] = None,
+        device_id: Optional[str] = None,
+        speed: float = REPLAY_SPEED,
+        loop_: bool = REPLAY_LOOP,
+        clones: int = REPLAY_CLONES,
+        device_prefix: str = REPLAY_DEVICE_PREFIX,
+        replay_id: Optional[str] = None,
+        busy: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """
+        files: CSVs do repositório (glob/lista); path: gravação do firmware. Retorna o id.
+        busy: device -> quem grava nele fora deste manager (ex.: outro worker) -> ReplayConflict.
+        """
+        speed = float(speed)
+        if not (0 < speed < math.inf):
+            raise ValueError("speed deve ser finito e > 0 (para backfill use /replay/backfill)")
+        paths = expand(files) if files else []
+        if paths:
+            if not all(is_repo_csv(p) for p in paths):
+                raise ValueError("'files' deve listar só CSVs do repositório (ts,value,unit)")
+            replay = ReplaySession.from_spec(paths, speed=speed, loop_=loop_,
+                                             clones=clones, device_prefix=device_prefix)
+        elif path:
+            replay = FileReplay(path, device_id or os.getenv("SERIAL_DEVICE_ID", "arduino-01"),
+                                speed=speed, loop_=loop_)
+        else:
+            raise ValueError("informe 'files' (CSVs do repositório) ou 'path' (gravação do firmware)")
+
+        self._prune()
+        running = self._running()
+        if replay_id in running:
+            raise ReplayConflict(f"replay {replay_id} já está rodando")
+        if len(running) >= REPLAY_MAX_RUNNING:
+            raise ReplayConflict(f"limite de {REPLAY_MAX_RUNNING} replays atingido (REPLAY_MAX_RUNNING)")
+        mine = {d: f"replay {rid}" for rid, e in running.items() for d in e.replay.devices()}
+        for d in replay.devices():
+            owner = mine.get(d) or (busy or {}).get(d)
+            if owner:
+                raise ReplayConflict(f"device {d} já em uso ({owner})")
+
+        if replay_id is None:
+            self._seq += 1
+            while f"{self.id_prefix}{self._seq}" in self._replays:
+                self._seq += 1
+            replay_id = f"{self.id_prefix}{self._seq}"
+        self._replays[replay_id] = _Entry(replay, asyncio.create_task(self._run(replay_id, replay)))
+        return replay_id
+
+    async def _run(self, replay_id: str, replay):
+        try:
+            await replay.run(self.usecase)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            entry = self._replays.get(replay_id)
+            if entry is not None:
+                entry.error = f"{type(e).__name__}: {e}"
+            log_event("replay.failed", level="error", replay_id=replay_id, error=e)
+
+    def _prune(self):
+        """Tira os replays que terminaram e já apareceram num status()."""
+        for rid in [rid for rid, e in self._replays.items() if e.reported]:
+            del self._replays[rid]
+
+    def get(self, replay_id: Optional[str] = None):
+        """Replay pelo id; sem id, o único rodando."""
+        if replay_id is None:
+            running = self._running()
+            if len(running) != 1:
+                raise LookupError("informe 'id' (%d replays rodando)" % len(running))
+            return next(iter(running.values())).replay
+        e = self._replays.get(replay_id)
+        if e is None:
+            raise LookupError(f"replay {replay_id} não encontrado")
+        return e.replay
+
+    async def stop(self, replay_id: str) -> bool:
+        e = self._replays.pop(replay_id, None)
+        if e is None:
+            return False
+        e.task.cancel()
+        try:
+            await e.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        return True
+
+    async def stop_all(self):
+        for rid in list(self._replays):
+            await self.stop(rid)
+
+    def running(self) -> int:
+        return len(self._running())
+
+    def summary(self) -> Dict[str, dict]:
+        """Resumo dos replays rodando (tabela do cluster: /status e /replay/* dos outros workers)."""
+        out = {}
+        for rid, e in self._running().items():
+            st = e.replay.status()
+            out[rid] = {"devices": e.replay.devices(),
+                        **{k: st.get(k) for k in ("state", "speed", "paused", "position_s")}}
+        return out
+
+    def status(self, replay_id: Optional[str] = None) -> dict:
+        """Replays terminados (fim ou erro) aparecem uma última vez e saem da lista."""
+        self._prune()
+        if replay_id is not None:
+            e = self._replays.get(replay_id)
+            if e is None:
+                raise LookupError(f"replay {replay_id} não encontrado")
+            return self._entry_status(replay_id, e)
+        out = [self._entry_status(rid, e) for rid, e in self._replays.items()]
+        return {"count": len(out), "running": sum(1 for r in out if r["running"]), "replays": out}
+
+    @staticmethod
+    def _entry_status(replay_id: str, e: _Entry) -> dict:
+        done = e.task.done()
+        if done:
+            e.reported = True
+        return {
+            "id": replay_id,
+            "running": not done,
+            "error": e.error,
+            "uptime_s": round(time.time() - e.started, 1),
+            **e.replay.status(),
+        }
@@ -0,0 +1,414 @@
+# internal/shared/replay_session.py
+"""
+Replay de uma sessão gravada pelo repositório: vários CSVs por sensor
+(<device>__<sensor>.csv, formato ts,value,unit), de um ou mais devices.
+
+  - cada arquivo é lido em streaming (só os bytes que existiam no início da passada,
+    então gravar no mesmo diretório durante o replay não realimenta a leitura)
+  - merge k-way por timestamp (heapq.merge) -> linhas com o mesmo ts do mesmo
+    device viram um frame (como foram gravadas)
+  - um único scheduler num relógio virtual compartilhado (speed, pausa) dirige
+    todos os devices; buracos maiores que REPLAY_MAX_GAP_S são comprimidos
+  - clones=N replica cada device N vezes (teste de carga dos dashboards) sem
+    reler nem refazer o merge
+  - speed=inf / backfill(): sem timing nem usecase; grava direto no repositório em
+    blocos (save_arrays) com os timestamps originais
+  - seek(offset_s) pula pelo índice esparso (.idx) de cada CSV, sem reler do início
+
+Playback é o laço de reprodução comum (relógio, seek, pausa, contadores) também
+usado pelo replay da gravação do firmware (serial_reader.FileReplay).
+"""
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import asyncio
+import glob
+import heapq
+import math
+import os
+import time
+
+import numpy as np
+from datetime import datetime, timezone
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.sensor.repository.csv_store import index_offset, iter_csv_blocks
+from internal.shared.timeutil import parse_iso_ns
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+REPLAY_SPEED          = float(os.getenv("REPLAY_SPEED", "1.0"))
+REPLAY_LOOP           = os.getenv("REPLAY_LOOP", "true").lower() in ("1","true","yes","on")
+REPLAY_MAX_GAP_S      = float(os.getenv("REPLAY_MAX_GAP_S", "5.0"))
+REPLAY_CLONES         = int(os.getenv("REPLAY_CLONES", "1"))
+REPLAY_DEVICE_PREFIX  = os.getenv("REPLAY_DEVICE_PREFIX", "replay-")   # não grava por cima do device original
+NAN_POLICY            = os.getenv("REPLAY_NAN_POLICY", "keep").lower()
+
+_HEADER = b"ts,value,unit"
+
+
+def is_repo_csv(path: str) -> bool:
+    """True se o arquivo tem o cabeçalho dos CSVs do repositório (ts,value,unit)."""
+    try:
+        with open(path, "rb") as f:
+            return f.readline().strip() == _HEADER
+    except OSError:
+        return False
+
+def split_name(path: str) -> Tuple[str, str]:
+    """'data/dev__pressure.csv' -> ('dev', 'pressure')."""
+    stem = os.path.basename(path)
+    if stem.lower().endswith(".csv"):
+        stem = stem[:-4]
+    dev, sep, sensor = stem.partition("__")   # mesmo critério do repositório: device até o 1º "__"
+    if not sep:
+        raise ValueError(f"nome fora do padrão <device>__<sensor>.csv: {path}")
+    return dev, sensor
+
+def expand(spec) -> List[str]:
+    """Lista de caminhos/globs (ou string separada por vírgula) -> arquivos existentes, sem repetição."""
+    if isinstance(spec, str):
+        spec = [s.strip() for s in spec.split(",") if s.strip()]
+    out = []
+    for item in spec:
+        matches = sorted(glob.glob(item)) if glob.has_magic(item) else [item]
+        out.extend(m for m in matches if os.path.isfile(m) and m not in out)
+    return out
+
+
+class Source:
+    """Um CSV por sensor; 'limit' fixa o tamanho lido (snapshot no início da passada)."""
+    __slots__ = ("path", "device_id", "sensor")
+
+    def __init__(self, path: str, device_id: Optional[str] = None, sensor: Optional[str] = None):
+        dev, sen = split_name(path) if device_id is None or sensor is None else (device_id, sensor)
+        self.path = path
+        self.device_id = device_id or dev
+        self.sensor = sensor or sen
+
+    def rows(self, limit: int, idx: int, from_ns: Optional[int] = None) -> Iterator[Tuple[int, int, float, str]]:
+        """
+        (ts_ns, idx, value, unit) em ordem de arquivo; linhas inválidas são puladas.
+        from_ns: começa pela entrada do .idx anterior e descarta só o resto do bloco.
+        """
+        with open(self.path, "rb") as f:
+            pos = index_offset(self.path, from_ns) if from_ns is not None else 0
+            f.seek(pos)
+            for line in f:
+                pos += len(line)
+                if pos > limit:
+                    break
+                parts = line.rstrip(b"\r\n").split(b",", 2)
+                if len(parts) < 2:
+                    continue
+                ns = parse_iso_ns(parts[0].decode("ascii", "ignore"))
+                if ns is None or (from_ns is not None and ns < from_ns):
+                    continue   # cabeçalho, lixo ou antes do seek
+                try:
+                    value = float(parts[1])
+                except ValueError:
+                    continue
+                unit = parts[2].decode("utf-8", "ignore").strip('"') if len(parts) > 2 else ""
+                yield ns, idx, value, unit
+
+    def first_ns(self) -> Optional[int]:
+        for ns, _, _, _ in self.rows(os.path.getsize(self.path), 0):
+            return ns
+        return None
+
+
+class VirtualClock:
+    """
+    Posição virtual (s) = avança speed x o relógio real; pausa e troca de velocidade
+    acordam quem está esperando em wait_until; interrupt() (seek) faz wait_until retornar.
+    """
+    def __init__(self, speed: float = 1.0):
+        self.speed = max(1e-6, float(speed))
+        self.paused = False
+        self._pos = 0.0
+        self._wall = time.monotonic()
+        self._epoch = 0
+        self._changed = asyncio.Event()
+
+    def position(self) -> float:
+        if self.paused:
+            return self._pos
+        return self._pos + (time.monotonic() - self._wall) * self.speed
+
+    def _rebase(self, pos: Optional[float] = None):
+        self._pos = self.position() if pos is None else pos
+        self._wall = time.monotonic()
+        self._changed.set()
+
+    def set_speed(self, speed: float):
+        self._rebase()
+        self.speed = max(1e-6, float(speed))
+
+    def pause(self):
+        self._rebase()
+        self.paused = True
+
+    def resume(self):
+        self._rebase()
+        self.paused = False
+
+    def seek(self, pos: float):
+        self._rebase(max(0.0, float(pos)))
+
+    def interrupt(self):
+        self._epoch += 1
+        self._changed.set()
+
+    async def wait_until(self, pos: float):
+        epoch = self._epoch
+        while self._epoch == epoch:
+            self._changed.clear()
+            if not self.paused:
+                delay = (pos - self.position()) / self.speed
+                if delay <= 0:
+                    return
+            else:
+                delay = None
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                return
+
+
+class Playback:
+    """
+    Laço de reprodução comum. A subclasse implementa _pass(start_s), que gera
+    (pos_s, at_s, devices, [(sensor, valor, unidade)]): pos_s é o tempo virtual desde
+    o início da passada (buracos já comprimidos) e at_s a posição na gravação.
+    """
+    def __init__(self, speed: float, loop_: bool):
+        self.loop_ = loop_
+        self.clock = VirtualClock(speed)
+        self.state = "idle"
+        self.stats = {"passes": 0, "rows": 0, "frames": 0, "readings": 0,
+                      "position_s": 0.0, "rows_per_s": 0.0, "lag_s": 0.0, "lag_max_s": 0.0}
+        self._seek_to: Optional[float] = None
+        self._rate_t0 = self._last_emit = time.monotonic()
+        self._rate_n = 0
+
+    def _pass(self, start_s: float):
+        raise NotImplementedError
+
+    def devices(self) -> List[str]:
+        raise NotImplementedError
+
+    def _rows_in(self, items) -> int:
+        """Linhas da gravação num frame (CSVs do repositório: uma por leitura)."""
+        return len(items)
+
+    def seek(self, offset_s: float):
+        """Vai para offset_s segundos da gravação (vale na próxima amostra, mesmo pausado)."""
+        self._seek_to = max(0.0, float(offset_s))
+        self.stats["position_s"] = round(self._seek_to, 3)
+        self.clock.interrupt()
+
+    def _count(self, rows: int):
+        self.stats["rows"] += rows
+        self._rate_n += rows
+        now = self._last_emit = time.monotonic()
+        dt = now - self._rate_t0
+        if dt >= 1.0:
+            self.stats["rows_per_s"] = round(self._rate_n / dt, 1)
+            self._rate_t0, self._rate_n = now, 0
+
+    async def run(self, usecase):
+        keep_nan = NAN_POLICY != "drop"
+        start = 0.0
+        self.state = "running"
+        try:
+            while True:
+                if start == 0.0:
+                    self.stats["passes"] += 1
+                self.clock.seek(0.0)
+                emitted = False
+                frames = self._pass(start)
+                try:
+                    for pos, at, devices, items in frames:
+                        if pos > self.clock.position() or self.clock.paused:
+                            await self.clock.wait_until(pos)
+                        if self._seek_to is not None:
+                            break
+                        lag = max(0.0, (self.clock.position() - pos) / self.clock.speed)
+                        self.stats["lag_s"] = round(lag, 4)
+                        if lag > self.stats["lag_max_s"]:
+                            self.stats["lag_max_s"] = round(lag, 4)
+                        self.stats["position_s"] = round(at, 3)
+
+                        now = datetime.now(timezone.utc)
+                        kept = items if keep_nan else [it for it in items if it[1] == it[1]]
+                        if kept:
+                            await asyncio.gather(*(usecase.ingest_batch(
+                                [Reading(device_id=dev, sensor=s, value=v, unit=u, ts=now) for s, v, u in kept])
+                                for dev in devices))
+                            self.stats["frames"] += len(devices)
+                            self.stats["readings"] += len(devices) * len(kept)
+                        self._count(self._rows_in(items))
+                        emitted = True
+                finally:
+                    close = getattr(frames, "close", None)
+                    if close:
+                        close()
+
+                if self._seek_to is not None:
+                    start, self._seek_to = self._seek_to, None
+                    continue
+                if not self.loop_ or (not emitted and start == 0.0):
+                    break   # fim (ou gravação vazia); seek além do fim com loop volta ao início
+                start = 0.0
+                await asyncio.sleep(0.2)
+            self.state = "finished"
+        except asyncio.CancelledError:
+            self.state = "stopped"
+            raise
+        except Exception as e:
+            self.state = f"error: {e}"
+            raise
+
+    def status(self) -> dict:
+        out = {
+            "state": self.state,
+            "devices": self.devices(),
+            "speed": self.clock.speed,
+            "paused": self.clock.paused,
+            "loop": self.loop_,
+            **self.stats,
+        }
+        if time.monotonic() - self._last_emit > 2.0:
+            out["rows_per_s"] = 0.0
+        return out
+
+
+class ReplaySession(Playback):
+    def __init__(
+        self,
+        sources: Sequence[Source],
+        speed: float = REPLAY_SPEED,
+        loop_: bool = REPLAY_LOOP,
+        clones: int = REPLAY_CLONES,
+        device_prefix: str = REPLAY_DEVICE_PREFIX,
+        max_gap_s: float = REPLAY_MAX_GAP_S,
+    ):
+        if not sources:
+            raise ValueError("nenhum arquivo para o replay")
+        super().__init__(speed, loop_)
+        self.sources = list(sources)
+        self.clones = max(1, int(clones))
+        self.device_prefix = device_prefix or ""
+        self.max_gap_ns = int(max_gap_s * 1e9)
+        self._t0_ns: Optional[int] = None
+        # device de origem -> ids emitidos (prefixo + clones)
+        self._targets: Dict[str, List[str]] = {}
+        for src in self.sources:
+            if src.device_id not in self._targets:
+                base = self.device_prefix + src.device_id
+                self._targets[src.device_id] = [base] if self.clones == 1 else \
+                    [f"{base}-{k:02d}" for k in range(1, self.clones + 1)]
+
+    @classmethod
+    def from_spec(cls, spec, **kw) -> "ReplaySession":
+        """Arquivos/globs no padrão do repositório (ex.: 'data/*__*.csv' ou 'a.csv,b.csv')."""
+        paths = [p for p in expand(spec) if is_repo_csv(p)]
+        return cls([Source(p) for p in paths], **kw)
+
+    def devices(self) -> List[str]:
+        return [d for ids in self._targets.values() for d in ids]
+
+    def t0_ns(self) -> Optional[int]:
+        """1º timestamp da sessão (origem do offset_s do seek/position_s)."""
+        if self._t0_ns is None:
+            firsts = [ns for ns in (s.first_ns() for s in self.sources) if ns is not None]
+            self._t0_ns = min(firsts) if firsts else None
+        return self._t0_ns
+
+    def frames(self, from_ns: Optional[int] = None) -> Iterator[Tuple[int, str, List[Tuple[str, float, str]]]]:
+        """
+        Uma passada: (ts_ns, device de origem, [(sensor, valor, unidade)]) em ordem de tempo.
+        Leituras com o mesmo ts e device são agrupadas num frame.
+        """
+        srcs = self.sources
+        limits = [os.path.getsize(s.path) for s in srcs]
+        merged = heapq.merge(*(s.rows(lim, i, from_ns) for i, (s, lim) in enumerate(zip(srcs, limits))))
+        cur_ts = None
+        group: Dict[str, List[Tuple[str, float, str]]] = {}
+        for ts, i, value, unit in merged:
+            if ts != cur_ts:
+                for dev, items in group.items():
+                    yield cur_ts, dev, items
+                group = {}
+                cur_ts = ts
+            src = srcs[i]
+            group.setdefault(src.device_id, []).append((src.sensor, value, unit or None))
+        for dev, items in group.items():
+            yield cur_ts, dev, items
+
+    def _pass(self, start_s: float):
+        t0 = self.t0_ns()
+        if t0 is None:
+            return
+        pos_ns = 0
+        prev_ts = None
+        for ts, dev, items in self.frames(t0 + int(start_s * 1e9) if start_s else None):
+            # tempo virtual = tempo gravado com os buracos limitados a max_gap
+            if prev_ts is not None:
+                pos_ns += min(max(ts - prev_ts, 0), self.max_gap_ns)
+            prev_ts = ts
+            yield pos_ns / 1e9, (ts - t0) / 1e9, self._targets[dev], items
+
+    def backfill(self, repo, shift_ns: int = 0, block_rows: int = 65536) -> dict:
+        """
+        Grava a sessão inteira no repositório sem timing, em blocos por arquivo, com os
+        ts originais (+ shift_ns). Bloqueante: rodar no executor. Destino que já tem dados
+        mais novos que o bloco -> OutOfOrder (ValueError) do CsvStore; o que já foi gravado fica.
+        """
+        keep_nan = NAN_POLICY != "drop"
+        src_paths = {os.path.abspath(s.path) for s in self.sources}
+        for src in self.sources:
+            for target in self._targets[src.device_id]:
+                if os.path.abspath(repo._csv(target, src.sensor)) in src_paths:
+                    raise ValueError(f"backfill gravaria em cima da origem ({src.path}); use device_prefix ou clones")
+
+        t0 = time.perf_counter()
+        rows = readings = 0
+        for src in self.sources:
+            for ts, values, unit in iter_csv_blocks(src.path, block_rows):
+                if not keep_nan:
+                    ok = ~np.isnan(values)
+                    ts, values = ts[ok], values[ok]
+                if len(ts) > 1 and bool(np.any(np.diff(ts) < 0)):
+                    # origem com sessões concatenadas fora de ordem: ordena o bloco (entre
+                    # blocos, o CsvStore recusa o que começar antes do fim do destino)
+                    order = np.argsort(ts, kind="stable")
+                    ts, values = ts[order], values[order]
+                if shift_ns:
+                    ts = ts + shift_ns
+                rows += len(ts)
+                for target in self._targets[src.device_id]:
+                    readings += repo.save_arrays(target, src.sensor, ts, values, unit)
+        repo.flush()
+        dt = max(time.perf_counter() - t0, 1e-9)
+        self.stats["rows"] += rows
+        self.stats["readings"] += readings
+        return {
+            "files": len(self.sources),
+            "devices": self.devices(),
+            "rows": rows,
+            "readings": readings,
+            "seconds": round(dt, 3),
+            "rows_per_s": round(rows / dt),
+            "readings_per_s": round(readings / dt),
+        }
+
+    async def run(self, usecase):
+        if math.isinf(self.clock.speed):
+            # speed=inf: backfill direto no repositório (uma passada, ts originais)
+            res = await asyncio.get_running_loop().run_in_executor(None, self.backfill, usecase.repo)
+            print(f"[replay] backfill: {res['rows']} linhas em {res['seconds']}s ({res['rows_per_s']} linhas/s)")
+            return res
+        return await super().run(usecase)
+
+    def status(self) -> dict:
+        return {"files": [s.path for s in self.sources], **super().status()}
@@ -0,0 +1,128 @@
+# internal/shared/serial_manager.py
+"""
+Várias portas seriais (uma por prensa) no mesmo processo.
+
+Cada sessão é um SerialReader (chave = porta, device_id único) rodando como task
+asyncio com reconexão por backoff. Todas as sessões alimentam o mesmo pipeline de
+ingest: SERIAL_INGEST_WORKERS filas limitadas, cada porta sempre na mesma fila
+(crc32 da porta) para manter a ordem das linhas — os filtros são por sessão.
+"""
+from typing import Dict, Optional
+import asyncio
+import os
+import time
+import zlib
+
+from internal.shared.serial_reader import SerialReader, consume_lines, serial_asyncio, SERIAL_QUEUE_MAX
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+SERIAL_INGEST_WORKERS = int(os.getenv("SERIAL_INGEST_WORKERS", "4"))
+SERIAL_MAX_SESSIONS   = int(os.getenv("SERIAL_MAX_SESSIONS", "64"))
+
+
+class SessionConflict(Exception):
+    """Porta ou device_id já em uso por outra sessão."""
+
+
+class _Session:
+    __slots__ = ("reader", "task", "started")
+
+    def __init__(self, reader: SerialReader, task: asyncio.Task):
+        self.reader = reader
+        self.task = task
+        self.started = time.time()
+
+
+class SerialSessionManager:
+    def __init__(self, usecase, workers: int = SERIAL_INGEST_WORKERS):
+        self.usecase = usecase
+        self.n_workers = max(1, workers)
+        self._sessions: Dict[str, _Session] = {}
+        self._queues = []
+        self._workers = []
+
+    def _ensure_workers(self):
+        # criado sob demanda: as filas/tasks precisam do event loop rodando
+        if self._workers:
+            return
+        for _ in range(self.n_workers):
+            q = asyncio.Queue(maxsize=SERIAL_QUEUE_MAX)
+            self._queues.append(q)
+            self._workers.append(asyncio.create_task(consume_lines(q)))
+
+    def _prune(self):
+        for port in [p for p, s in self._sessions.items() if s.task.done()]:
+            del self._sessions[port]
+
+    def start(self, port: str, baud: int, device_id: str) -> SerialReader:
+        if serial_asyncio is None:
+            raise RuntimeError("pyserial-asyncio não disponível (pip install pyserial-asyncio).")
+        self._prune()
+        if port in self._sessions:
+            raise SessionConflict(f"Serial já rodando em {port} (device {self._sessions[port].reader.device_id}).")
+        for s in self._sessions.values():
+            if s.reader.device_id == device_id:
+                raise SessionConflict(f"device_id {device_id} já em uso na porta {s.reader.port}.")
+        if len(self._sessions) >= SERIAL_MAX_SESSIONS:
+            raise SessionConflict(f"limite de {SERIAL_MAX_SESSIONS} sessões atingido (SERIAL_MAX_SESSIONS).")
+
+        self._ensure_workers()
+        q = self._queues[zlib.crc32(port.encode()) % self.n_workers]
+        reader = SerialReader(port, baud, self.usecase, device_id=device_id, queue=q)
+        self._sessions[port] = _Session(reader, asyncio.create_task(reader.run()))
+        return reader
+
+    def find(self, port: Optional[str] = None, device_id: Optional[str] = None):
+        """Portas das sessões que casam com port/device_id (nenhum filtro -> todas)."""
+        self._prune()
+        return [p for p, s in self._sessions.items()
+                if (port is None or p == port) and (device_id is None or s.reader.device_id == device_id)]
+
+    async def stop(self, port: str) -> bool:
+        s = self._sessions.pop(port, None)
+        if s is None:
+            return False
+        s.task.cancel()
+        try:
+            await s.task
+        except (asyncio.CancelledError, Exception):
+            pass
+        return True
+
+    async def stop_all(self):
+        for port in list(self._sessions):
+            await self.stop(port)
+        for t in self._workers:
+            t.cancel()
+        self._workers, self._queues = [], []
+
+    def queue_depths(self):
+        """Linhas pendentes em cada fila de ingest."""
+        return [q.qsize() for q in self._queues]
+
+    def running(self) -> int:
+        self._prune()
+        return len(self._sessions)
+
+    def sessions(self):
+        now = time.time()
+        out = []
+        for port, s in self._sessions.items():
+            r = s.reader
+            out.append({
+                "port": port,
+                "device_id": r.device_id,
+                "baudrate": r.baud,
+                "connected": r.connected,
+                "running": not s.task.done(),
+                "uptime_s": round(now - s.started, 1),
+                **r.snapshot(),
+            })
+        return {
+            "count": len(out),
+            "workers": self.n_workers,
+            "queue_depth": self.queue_depths(),
+            "sessions": out,
+        }
@@ -5,14 +5,29 @@ import json
 import csv
 import math
 import time
-import statistics
-import serial
-import serial.asyncio
+import random
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, Tuple, Optional, List
 
-from internal.sensor.domain.sensor_model import SensorReading
-from internal.shared.filter import SensorFilter  # usamos um filtro por sensor
+import numpy as np
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.shared.filter import SensorFilter, HampelFilter, DeadbandSlew, HAMPEL_MAX_WIN  # um filtro por sensor
+from internal.shared import filter_np as fnp
 from internal.shared.calib import CAL_PRESSURE
+from internal.shared.replay_session import Playback
+from internal.shared import metrics
+from internal.shared.ratelog import log_event
+
+# asyncio nativo para a serial (pip install pyserial-asyncio); versões antigas expunham serial.asyncio
+try:
+    import serial_asyncio
+except Exception:
+    try:
+        import serial.asyncio as serial_asyncio
+    except Exception:
+        serial_asyncio = None
 
 # =============================================================================
 # Config via ENV (replay + filtros)
@@ -39,15 +54,38 @@ SERIAL_PRESS_MIN_KPA   = float(os.getenv("SERIAL_PRESS_MIN_KPA", "0"))
 SERIAL_PRESS_MAX_KPA   = float(os.getenv("SERIAL_PRESS_MAX_KPA", "400"))
 SERIAL_PRESS_MAX_STEP  = float(os.getenv("SERIAL_PRESS_MAX_STEP", "300"))  # kPa
 SERIAL_HOLD_LAST_ON_NAN = os.getenv("SERIAL_HOLD_LAST_ON_NAN","true").lower() in ("1","true","yes","on")
+SERIAL_HAMPEL_WIN     = int(os.getenv("SERIAL_HAMPEL_WIN", "7"))           # Hampel causal ao vivo (0 desliga)
+SERIAL_HAMPEL_K       = float(os.getenv("SERIAL_HAMPEL_K", "3.0"))
+SERIAL_QUEUE_MAX      = int(os.getenv("SERIAL_QUEUE_MAX", "256"))          # linhas lidas aguardando ingest
+SERIAL_READ_LIMIT     = int(os.getenv("SERIAL_READ_LIMIT", str(1 << 20)))  # bytes bufferizados no StreamReader
+SERIAL_RETRY_S        = float(os.getenv("SERIAL_RETRY_S", "2.0"))           # 1ª espera antes de reabrir
+SERIAL_RETRY_MAX_S    = float(os.getenv("SERIAL_RETRY_MAX_S", "30.0"))      # teto do backoff exponencial
+PRESS_MIN_KPA         = float(os.getenv("REPLAY_PRESS_MIN_KPA", "0"))
+PRESS_MAX_KPA         = float(os.getenv("REPLAY_PRESS_MAX_KPA", "300"))
 DIST_MIN_MM           = float(os.getenv("REPLAY_DIST_MIN_MM", "0"))
 DIST_MAX_MM           = float(os.getenv("REPLAY_DIST_MAX_MM", "2000"))
 TEMP_MIN_C            = float(os.getenv("REPLAY_TEMP_MIN_C", "-50"))
 TEMP_MAX_C            = float(os.getenv("REPLAY_TEMP_MAX_C", "350"))
 
 NAN_POLICY            = os.getenv("REPLAY_NAN_POLICY", "keep").lower()    # "keep" | "drop"
+REPLAY_CACHE_FILES    = int(os.getenv("REPLAY_CACHE_FILES", "4"))         # arquivos com trilhas filtradas em cache
+REPLAY_STREAM         = os.getenv("REPLAY_STREAM", "auto").lower()        # auto | true | false
+REPLAY_STREAM_MIN_MB  = float(os.getenv("REPLAY_STREAM_MIN_MB", "16"))    # auto: streaming a partir deste tamanho
+
+# janela grande deixaria o Hampel incremental O(w) por amostra: falha no boot, não no meio da sessão
+for _name, _win in (("REPLAY_HAMPEL_WIN", Hampel_window), ("SERIAL_HAMPEL_WIN", SERIAL_HAMPEL_WIN)):
+    if _win > HAMPEL_MAX_WIN:
+        raise ValueError(f"{_name}={_win}: máximo {HAMPEL_MAX_WIN}")
 
 BRACKET_RE = re.compile(r"\[(.*?)\]")  # para o formato [..][..][..]
 
+# Chaves aceitas no JSON da serial (firmware atual + nomes antigos/inglês)
+_KEYS_TEMP      = ("temperatura_C", "temperature")
+_KEYS_PRESS_KPA = ("pressao_kPa", "pressao_kpa", "pressure")
+_KEYS_DIST      = ("distancia_mm", "distance")
+_KEYS_IR_BREAD  = ("IR_pao", "ir_bread")
+_KEYS_IR_HAND   = ("IR_mao", "ir_hand")
+
 # =============================================================================
 # Helpers genéricos
 # =============================================================================
@@ -104,88 +142,272 @@ def _ts_ms(row: Dict) -> Optional[float]:
                 return v*1000.0
     return None
 
-def _hampel(series: List[float], w: int, k: float) -> List[float]:
-    if w < 3 or w % 2 == 0: 
-        return series[:]
-    n=len(series); r=series[:]
-    half=w//2
-    for i in range(n):
-        a=max(0, i-half); b=min(n, i+half+1)
-        window=[x for x in series[a:b] if not math.isnan(x)]
-        if len(window)<3: 
-            continue
-        med=statistics.median(window)
-        mad=statistics.median([abs(x-med) for x in window]) or 1e-9
-        if not math.isnan(series[i]) and abs(series[i]-med) > k*1.4826*mad:
-            r[i]=med
-    return r
-
-def _movavg(series: List[float], w: int) -> List[float]:
-    if w<=1: 
-        return series[:]
-    out=[]; q=[]; s=0.0
-    for x in series:
-        if math.isnan(x):
-            out.append(x); 
-            continue
-        q.append(x); s+=x
-        if len(q)>w: 
-            s-=q.pop(0)
-        out.append(s/len(q))
-    return out
-
-def _ema(series: List[float], alpha: float) -> List[float]:
-    out=[]; y=None
-    for x in series:
-        if math.isnan(x):
-            out.append(x); 
-            continue
-        y = x if y is None or math.isnan(y) else (alpha*x + (1-alpha)*y)
-        out.append(y)
-    return out
-
-def _deadband_apply(prev: Optional[float], new: float, db: float) -> float:
-    if prev is None or math.isnan(prev) or math.isnan(new): 
-        return new
-    return prev if abs(new - prev) <= db else new
-
-def _slew_limit(prev: Optional[float], new: float, max_per_s: float, dt_s: float) -> float:
-    if prev is None or math.isnan(prev) or math.isnan(new): 
-        return new
-    max_delta = max_per_s * max(dt_s, 1e-6)
-    if new > prev + max_delta: 
-        return prev + max_delta
-    if new < prev - max_delta: 
-        return prev - max_delta
-    return new
-
-def _clean_and_filter_track(t_ms: List[float], v: List[float], kind: str) -> List[float]:
-    # 1) remove absurdos por faixa
-    low, high = {
+def _track_range(kind: str) -> Tuple[float, float]:
+    return {
         "pressure": (PRESS_MIN_KPA, PRESS_MAX_KPA),
         "distance": (DIST_MIN_MM,  DIST_MAX_MM),
         "temperature": (TEMP_MIN_C, TEMP_MAX_C),
     }.get(kind, (-1e9, 1e9))
-    v = [x if (not math.isnan(x) and low <= x <= high) else float("nan") for x in v]
 
-    # 2) corta warmup (primeiros REPLAY_WARMUP_S)
-    if t_ms and REPLAY_WARMUP_S > 0:
-        t0 = t_ms[0]
-        for i,tm in enumerate(t_ms):
-            if (tm - t0) >= REPLAY_WARMUP_S*1000.0:
-                v = v[i:]; t_ms[:] = t_ms[i:]
-                break
+def _press_raw(r: Dict) -> float:
+    """Pressão da linha em kPa: prioriza 'pressao_volts' (calibrado), senão 'pressao_kPa'."""
+    if "pressao_volts" in r:
+        vv = _safe_float(r["pressao_volts"])
+        return float(CAL_PRESSURE.apply(vv)) if not math.isnan(vv) else float("nan")
+    if "pressao_kPa" in r:
+        return _safe_float(r["pressao_kPa"])
+    return float("nan")
+
+def _ir_raw(r: Dict, key: str) -> float:
+    v = _safe_float(r.get(key, float("nan")))
+    return v if math.isnan(v) else (1.0 if v >= 0.5 else 0.0)
+
+def _clean_and_filter_track(v, kind: str) -> np.ndarray:
+    """Faixa de sanidade -> Hampel (mata outliers de calibração) -> EMA ou média móvel."""
+    # 1) remove absurdos por faixa
+    low, high = _track_range(kind)
+    v = fnp.range_mask(v, low, high)
 
-    # 3) Hampel (mata outliers de calibração)
-    v = _hampel(v, Hampel_window, Hampel_k)
+    # 2) Hampel (o warmup já foi cortado de todas as trilhas juntas)
+    v = fnp.hampel(v, Hampel_window, Hampel_k)
 
-    # 4) suavização principal: EMA ou média móvel
+    # 3) suavização principal: EMA ou média móvel
     if Use_EMA:
-        v = _ema(v, EMA_alpha)
+        return fnp.ema(v, EMA_alpha)
+    return fnp.movavg(v, AVG_window)
+
+def _build_tracks(rows: List[Dict]) -> Dict[str, Any]:
+    """Linhas do arquivo -> trilhas já filtradas (pós-filtro incluso), prontas para emitir."""
+    # timestamps
+    t = [_ts_ms(r) for r in rows]
+    # se não há timestamp, sintetiza linear
+    if all(v is None for v in t):
+        t = [i*REPLAY_DEFAULT_DT_S*1000.0 for i in range(len(rows))]
     else:
-        v = _movavg(v, AVG_window)
+        # substitui None por anterior + default
+        for i in range(len(t)):
+            if t[i] is None:
+                t[i] = (t[i-1] + REPLAY_DEFAULT_DT_S*1000.0) if i>0 else 0.0
+
+    # corta warmup (primeiros REPLAY_WARMUP_S) de TODAS as trilhas, mantendo-as alinhadas
+    cut = fnp.warmup_index(t, REPLAY_WARMUP_S)
+    rows = rows[cut:]
+    t = np.asarray(t[cut:], dtype=np.float64)
+
+    # trilhas
+    press = _clean_and_filter_track([_press_raw(r) for r in rows], "pressure")
+    dist = _clean_and_filter_track([_safe_float(r.get("distancia_mm", float("nan"))) for r in rows], "distance")
+    temp = _clean_and_filter_track([_safe_float(r.get("temperatura_C", float("nan"))) for r in rows], "temperature")
+
+    # intervalo real entre amostras (timing) e dt do pós-filtro (nunca abaixo do período padrão)
+    diff_ms = np.diff(t, prepend=t[:1])
+    gap_s = np.clip(diff_ms, 0.0, REPLAY_MAX_GAP_S*1000.0) / 1000.0
+    dt_s = np.maximum(REPLAY_DEFAULT_DT_S, diff_ms / 1000.0)
+    if len(dt_s):
+        dt_s[0] = REPLAY_DEFAULT_DT_S
+
+    # pós-filtro on-the-fly (deadband + slew); temperatura segura o último valor em NaN
+    return {
+        "n": len(rows),
+        "t_ms": t,
+        "gap_s": gap_s.tolist(),
+        "pressao_kPa": fnp.deadband_slew(press, dt_s, Deadband, Slew_kpa_per_s).tolist(),
+        "distancia_mm": fnp.deadband_slew(dist, dt_s, Deadband, Slew_mm_per_s).tolist(),
+        "temperatura_C": fnp.deadband_slew(temp, dt_s, Deadband*0.2, 3.0, hold_nan=True).tolist(),
+        "IR_pao": [_ir_raw(r, "IR_pao") for r in rows],
+        "IR_mao": [_ir_raw(r, "IR_mao") for r in rows],
+    }
+
+_TRACK_CACHE: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+
+def _load_tracks(path: str) -> Optional[Dict[str, Any]]:
+    """Trilhas filtradas do arquivo, em cache por (caminho, mtime, tamanho): o REPLAY_LOOP não refiltra."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    tracks = _TRACK_CACHE.get(key)
+    if tracks is not None:
+        _TRACK_CACHE.move_to_end(key)
+        return tracks
+
+    it, fh = _open_iter(path)
+    try:
+        rows = list(it)
+    finally:
+        if fh:
+            try:
+                fh.close()
+            except Exception:
+                pass
+    if not rows:
+        return None
+    tracks = _build_tracks(rows)
+    if REPLAY_CACHE_FILES > 0:
+        _TRACK_CACHE[key] = tracks
+        while len(_TRACK_CACHE) > REPLAY_CACHE_FILES:
+            _TRACK_CACHE.popitem(last=False)
+    return tracks
+
+# campo do payload -> (sensor, unidade), na ordem de emissão
+_REPLAY_FIELDS = (
+    ("pressao_kPa", "pressure", "kPa"),
+    ("distancia_mm", "distance", "mm"),
+    ("temperatura_C", "temperature", "C"),
+    ("IR_pao", "ir_bread", None),
+    ("IR_mao", "ir_hand", None),
+)
+
+def _iter_cached(tracks: Dict[str, Any]):
+    """Trilhas em cache -> (intervalo_s, valores por campo de _REPLAY_FIELDS) por linha."""
+    cols = [tracks[k] for k, _, _ in _REPLAY_FIELDS]
+    return zip(tracks["gap_s"], zip(*cols))
 
-    return v
+# =============================================================================
+# Replay em streaming (memória constante: look-ahead do Hampel + warmup)
+# =============================================================================
+def _iter_rows_ts(path: str):
+    """(t_ms, linha) sem carregar o arquivo; sem timestamp -> anterior + período padrão (0 na 1ª)."""
+    it, fh = _open_iter(path)
+    try:
+        prev = None
+        for r in it:
+            tm = _ts_ms(r)
+            if tm is None:
+                tm = prev + REPLAY_DEFAULT_DT_S*1000.0 if prev is not None else 0.0
+            prev = tm
+            yield tm, r
+    finally:
+        if fh:
+            try:
+                fh.close()
+            except Exception:
+                pass
+
+def _skip_warmup(rows):
+    """Descarta os primeiros REPLAY_WARMUP_S; se o arquivo nem chega lá, não corta nada."""
+    rows = iter(rows)
+    if REPLAY_WARMUP_S <= 0:
+        yield from rows
+        return
+    head = []
+    t0 = None
+    for tm, r in rows:
+        if t0 is None:
+            t0 = tm
+        if tm - t0 >= REPLAY_WARMUP_S*1000.0:
+            yield tm, r
+            break
+        head.append((tm, r))
+    else:
+        yield from head
+        return
+    yield from rows
+
+class _StreamTrack:
+    """Uma trilha contínua em streaming: faixa -> Hampel centrado (atraso de win//2) -> EMA/média móvel."""
+    def __init__(self, kind: str):
+        self.low, self.high = _track_range(kind)
+        self.hampel = HampelFilter(Hampel_window, Hampel_k)
+        self.y = None
+        self.q = deque()
+        self.s = 0.0
+
+    def _smooth(self, x: float) -> float:
+        if x != x:
+            return x
+        if Use_EMA:
+            self.y = x if self.y is None else (EMA_alpha*x + (1-EMA_alpha)*self.y)
+            return self.y
+        if AVG_window <= 1:
+            return x
+        self.q.append(x); self.s += x
+        if len(self.q) > AVG_window:
+            self.s -= self.q.popleft()
+        return self.s/len(self.q)
+
+    def push(self, x: float) -> Optional[float]:
+        if not (self.low <= x <= self.high):
+            x = float("nan")
+        y = self.hampel.add(x)
+        return None if y is None else self._smooth(y)
+
+    def flush(self) -> List[float]:
+        return [self._smooth(y) for y in self.hampel.flush()]
+
+def _iter_stream(path: str):
+    """
+    Mesmo pipeline do modo em cache, linha a linha: (intervalo_s, valores) por linha.
+    As linhas ficam numa fila só enquanto estão no look-ahead do Hampel (win//2).
+    """
+    tracks = (_StreamTrack("pressure"), _StreamTrack("distance"), _StreamTrack("temperature"))
+    post = (DeadbandSlew(Deadband, Slew_kpa_per_s),
+            DeadbandSlew(Deadband, Slew_mm_per_s),
+            DeadbandSlew(Deadband*0.2, 3.0, hold_nan=True))
+    pending = deque()   # (intervalo_s, dt_s, IR_pao, IR_mao) das linhas ainda sem saída do Hampel
+    nan = float("nan")
+
+    def emit(vals):
+        gap, dt, ir_pao, ir_mao = pending.popleft()
+        return gap, (post[0].step(vals[0], dt), post[1].step(vals[1], dt), post[2].step(vals[2], dt), ir_pao, ir_mao)
+
+    prev_t = None
+    for tm, r in _skip_warmup(_iter_rows_ts(path)):
+        if prev_t is None:
+            gap, dt = 0.0, REPLAY_DEFAULT_DT_S
+        else:
+            d = tm - prev_t
+            gap = min(max(d, 0.0), REPLAY_MAX_GAP_S*1000.0) / 1000.0
+            dt = max(REPLAY_DEFAULT_DT_S, d / 1000.0)
+        prev_t = tm
+        pending.append((gap, dt, _ir_raw(r, "IR_pao"), _ir_raw(r, "IR_mao")))
+        vals = (tracks[0].push(_press_raw(r)),
+                tracks[1].push(_safe_float(r.get("distancia_mm", nan))),
+                tracks[2].push(_safe_float(r.get("temperatura_C", nan))))
+        if vals[0] is not None:
+            yield emit(vals)
+    for vals in zip(*(t.flush() for t in tracks)):
+        yield emit(vals)
+
+def backfill_file(path: str, repo, device_id: str, start_ns: Optional[int] = None) -> dict:
+    """
+    Gravação do firmware -> repositório sem timing: mesmas trilhas filtradas do replay,
+    gravadas em bloco (save_arrays) com o tempo do arquivo. timestamp_ms é relativo ao
+    boot, então start_ns ancora a 1ª linha (padrão: a gravação terminou no mtime do arquivo).
+    Bloqueante: rodar no executor.
+    """
+    t0 = time.perf_counter()
+    tracks = _load_tracks(path)
+    if tracks is None:
+        return {"rows": 0, "readings": 0, "seconds": 0.0, "rows_per_s": 0}
+    t = tracks["t_ms"]
+    if start_ns is None:
+        start_ns = int(os.path.getmtime(path) * 1e9) - int((t[-1] - t[0]) * 1e6)
+    ts = start_ns + np.round((t - t[0]) * 1e6).astype(np.int64)
+
+    readings = 0
+    for key, sensor, unit in _REPLAY_FIELDS:
+        v = np.asarray(tracks[key], dtype=np.float64)
+        if NAN_POLICY == "drop":
+            ok = ~np.isnan(v)
+            readings += repo.save_arrays(device_id, sensor, ts[ok], v[ok], unit)
+        else:
+            readings += repo.save_arrays(device_id, sensor, ts, v, unit)
+    repo.flush()
+    dt = max(time.perf_counter() - t0, 1e-9)
+    return {
+        "device_id": device_id,
+        "rows": tracks["n"],
+        "readings": readings,
+        "seconds": round(dt, 3),
+        "rows_per_s": round(tracks["n"] / dt),
+        "readings_per_s": round(readings / dt),
+    }
+
+def _use_stream(path: str) -> bool:
+    if REPLAY_STREAM in ("1", "true", "yes", "on"):
+        return True
+    if REPLAY_STREAM in ("0", "false", "no", "off"):
+        return False
+    return os.path.getsize(path) >= REPLAY_STREAM_MIN_MB * 1024 * 1024
 
 # =============================================================================
 # Replayer (para substituir o send_fake)
@@ -196,137 +418,144 @@ async def send_replay_from_file(
     device_id: str = "arduino-01",
     loop_: bool = REPLAY_LOOP,
     speed: float = REPLAY_SPEED,
+    stream: Optional[bool] = None,
 ):
+    """
+    Reproduz o arquivo com o timing original (÷ speed); speed=inf faz backfill (backfill_file).
+    stream=None decide por REPLAY_STREAM: arquivos grandes são lidos/filtrados em
+    streaming (memória constante, 1ª amostra imediata); os menores são filtrados
+    inteiros com NumPy e ficam em cache para o REPLAY_LOOP.
+    """
     if not os.path.exists(path):
         print(f"[replay] arquivo não encontrado: {path}")
         return
 
+    if math.isinf(speed):
+        # speed=inf: backfill direto no repositório (uma passada, ts do arquivo)
+        res = await asyncio.get_running_loop().run_in_executor(None, backfill_file, path, usecase.repo, device_id)
+        print(f"[replay] backfill: {res['rows']} linhas em {res['seconds']}s ({res['rows_per_s']} linhas/s)")
+        return res
+
+    keep_nan = NAN_POLICY != "drop"
+    fields = [(sensor, unit) for _, sensor, unit in _REPLAY_FIELDS]
     while True:
-        it, fh = _open_iter(path)
+        if stream if stream is not None else _use_stream(path):
+            rows = _iter_stream(path)
+        else:
+            tracks = _load_tracks(path)
+            rows = _iter_cached(tracks) if tracks is not None else iter(())
+
+        # reprodução com timing
+        n = 0
+        last_emit = time.monotonic()
         try:
-            rows = list(it)
-            if not rows:
-                print("[replay] arquivo vazio")
-                return
-
-            # timestamps
-            t = []
-            for r in rows:
-                tm = _ts_ms(r)
-                t.append(tm)
-
-            # se não há timestamp, sintetiza linear
-            if all(v is None for v in t):
-                t = [i*REPLAY_DEFAULT_DT_S*1000.0 for i in range(len(rows))]
-            else:
-                # substitui None por anterior + default
-                for i in range(len(t)):
-                    if t[i] is None:
-                        t[i] = (t[i-1] + REPLAY_DEFAULT_DT_S*1000.0) if i>0 else 0.0
-
-            # trilhas
-            press = []
-            for r in rows:
-                if "pressao_volts" in r:
-                    vv = _safe_float(r["pressao_volts"])
-                    press.append(float(CAL_PRESSURE.apply(vv)) if not math.isnan(vv) else float("nan"))
-                elif "pressao_kPa" in r:
-                    press.append(_safe_float(r["pressao_kPa"]))
-                else:
-                    press.append(float("nan"))
-            press = _clean_and_filter_track(t[:], press, "pressure")
-
-            dist = [_safe_float(r.get("distancia_mm", float("nan"))) for r in rows]
-            dist = _clean_and_filter_track(t[:], dist, "distance")
-
-            temp = [_safe_float(r.get("temperatura_C", float("nan"))) for r in rows]
-            temp = _clean_and_filter_track(t[:], temp, "temperature")
-
-            ir_pao = [_safe_float(r.get("IR_pao", float("nan"))) for r in rows]
-            ir_mao = [_safe_float(r.get("IR_mao", float("nan"))) for r in rows]
-
-            # reprodução com timing
-            last_emit = time.monotonic()
-            y_press = None; y_dist=None; y_temp=None
-
-            for i in range(len(rows)):
+            for gap, vals in rows:
                 # timing relativo
-                if i>0:
-                    dt_ms = max(0.0, min((t[i]-t[i-1]), REPLAY_MAX_GAP_S*1000.0))
-                    wait_s = (dt_ms/1000.0) / max(1e-6, speed)
-                    last_emit += wait_s
+                if n>0:
+                    last_emit += gap / max(1e-6, speed)
                     to_sleep = max(0.0, last_emit - time.monotonic())
-                    if to_sleep>0: 
+                    if to_sleep>0:
                         await asyncio.sleep(to_sleep)
-
-                payload_data: Dict[str, Any] = {}
-
-                # pressão
-                if not math.isnan(press[i]):
-                    cand = _deadband_apply(y_press, press[i], Deadband)
-                    y_press = _slew_limit(y_press, cand, Slew_kpa_per_s, max(REPLAY_DEFAULT_DT_S, (t[i]-t[i-1])/1000.0 if i>0 else REPLAY_DEFAULT_DT_S))
-                    payload_data["pressao_kPa"] = y_press
-                elif NAN_POLICY != "drop":
-                    payload_data["pressao_kPa"] = float("nan")
-
-                # distância
-                if not math.isnan(dist[i]):
-                    cand = _deadband_apply(y_dist, dist[i], Deadband)
-                    y_dist = _slew_limit(y_dist, cand, Slew_mm_per_s, max(REPLAY_DEFAULT_DT_S, (t[i]-t[i-1])/1000.0 if i>0 else REPLAY_DEFAULT_DT_S))
-                    payload_data["distancia_mm"] = y_dist
-                elif NAN_POLICY != "drop":
-                    payload_data["distancia_mm"] = float("nan")
-
-                # temperatura
-                if not math.isnan(temp[i]):
-                    cand = _deadband_apply(y_temp, temp[i], Deadband*0.2)
-                    y_temp = _slew_limit(y_temp, cand, 3.0, max(REPLAY_DEFAULT_DT_S, (t[i]-t[i-1])/1000.0 if i>0 else REPLAY_DEFAULT_DT_S))
-                    payload_data["temperatura_C"] = y_temp
-                else:
-                    # 👇 se der NaN, segura o último valor válido
-                    if y_temp is not None and not math.isnan(y_temp):
-                        payload_data["temperatura_C"] = y_temp
-                    elif NAN_POLICY != "drop":
-                        payload_data["temperatura_C"] = float("nan")
-
-                # digitais
-                if not math.isnan(ir_pao[i]): 
-                    payload_data["IR_pao"] = 1.0 if ir_pao[i] >= 0.5 else 0.0
-                elif NAN_POLICY != "drop":     
-                    payload_data["IR_pao"] = float("nan")
-
-                if not math.isnan(ir_mao[i]): 
-                    payload_data["IR_mao"] = 1.0 if ir_mao[i] >= 0.5 else 0.0
-                elif NAN_POLICY != "drop":     
-                    payload_data["IR_mao"] = float("nan")
-
-                # envia por usecase (um SensorReading por campo)
-                for k, v in payload_data.items():
-                    unit = None; sensor = k
-                    if k == "pressao_kPa": sensor, unit = "pressure", "kPa"
-                    elif k == "distancia_mm": sensor, unit = "distance", "mm"
-                    elif k == "temperatura_C": sensor, unit = "temperature", "C"
-                    elif k == "IR_pao": sensor = "ir_bread"
-                    elif k == "IR_mao": sensor = "ir_hand"
-
-                    await usecase.ingest(SensorReading(
-                        device_id=device_id, sensor=sensor, value=float(v), unit=unit
-                    ))
-
+                n += 1
+
+                # envia por usecase (um Reading por campo, um frame por linha)
+                now = datetime.now(timezone.utc)
+                frame = []
+                for (sensor, unit), v in zip(fields, vals):
+                    if v == v or keep_nan:
+                        frame.append(Reading(
+                            device_id=device_id, sensor=sensor, value=v, unit=unit, ts=now
+                        ))
+                await usecase.ingest_batch(frame)
         finally:
-            if fh:
-                try: 
-                    fh.close()
-                except Exception:
-                    pass
+            close = getattr(rows, "close", None)
+            if close:
+                close()
 
-        if not loop_: 
+        if n == 0:
+            print("[replay] arquivo vazio")
+            return
+        if not loop_:
             break
         await asyncio.sleep(0.2)
 
+class FileReplay(Playback):
+    """
+    Gravação do firmware controlável em runtime (pausa, velocidade, seek, status).
+    position_s conta o tempo de reprodução (buracos > REPLAY_MAX_GAP_S comprimidos).
+    Em cache o seek é uma busca binária nas trilhas; em streaming não há índice e o
+    arquivo é relido até o ponto pedido.
+    """
+    def __init__(self, path: str, device_id: str = "arduino-01", speed: float = REPLAY_SPEED,
+                 loop_: bool = REPLAY_LOOP, stream: Optional[bool] = None):
+        if not os.path.isfile(path):
+            raise ValueError(f"arquivo não encontrado: {path}")
+        super().__init__(speed, loop_)
+        self.path = path
+        self.device_id = device_id
+        self.stream = _use_stream(path) if stream is None else stream
+
+    def devices(self) -> List[str]:
+        return [self.device_id]
+
+    def _rows_in(self, items) -> int:
+        return 1   # uma linha do arquivo por frame
+
+    def _pass(self, start_s: float):
+        fields = [(sensor, unit) for _, sensor, unit in _REPLAY_FIELDS]
+        targets = [self.device_id]
+        if self.stream:
+            at = 0.0
+            base = None
+            for gap, vals in _iter_stream(self.path):
+                at += gap
+                if at < start_s:
+                    continue
+                if base is None:
+                    base = at
+                yield at - base, at, targets, [(s, v, u) for (s, u), v in zip(fields, vals)]
+            return
+
+        tracks = _load_tracks(self.path)
+        if tracks is None:
+            return
+        at = np.cumsum(tracks["gap_s"]).tolist()
+        i0 = int(np.searchsorted(at, start_s)) if start_s else 0
+        cols = [tracks[k] for k, _, _ in _REPLAY_FIELDS]
+        base = at[i0] if i0 < len(at) else 0.0
+        for i in range(i0, len(at)):
+            yield at[i] - base, at[i], targets, [(s, c[i], u) for (s, u), c in zip(fields, cols)]
+
+    def status(self) -> dict:
+        return {"file": self.path, "stream": self.stream, **super().status()}
+
 # =============================================================================
 # Leitor serial “real” (Arduino)
 # =============================================================================
+_M_QUEUE = metrics.stage("queue")   # linha parada na fila de ingest
+_M_PARSE = metrics.stage("parse")
+_M_FILTER = metrics.stage("filter")
+_M_LINE = metrics.stage("line")     # chegada da linha -> ingest (persist + fan-out + twin) concluído
+
+async def consume_lines(queue: asyncio.Queue):
+    """
+    Drena uma fila de (SerialReader, linha bruta, perf_counter da chegada) chamando reader.handle_line em ordem.
+    Com shards de ingest (usecase.ingest_line) a linha vai bruta para o shard do device (parse e filtros lá).
+    """
+    while True:
+        reader, raw, t_in = await queue.get()
+        _M_QUEUE.observe(time.perf_counter() - t_in)
+        try:
+            ingest_line = getattr(reader.usecase, "ingest_line", None)
+            if ingest_line is not None:
+                await ingest_line(reader, raw)
+            else:
+                await reader.handle_line(raw)
+        except Exception as e:
+            log_event("serial.line_failed", level="error", key=("serial.line_failed", reader.port),
+                      port=reader.port, error=e)
+        _M_LINE.observe(time.perf_counter() - t_in)
+
 class SerialReader:
     """
     Lê a porta serial aceitando dois formatos:
@@ -335,15 +564,21 @@ class SerialReader:
       2) Linha em colchetes para simulação, ex:
          [2025-01-01 12:12:00] [TEMPERATURA] [VALUE: 110]
 
-    Converte cada campo num SensorReading separado.
+    Converte cada campo num Reading separado.
     Aplica suavização (média móvel) para sensores contínuos antes de enviar.
+
+    Pipeline 100% asyncio: uma task só lê linhas (readline) e enfileira numa fila
+    limitada; outra faz parse + ingest. Se o ingest atrasar, a leitura espera na
+    fila e os bytes seguem acumulando no buffer do StreamReader (SERIAL_READ_LIMIT),
+    sem perder dados.
     """
 
-    def __init__(self, port: str, baud: int, usecase):
+    def __init__(self, port: str, baud: int, usecase, device_id: Optional[str] = None,
+                 queue: Optional[asyncio.Queue] = None):
         self.port = port
         self.baud = baud
         self.usecase = usecase
-        self.device_id = os.getenv("SERIAL_DEVICE_ID", "arduino-01")
+        self.device_id = device_id or os.getenv("SERIAL_DEVICE_ID", "arduino-01")
 
         # Config do filtro
         self._filter_enabled = os.getenv("FILTER_ENABLE", "true").lower() in ("1", "true", "yes", "on")
@@ -351,10 +586,27 @@ class SerialReader:
 
         # Um filtro por sensor contínuo
         self._filters: Dict[str, SensorFilter] = {}
+        self._despikers: Dict[str, HampelFilter] = {}
         self._last_vals = {"pressure": None, "distance": None, "temperature": None}
 
+        # fila de (reader, linha): própria, ou compartilhada por vários readers (SerialSessionManager)
+        self._own_queue = queue is None
+        self._queue: asyncio.Queue = queue if queue is not None else asyncio.Queue(maxsize=SERIAL_QUEUE_MAX)
+        self.connected = False
+        self._fails = 0
+        self._rate_t0 = time.monotonic()
+        self._rate_n = 0
+        self._last_frame = 0.0
+        self.stats = {"lines": 0, "frames": 0, "parse_errors": 0, "queue_full": 0,
+                      "queue_max": 0, "reconnects": 0, "frames_per_s": 0.0, "last_error": None}
+
     def _smooth(self, sensor: str, value: float) -> float:
-        """Aplica média móvel por sensor (se habilitado)."""
+        """Hampel causal (anti-pico) + média móvel por sensor (se habilitado)."""
+        if SERIAL_HAMPEL_WIN >= 3:
+            h = self._despikers.get(sensor)
+            if h is None:
+                h = self._despikers[sensor] = HampelFilter(SERIAL_HAMPEL_WIN, SERIAL_HAMPEL_K, causal=True)
+            value = h.add(value)
         if not self._filter_enabled:
             return value
         f = self._filters.get(sensor)
@@ -364,56 +616,138 @@ class SerialReader:
         return f.add(value)
 
     async def run(self):
-        while True:
-            try:
-                reader, _ = await serial.asyncio.open_serial_connection(
-                    url=self.port, baudrate=self.baud
-                )
-                while True:
+        """Lê a porta até ser cancelado; reabre após erro/desconexão."""
+        if serial_asyncio is None:
+            raise RuntimeError("pyserial-asyncio não disponível (pip install pyserial-asyncio).")
+        consumer = asyncio.create_task(consume_lines(self._queue)) if self._own_queue else None
+        try:
+            while True:
+                try:
+                    await self._read_port()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.stats["last_error"] = str(e)
+                    self.stats["reconnects"] += 1
+                    delay = self.retry_delay()
+                    log_event("serial.reconnect", level="warning", key=("serial.reconnect", self.port),
+                              port=self.port, error=e, retry_s=round(delay, 1))
+                    await asyncio.sleep(delay)
+        finally:
+            if consumer:
+                consumer.cancel()
+            self.connected = False
+
+    def retry_delay(self) -> float:
+        """Backoff exponencial com jitter (zera quando a porta abre)."""
+        self._fails += 1
+        d = min(SERIAL_RETRY_MAX_S, SERIAL_RETRY_S * (2 ** (self._fails - 1)))
+        return d * random.uniform(0.8, 1.0)
+
+    async def _read_port(self):
+        reader, writer = await serial_asyncio.open_serial_connection(
+            url=self.port, baudrate=self.baud, limit=SERIAL_READ_LIMIT
+        )
+        self.connected = True
+        self._fails = 0
+        print(f"[serial] aberto {self.port}@{self.baud}")
+        q = self._queue
+        try:
+            while True:
+                try:
                     raw = await reader.readline()
-                    if not raw:
-                        await asyncio.sleep(0.01)
-                        continue
-                    line = raw.decode(errors="ignore").strip()
-                    if not line:
-                        continue
+                except ValueError:
+                    # linha maior que SERIAL_READ_LIMIT (lixo na porta): descarta e segue
+                    self.stats["parse_errors"] += 1
+                    continue
+                if not raw:
+                    raise ConnectionError("porta fechada (EOF)")
+                self.stats["lines"] += 1
+                item = (self, raw, time.perf_counter())
+                if q.full():
+                    # back-pressure: para de consumir o StreamReader até o ingest alcançar
+                    self.stats["queue_full"] += 1
+                    await q.put(item)
+                else:
+                    q.put_nowait(item)
+                    if q.qsize() > self.stats["queue_max"]:
+                        self.stats["queue_max"] = q.qsize()
+        finally:
+            self.connected = False
+            writer.close()
+            print(f"[serial] fechado {self.port}")
+
+    def _count_frame(self):
+        self.stats["frames"] += 1
+        self._rate_n += 1
+        now = self._last_frame = time.monotonic()
+        dt = now - self._rate_t0
+        if dt >= 1.0:
+            self.stats["frames_per_s"] = round(self._rate_n / dt, 2)
+            self._rate_t0, self._rate_n = now, 0
+
+    def snapshot(self) -> dict:
+        """Cópia dos contadores; frames_per_s zera se a porta ficou muda por mais de 2 s."""
+        out = dict(self.stats)
+        if time.monotonic() - self._last_frame > 2.0:
+            out["frames_per_s"] = 0.0
+        return out
+
+    async def handle_line(self, raw):
+        line = raw.decode(errors="ignore").strip() if isinstance(raw, bytes) else raw.strip()
+        if not line:
+            return
 
-                    # ---- Formato 1: JSON do Arduino
-                    if line.startswith("{"):
-                        try:
-                            data = json.loads(line)
-                            await self._emit_from_json(data)
-                        except Exception as e:
-                            print("JSON parse error:", e, "|", line)
-                        continue
+        # ---- Formato 1: JSON do Arduino
+        if line.startswith("{"):
+            t0 = time.perf_counter()
+            try:
+                data = json.loads(line)
+            except Exception as e:
+                self.stats["parse_errors"] += 1
+                log_event("serial.parse_error", level="warning", key=("serial.parse_error", self.port),
+                          port=self.port, error=e, line=line[:120])
+                return
+            _M_PARSE.observe(time.perf_counter() - t0)
+            await self._emit_from_json(data)
+            self._count_frame()
+            return
 
-                    # ---- Formato 2: [..][..][..] (opcional)
-                    if line.startswith("["):
-                        await self._emit_from_brackets(line)
-                        continue
+        # ---- Formato 2: [..][..][..] (opcional)
+        if line.startswith("["):
+            await self._emit_from_brackets(line)
+            return
 
-                    # outros formatos: ignorar
-            except Exception as e:
-                print(f"[Serial] erro '{e}'. Re-tentando em 2s…")
-                await asyncio.sleep(2)
+        # outros formatos: ignorar
 
-    async def _emit_from_json(self, data: dict):
+    @staticmethod
+    def _pick(data: dict, keys: Tuple[str, ...]):
+        for k in keys:
+            if k in data:
+                return data[k]
+        return None
 
+    async def _emit_from_json(self, data: dict):
+        t0 = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        frame: List[Reading] = []
 
-        if "temperatura_C" in data:
-            val = _to_float(data["temperatura_C"])
+        temp = self._pick(data, _KEYS_TEMP)
+        if temp is not None:
+            val = _to_float(temp)
             val = self._smooth("temperature", val)
-            await self.usecase.ingest(SensorReading(
-                device_id=self.device_id, sensor="temperature", value=val, unit="C"
+            frame.append(Reading(
+                device_id=self.device_id, sensor="temperature", value=val, unit="C", ts=now
             ))
 
         # PRESSÃO: prioriza 'pressao_volts' -> calibra -> suaviza -> kPa
-        if "pressao_volts" in data or "pressao_kPa" in data:
-            if "pressao_volts" in data:
-                v_volts = _to_float(data["pressao_volts"])
-                p_kpa = CAL_PRESSURE.apply(v_volts)
+        volts = data.get("pressao_volts")
+        kpa = self._pick(data, _KEYS_PRESS_KPA)
+        if volts is not None or kpa is not None:
+            if volts is not None:
+                p_kpa = CAL_PRESSURE.apply(_to_float(volts))
             else:
-                p_kpa = _to_float(data["pressao_kPa"])
+                p_kpa = _to_float(kpa)
 
             # filtros rápidos no caminho serial
             last = self._last_vals["pressure"]
@@ -429,27 +763,33 @@ class SerialReader:
             p_kpa = self._smooth("pressure", p_kpa)
             self._last_vals["pressure"] = p_kpa
 
-            await self.usecase.ingest(SensorReading(
-                device_id=self.device_id, sensor="pressure", value=p_kpa, unit="kPa"
+            frame.append(Reading(
+                device_id=self.device_id, sensor="pressure", value=p_kpa, unit="kPa", ts=now
             ))
-        # IR (pão / mão) -> binário 0/1, sem suavização
-        if "IR_pao" in data:
-            await self.usecase.ingest(SensorReading(
-                device_id=self.device_id, sensor="ir_bread", value=float(data["IR_pao"]), unit=None
+        # IR (pão / mão) -> binário 0/1, sem suavização (aceita true/false ou 0/1)
+        ir = self._pick(data, _KEYS_IR_BREAD)
+        if ir is not None:
+            frame.append(Reading(
+                device_id=self.device_id, sensor="ir_bread", value=1.0 if _to_float(ir) > 0.5 else 0.0, unit=None, ts=now
             ))
-        if "IR_mao" in data:
-            await self.usecase.ingest(SensorReading(
-                device_id=self.device_id, sensor="ir_hand", value=float(data["IR_mao"]), unit=None
+        ir = self._pick(data, _KEYS_IR_HAND)
+        if ir is not None:
+            frame.append(Reading(
+                device_id=self.device_id, sensor="ir_hand", value=1.0 if _to_float(ir) > 0.5 else 0.0, unit=None, ts=now
             ))
 
-        # distância (suaviza)
-        if "distancia_mm" in data:
-            val = _to_float(data["distancia_mm"])
+        # distância (suaviza); null do firmware (sem eco) vira NaN
+        if any(k in data for k in _KEYS_DIST):
+            val = _to_float(self._pick(data, _KEYS_DIST))
             val = self._smooth("distance", val)
-            await self.usecase.ingest(SensorReading(
-                device_id=self.device_id, sensor="distance", value=val, unit="mm"
+            frame.append(Reading(
+                device_id=self.device_id, sensor="distance", value=val, unit="mm", ts=now
             ))
 
+        # persiste o frame inteiro de uma vez
+        _M_FILTER.observe(time.perf_counter() - t0)
+        await self.usecase.ingest_batch(frame)
+
     async def _emit_from_brackets(self, line: str):
         # Ex: [ts] [TEMPERATURA] [VALUE: 110]
         parts = BRACKET_RE.findall(line)
@@ -466,7 +806,7 @@ class SerialReader:
         if sensor_norm in {"temperature", "pressure", "distance", "humidity"}:
             val = self._smooth(sensor_norm, val)
 
-        await self.usecase.ingest(SensorReading(
+        await self.usecase.ingest(Reading(
             device_id=self.device_id,
             sensor=sensor_norm,
             value=val,
@@ -493,9 +833,13 @@ if __name__ == "__main__":
     import random
 
     class DummyUsecase:
-        async def ingest(self, sr: SensorReading):
+        async def ingest(self, sr: Reading):
             print(sr)
 
+        async def ingest_batch(self, frame):
+            for sr in frame:
+                print(sr)
+
     async def main():
         sr = SerialReader(port="COM_FAKE", baud=115200, usecase=DummyUsecase())
         # Simula algumas leituras JSON
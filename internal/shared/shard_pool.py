@@ -0,0 +1,375 @@
+# internal/shared/shard_pool.py
+"""
+Ingest em vários processos (INGEST_SHARDS > 0). Cada device vai sempre para o mesmo
+shard (crc32(device_id) % N): um processo com o próprio SensorRepository (só grava
+os arquivos dos seus devices, com write-behind e flush periódico), os filtros das
+sessões seriais, PressAnalytics e TwinEngine. O processo da API fica com as fontes
+(serial/fake/replay), última leitura + cache recente, broadcast e fan-out do WS
+(ver ShardedUsecase / ShardedRepository).
+
+Transporte: um Pipe por shard (socketpair + pickle), com lotes. Do lado da API uma
+thread por shard envia (tudo o que foi enfileirado desde o último send vai junto, e
+o event loop nunca bloqueia num pipe cheio) e outra recebe e entrega no loop.
+  API -> shard: lista de ("f", frame) | ("l", porta, device_id, linha) |
+                ("call", id, método, args) | ("close",)
+  shard -> API: ("out", n_processados, [frame], [msg WS], {porta: (frames, erros de parse)}),
+                ("reply", id, ok, resultado), ("stats", {backend: stats}), ("closed",)
+Frame compacto: (device_id, ((sensor, valor, unit, ts_ns), ...)).
+
+Back-pressure: no máx. INGEST_SHARD_INFLIGHT itens enviados e ainda não processados
+por shard; submit() espera o shard drenar metade antes de seguir.
+"""
+from concurrent.futures import Future
+from itertools import count
+from time import monotonic
+import asyncio
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import zlib
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.shared.ratelog import log_event
+from internal.shared.timeutil import to_epoch_ns, from_epoch_ns
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+INGEST_SHARDS          = int(os.getenv("INGEST_SHARDS", "0"))              # processos de ingest; 0 = tudo no processo da API
+INGEST_SHARD_INFLIGHT  = int(os.getenv("INGEST_SHARD_INFLIGHT", "4096"))   # itens em voo por shard antes do submit esperar
+
+_STATS_EVERY_S = 1.0
+
+
+def shard_of(device_id: str, n: int) -> int:
+    return zlib.crc32(device_id.encode()) % n
+
+
+def pack_frame(readings) -> tuple:
+    """Frame (lista de Reading do mesmo device) -> tupla compacta para o pipe."""
+    prev = ns = None
+    items = []
+    for r in readings:
+        if r.ts is not prev:
+            prev, ns = r.ts, to_epoch_ns(r.ts)
+        items.append((r.sensor, r.value, r.unit, ns))
+    return (readings[0].device_id, tuple(items))
+
+
+def unpack_frame(frame) -> list:
+    """Inverso de pack_frame; leituras com o mesmo ts_ns compartilham o datetime."""
+    device_id, items = frame
+    prev = ts = None
+    out = []
+    for sensor, value, unit, ns in items:
+        if ns != prev:
+            prev, ts = ns, from_epoch_ns(ns)
+        out.append(Reading(device_id, sensor, value, unit, ts))
+    return out
+
+
+# =============================================================================
+# Processo do shard
+# =============================================================================
+class _Collect:
+    """usecase dos SerialReader dentro do shard: só junta os frames já filtrados."""
+
+    def __init__(self):
+        self.frames = []
+
+    async def ingest(self, reading):
+        self.frames.append((reading,))
+
+    async def ingest_batch(self, readings):
+        self.frames.append(readings)
+
+
+class _Shard:
+    def __init__(self, index: int, base_path: str):
+        # imports aqui: o processo filho (spawn) só carrega o pipeline quando sobe
+        from internal.sensor.repository.sensor_repository import SensorRepository
+        from internal.sensor.usecase.analytics import PressAnalytics
+        from internal.sensor.usecase.twin import TwinEngine
+
+        self.index = index
+        self.repo = SensorRepository(base_path, recent=False)
+        self.analytics = PressAnalytics()
+        self.twin = TwinEngine()
+        self.readers = {}           # porta -> SerialReader (filtros da sessão)
+        self.collect = _Collect()
+        self.loop = asyncio.new_event_loop()
+
+    def ingest(self, readings, msgs):
+        """O que o SensorUsecase faz depois do broadcast: persistência, analytics e gêmeo."""
+        device_id = readings[0].device_id
+        try:
+            self.repo.save_batch(readings)
+        except Exception as e:
+            log_event("shard.persist_failed", level="error", shard=self.index, device_id=device_id, error=e)
+        for name, fn in (("analytics", self.analytics.update), ("twin", self.twin.step)):
+            try:
+                msg = fn(readings)
+                if msg:
+                    msgs.append(msg)
+            except Exception as e:
+                log_event("usecase.stage_failed", level="error", key=f"usecase.stage_failed.{name}",
+                          stage=name, device_id=device_id, error=e)
+
+    def run_lines(self, lines, counters, msgs, frames):
+        """Linhas seriais: parse + filtros da sessão, depois o mesmo ingest dos frames (que voltam à API)."""
+        self.loop.run_until_complete(self._lines(lines, counters))
+        lines.clear()
+        for readings in self.collect.frames:
+            self.ingest(readings, msgs)
+            frames.append(pack_frame(readings))
+        self.collect.frames.clear()
+
+    async def _lines(self, items, counters):
+        from internal.shared.serial_reader import SerialReader
+
+        for port, device_id, raw in items:
+            r = self.readers.get(port)
+            if r is None or r.device_id != device_id:
+                r = self.readers[port] = SerialReader(port, 0, self.collect, device_id=device_id)
+            f0, e0 = r.stats["frames"], r.stats["parse_errors"]
+            try:
+                await r.handle_line(raw)
+            except Exception as e:
+                log_event("serial.line_failed", level="error", key=("serial.line_failed", port), port=port, error=e)
+            c = counters.setdefault(port, [0, 0])
+            c[0] += r.stats["frames"] - f0
+            c[1] += r.stats["parse_errors"] - e0
+
+    # ---- RPC (chamadas em ordem com os frames do mesmo pipe)
+    def rpc_kpis(self, device_id):
+        return self.analytics.kpis(device_id)
+
+    def rpc_kpis_reset(self, device_id):
+        self.analytics.reset(device_id)
+
+    def rpc_twin_state(self, device_id, since, devices):
+        if device_id is not None and device_id not in self.twin.devices:
+            return None
+        return self.twin.state(device_id, since, devices)
+
+    def rpc_history(self, device_id, sensor, t_from_ns, t_to_ns, limit):
+        return self.repo.history(device_id, sensor, t_from_ns, t_to_ns, limit)
+
+    def rpc_arrays(self, device_id, sensor, ts_ns, values, unit):
+        return self.repo.save_arrays(device_id, sensor, ts_ns, values, unit)
+
+    def rpc_flush(self, durable):
+        self.repo.flush(durable=durable)
+
+
+def _serve(index: int, conn, base_path: str):
+    """Loop do processo do shard: um lote do pipe -> processa em ordem -> uma resposta "out"."""
+    from internal.sensor.repository.sensor_repository import FLUSH_INTERVAL_S
+
+    # Ctrl+C vai para o grupo todo: quem encerra o shard é a API (flush durável no "close")
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    shard = _Shard(index, base_path)
+    tick = max(0.05, FLUSH_INTERVAL_S / 2)
+    stats_at = 0.0
+    dirty = True
+    try:
+        while True:
+            if conn.poll(tick):
+                batch = conn.recv()
+                done, frames, msgs, counters, lines, replies = 0, [], [], {}, [], []
+                closing = False
+                for item in batch:
+                    kind = item[0]
+                    if kind == "f":
+                        shard.ingest(unpack_frame(item[1]), msgs)
+                        done += 1
+                    elif kind == "l":
+                        lines.append(item[1:])
+                        done += 1
+                    elif kind == "call":
+                        if lines:
+                            shard.run_lines(lines, counters, msgs, frames)   # chamada vê tudo o que veio antes
+                        _, rid, method, args = item
+                        try:
+                            replies.append(("reply", rid, True, getattr(shard, "rpc_" + method)(*args)))
+                        except Exception as e:
+                            # ValueError (ex.: OutOfOrder do backfill) chega como ValueError: a API responde 4xx
+                            replies.append(("reply", rid, False, f"{type(e).__name__}: {e}", isinstance(e, ValueError)))
+                    elif kind == "close":
+                        closing = True
+                if lines:
+                    shard.run_lines(lines, counters, msgs, frames)
+                if done:
+                    conn.send(("out", done, frames, msgs, {p: tuple(c) for p, c in counters.items()}))
+                    dirty = True
+                for rep in replies:
+                    conn.send(rep)
+                if closing:
+                    shard.repo.close()
+                    conn.send(("stats", shard.repo.stats()))
+                    conn.send(("closed",))
+                    return
+            shard.repo.flush_due()
+            now = monotonic()
+            if dirty and now - stats_at >= _STATS_EVERY_S:
+                conn.send(("stats", shard.repo.stats()))
+                stats_at, dirty = now, False
+    except (EOFError, OSError):
+        # API caiu sem "close": ainda grava o que está em buffer
+        shard.repo.close()
+    finally:
+        shard.loop.close()
+
+
+# =============================================================================
+# Lado da API
+# =============================================================================
+class ShardDown(RuntimeError):
+    """O processo do shard terminou (ou o pool foi fechado)."""
+
+
+class ShardPool:
+    def __init__(self, n: int = INGEST_SHARDS, base_path: str = "data", max_inflight: int = INGEST_SHARD_INFLIGHT):
+        self.n = max(1, n)
+        self.base_path = base_path
+        self.max_inflight = max(1, max_inflight)
+        self.inflight = [0] * self.n
+        self.stats = [{} for _ in range(self.n)]    # último repo.stats() de cada shard
+        self._procs = []
+        self._conns = []
+        self._outq = []
+        self._threads = []
+        self._drained = []
+        self._alive = []
+        self._pending = []                          # por shard: id -> Future das chamadas
+        self._ids = count(1)
+        self._loop = None
+        self._on_out = None
+
+    def shard_of(self, device_id: str) -> int:
+        return shard_of(device_id, self.n)
+
+    def start(self, loop: asyncio.AbstractEventLoop, on_out):
+        """Sobe os processos (spawn) e as threads de envio/recepção; on_out(frames, msgs, counters) é async."""
+        if self._procs:
+            return
+        self._loop, self._on_out = loop, on_out
+        ctx = mp.get_context("spawn")
+        for i in range(self.n):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_serve, args=(i, child, self.base_path), name=f"ingest-shard-{i}", daemon=True)
+            p.start()
+            child.close()
+            q = queue.SimpleQueue()
+            self._procs.append(p)
+            self._conns.append(parent)
+            self._outq.append(q)
+            self._drained.append(asyncio.Event())
+            self._alive.append(True)
+            self._pending.append({})
+            for fn in (self._sender, self._receiver):
+                t = threading.Thread(target=fn, args=(i,), name=f"shard-{i}-{fn.__name__[1:]}", daemon=True)
+                t.start()
+                self._threads.append(t)
+        print(f"[shards] {self.n} processos de ingest: {', '.join(str(p.pid) for p in self._procs)}")
+
+    # ---- threads
+    def _sender(self, i: int):
+        q, conn = self._outq[i], self._conns[i]
+        while True:
+            batch = [q.get()]
+            try:
+                while True:
+                    batch.append(q.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                conn.send(batch)
+            except (OSError, ValueError):
+                return
+            if batch[-1][0] == "close":
+                return
+
+    def _receiver(self, i: int):
+        conn, loop = self._conns[i], self._loop
+        try:
+            while True:
+                msg = conn.recv()
+                kind = msg[0]
+                if kind == "out":
+                    asyncio.run_coroutine_threadsafe(self._deliver(i, *msg[1:]), loop)
+                elif kind == "reply":
+                    fut = self._pending[i].pop(msg[1], None)
+                    if fut is not None:
+                        if msg[2]:
+                            fut.set_result(msg[3])
+                        else:
+                            fut.set_exception((ValueError if msg[4] else RuntimeError)(msg[3]))
+                elif kind == "stats":
+                    self.stats[i] = msg[1]
+                elif kind == "closed":
+                    break
+        except (EOFError, OSError):
+            log_event("shard.down", level="error", shard=i, pid=self._procs[i].pid)
+        self._alive[i] = False
+        loop.call_soon_threadsafe(self._drained[i].set)
+        for fut in list(self._pending[i].values()):
+            if not fut.done():
+                fut.set_exception(ShardDown(f"shard {i} encerrado"))
+        self._pending[i].clear()
+
+    async def _deliver(self, i: int, done: int, frames, msgs, counters):
+        self.inflight[i] -= done
+        if self.inflight[i] <= self.max_inflight // 2:
+            self._drained[i].set()
+        await self._on_out(frames, msgs, counters)
+
+    # ---- envio
+    async def submit(self, i: int, item):
+        """Enfileira um frame/linha para o shard i (no event loop), esperando se ele estiver atrasado."""
+        while self.inflight[i] >= self.max_inflight and self._alive[i]:
+            self._drained[i].clear()
+            await self._drained[i].wait()
+        if not self._alive[i]:
+            raise ShardDown(f"shard {i} encerrado")
+        self.inflight[i] += 1
+        self._outq[i].put(item)
+
+    def call(self, i: int, method: str, *args) -> Future:
+        """Chamada ao shard i (de qualquer thread); a resposta vem em ordem com o que já foi enviado."""
+        fut = Future()
+        if not self._procs or not self._alive[i]:
+            fut.set_exception(ShardDown(f"shard {i} encerrado"))
+            return fut
+        rid = next(self._ids)
+        self._pending[i][rid] = fut
+        self._outq[i].put(("call", rid, method, args))
+        return fut
+
+    async def acall(self, i: int, method: str, *args):
+        return await asyncio.wrap_future(self.call(i, method, *args))
+
+    async def acall_all(self, method: str, *args) -> list:
+        return await asyncio.gather(*(self.acall(i, method, *args) for i in range(self.n)))
+
+    def status(self) -> list:
+        return [{"shard": i, "pid": p.pid, "alive": self._alive[i] and p.is_alive(), "inflight": self.inflight[i]}
+                for i, p in enumerate(self._procs)]
+
+    def close(self, timeout: float = 10.0):
+        """Flush durável + encerra os processos (shutdown; bloqueia até os shards gravarem)."""
+        for i, q in enumerate(self._outq):
+            if self._alive[i]:
+                q.put(("close",))
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                log_event("shard.kill", level="error", pid=p.pid)
+                p.terminate()
+        for t in self._threads:
+            t.join(1.0)
+        for c in self._conns:
+            c.close()
+        self._procs = []
@@ -0,0 +1,269 @@
+# internal/shared/shm_table.py
+"""
+Tabela de última leitura em memória compartilhada (multiprocessing.shared_memory),
+para vários workers do uvicorn (SHARED_STATE=true) enxergarem o mesmo /debug/last
+e o mesmo /status. Layout fixo, criado pelo primeiro processo e anexado pelos demais:
+
+  cabeçalho  8 x int64: magic, slots, usados, linhas de worker, bytes do blob
+  chaves     slots x (device S64, sensor S24, unit S8); slot i só é lido se i < usados
+  valores    slots x (seq u64, ts_ns i64, value f64)
+  workers    SHARED_WORKER_ROWS x (pid, seq, ts_ns, len) + blob JSON de SHARED_WORKER_BLOB bytes
+
+Leitura lock-free por seqlock: o escritor deixa seq ímpar durante a escrita e par no
+fim; o leitor repete se viu seq ímpar ou se seq mudou no meio. Um escritor por slot
+(o worker que ingere o device). Só a alocação de slot/linha de worker pega um flock.
+O segmento não é removido no shutdown: um restart reaproveita as últimas leituras.
+"""
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import fcntl
+import json
+import os
+import time
+
+import numpy as np
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+SHARED_SLOTS        = int(os.getenv("SHARED_SLOTS", "16384"))         # (device, sensor) distintos
+SHARED_WORKER_ROWS  = int(os.getenv("SHARED_WORKER_ROWS", "64"))
+SHARED_WORKER_BLOB  = int(os.getenv("SHARED_WORKER_BLOB", "8192"))    # bytes de JSON por worker (/status, resumo dos replays)
+SHARED_STALE_S      = float(os.getenv("SHARED_STALE_S", "5"))         # worker sem atualizar há mais que isso = morto
+
+_MAGIC = 0x7477696E5F6C7631   # "twin_lv1"
+_HDR = 8 * 8
+_KEY = np.dtype([("device", "S64"), ("sensor", "S24"), ("unit", "S8")])
+_VAL = np.dtype([("seq", "<u8"), ("ts", "<i8"), ("value", "<f8")])
+_RETRIES = 1000
+
+
+def _size(slots, rows, blob):
+    return _HDR + slots * (_KEY.itemsize + _VAL.itemsize) + rows * (4 * 8 + blob)
+
+
+def _untrack(shm):
+    try:
+        # < 3.13: o resource_tracker apagaria o segmento quando o 1º worker saísse
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+
+
+def _open_shm(name, size):
+    """Cria ou anexa (chamar com o flock); o segmento sobrevive aos processos."""
+    try:
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _untrack(shm)
+        return shm, True
+    except FileExistsError:
+        shm = shared_memory.SharedMemory(name=name)
+        _untrack(shm)
+    if shm.size >= _HDR and np.ndarray((1,), np.int64, shm.buf, 0)[0] == _MAGIC:
+        return shm, False
+    # segmento de outro layout (versão antiga): recria
+    shm.close()
+    shm.unlink()
+    return _open_shm(name, size)
+
+
+class LatestTable:
+    def __init__(self, name: str, lock_path: str, slots: int = SHARED_SLOTS,
+                 rows: int = SHARED_WORKER_ROWS, blob: int = SHARED_WORKER_BLOB):
+        self.name = name
+        self._lock_fd = os.open(lock_path, os.O_CREAT | os.O_RDWR, 0o600)
+        with self._locked():
+            self._shm, created = _open_shm(name, _size(slots, rows, blob))
+            buf = self._shm.buf
+            hdr = np.ndarray((8,), np.int64, buf, 0)
+            if created:
+                hdr[1:5] = (slots, 0, rows, blob)
+                hdr[0] = _MAGIC
+            # anexando: vale o layout de quem criou
+            slots, rows, blob = int(hdr[1]), int(hdr[3]), int(hdr[4])
+        self.slots, self.rows, self.blob = slots, rows, blob
+        self._hdr = hdr
+        off = _HDR
+        self._keys = np.ndarray((slots,), _KEY, buf, off)
+        off += slots * _KEY.itemsize
+        vals = np.ndarray((slots,), _VAL, buf, off)
+        self._seq, self._ts, self._val = vals["seq"], vals["ts"], vals["value"]
+        off += slots * _VAL.itemsize
+        self._wmeta = np.ndarray((rows, 4), np.int64, buf, off)   # pid, seq, ts_ns, len
+        off += rows * 4 * 8
+        self._wblob = np.ndarray((rows, blob), np.uint8, buf, off)
+
+        self._index = {}       # (device, sensor) -> slot (cache local do diretório)
+        self._by_dev = {}      # device -> [slot]
+        self._known = 0
+        self._row = None
+        self.stats = {"writes": 0, "read_retries": 0, "full": 0, "rejected": 0}
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------ diretório
+    def _refresh(self):
+        used = self.used
+        for i in range(self._known, used):
+            k = self._keys[i]
+            dev, sensor = k["device"].decode(), k["sensor"].decode()
+            self._index[(dev, sensor)] = i
+            self._by_dev.setdefault(dev, []).append(i)
+        self._known = used
+
+    def _slot(self, device_id: str, sensor: str, unit):
+        i = self._index.get((device_id, sensor))
+        if i is not None:
+            return i
+        self._refresh()
+        i = self._index.get((device_id, sensor))
+        if i is not None:
+            return i
+        dev_b, sensor_b, unit_b = device_id.encode(), sensor.encode(), (unit or "").encode()
+        if len(dev_b) > 64 or len(sensor_b) > 24 or len(unit_b) > 8:
+            self.stats["rejected"] += 1     # não cabe no layout: fica só no _last local
+            return None
+        with self._locked():
+            self._refresh()
+            i = self._index.get((device_id, sensor))
+            if i is not None:
+                return i
+            used = self.used
+            if used >= self.slots:
+                self.stats["full"] += 1
+                return None
+            self._keys[used] = (dev_b, sensor_b, unit_b)
+            self._hdr[2] = used + 1     # publica a chave depois de escrita
+        self._refresh()
+        return used
+
+    # ------------------------------------------------------------------ valores
+    def put(self, device_id: str, sensor: str, value: float, unit, ts_ns: int):
+        i = self._slot(device_id, sensor, unit)
+        if i is None:
+            return
+        seq = self._seq
+        s = int(seq[i]) | 1
+        seq[i] = s                  # ímpar: escrevendo
+        self._ts[i] = ts_ns
+        self._val[i] = value
+        seq[i] = s + 1
+        self.stats["writes"] += 1
+
+    def _read(self, i: int):
+        seq = self._seq
+        for _ in range(_RETRIES):
+            s = int(seq[i])
+            if not s & 1:
+                ts, v = int(self._ts[i]), float(self._val[i])
+                if int(seq[i]) == s:
+                    return (ts, v) if s else None
+            self.stats["read_retries"] += 1
+        return int(self._ts[i]), float(self._val[i])   # escritor morreu no meio
+
+    def get(self, device_id: str, sensor: str):
+        """(ts_ns, value, unit) da última leitura ou None."""
+        i = self._index.get((device_id, sensor))
+        if i is None:
+            self._refresh()
+            i = self._index.get((device_id, sensor))
+            if i is None:
+                return None
+        got = self._read(i)
+        return None if got is None else (got[0], got[1], self._keys[i]["unit"].decode() or None)
+
+    def device(self, device_id: str) -> dict:
+        """sensor -> (ts_ns, value, unit) de todos os sensores do device."""
+        self._refresh()
+        out = {}
+        for i in self._by_dev.get(device_id, ()):
+            got = self._read(i)
+            if got is not None:
+                k = self._keys[i]
+                out[k["sensor"].decode()] = (got[0], got[1], k["unit"].decode() or None)
+        return out
+
+    @property
+    def used(self) -> int:
+        return min(int(self._hdr[2]), self.slots)
+
+    def devices(self):
+        self._refresh()
+        return list(self._by_dev)
+
+    # ------------------------------------------------------------------ workers
+    def report(self, info: dict):
+        """Publica o estado deste processo (fontes rodando etc.) na linha dele."""
+        if self._row is None:
+            self._row = self._claim_row()
+            if self._row is None:
+                return
+        data = json.dumps(info, separators=(",", ":")).encode()
+        if len(data) > self.blob:
+            data = json.dumps({"truncated": True, "pid": os.getpid()}).encode()
+        m, r = self._wmeta, self._row
+        s = int(m[r, 1]) | 1
+        m[r, 1] = s
+        self._wblob[r, :len(data)] = np.frombuffer(data, np.uint8)
+        m[r, 3] = len(data)
+        m[r, 2] = time.time_ns()
+        m[r, 1] = s + 1
+
+    def _claim_row(self):
+        pid = os.getpid()
+        stale = time.time_ns() - int(SHARED_STALE_S * 1e9)
+        with self._locked():
+            m = self._wmeta
+            for r in range(self.rows):
+                if m[r, 0] == pid:
+                    return r
+            for r in range(self.rows):
+                if m[r, 0] == 0 or m[r, 2] < stale:
+                    m[r, 0] = pid
+                    m[r, 2] = time.time_ns()
+                    return r
+        return None
+
+    def workers(self) -> list:
+        """[{"pid", "age_s", "info"}] dos processos que atualizaram há menos de SHARED_STALE_S."""
+        now = time.time_ns()
+        m = self._wmeta
+        out = []
+        for r in range(self.rows):
+            pid = int(m[r, 0])
+            if not pid:
+                continue
+            for _ in range(_RETRIES):
+                s = int(m[r, 1])
+                if s & 1:
+                    continue
+                ts, n = int(m[r, 2]), int(m[r, 3])
+                raw = self._wblob[r, :n].tobytes()
+                if int(m[r, 1]) == s:
+                    break
+            else:
+                continue
+            if not n or now - ts > SHARED_STALE_S * 1e9:
+                continue
+            try:
+                info = json.loads(raw)
+            except ValueError:
+                continue
+            out.append({"pid": pid, "age_s": round((now - ts) / 1e9, 3), "info": info})
+        return out
+
+    def close(self):
+        """Solta o mapeamento deste processo (o segmento continua para os outros)."""
+        self._keys = self._seq = self._ts = self._val = self._wmeta = self._wblob = self._hdr = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass   # alguma view ainda viva; o mapeamento sai com o processo
+        os.close(self._lock_fd)
@@ -0,0 +1,23 @@
+# internal/shared/timeutil.py
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+def to_epoch_ns(dt: datetime) -> int:
+    """datetime -> epoch em ns (datetime sem tz é tratado como UTC, igual ao utcnow antigo)."""
+    if dt.tzinfo is None:
+        return ((dt - _EPOCH_NAIVE) // _US) * 1000
+    return ((dt - _EPOCH) // _US) * 1000
+
+def from_epoch_ns(ns: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(ns) // 1000)
+
+def parse_iso_ns(s: str) -> Optional[int]:
+    """ISO-8601 (como gravado nos CSVs) -> epoch ns; None se inválido."""
+    try:
+        return to_epoch_ns(datetime.fromisoformat(s.strip().replace("Z", "+00:00")))
+    except Exception:
+        return None
@@ -0,0 +1,167 @@
+# internal/shared/worker_bus.py
+"""
+Pub/sub local entre os workers do uvicorn (SHARED_STATE=true), por Unix socket.
+
+Um dos workers é o broker: quem pega o flock de <socket>.lock remove o socket velho,
+faz o bind e repassa cada linha recebida a todos os outros conectados (nunca de volta
+a quem publicou). Todos, inclusive o broker, são clientes. Se o broker cai, os outros
+perdem a conexão, um deles pega o flock (o kernel solta no exit) e assume.
+
+Mensagens: uma linha JSON por msg (NaN preservado; json do stdlib, não o codec do WS).
+Cliente lento no broker (buffer acima de BUS_MAX_BUFFER) perde msgs em vez de travar
+os outros; o mesmo vale para publish() sem conexão ou com o buffer local cheio.
+"""
+import asyncio
+import fcntl
+import json
+import os
+
+from internal.shared.ratelog import log_event
+
+# =============================================================================
+# Config via ENV
+# =============================================================================
+BUS_MAX_BUFFER = int(os.getenv("BUS_MAX_BUFFER", str(4 * 1024 * 1024)))   # bytes pendentes por conexão antes de descartar
+BUS_RETRY_S    = float(os.getenv("BUS_RETRY_S", "0.5"))
+BUS_LINE_LIMIT = 16 * 1024 * 1024
+
+
+class WorkerBus:
+    def __init__(self, path: str, handler):
+        self.path = path
+        self.handler = handler          # fn(msg: dict), chamada no event loop para cada msg de outro worker
+        self._writer = None
+        self._server = None
+        self._lock_fd = None
+        self._locked = False
+        self._peers = set()
+        self._task = None
+        self.stats = {"published": 0, "received": 0, "dropped": 0, "forwarded": 0,
+                      "broker_dropped": 0, "reconnects": 0}
+
+    @property
+    def is_broker(self) -> bool:
+        return self._server is not None
+
+    @property
+    def holds_lock(self) -> bool:
+        """Tem o flock do broker (fixo desde o start() enquanto o processo vive)."""
+        return self._locked
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    def start(self):
+        """Conecta (ou vira broker) e mantém a conexão; precisa do event loop rodando."""
+        self._take_lock()   # já aqui: holds_lock vale antes do 1º await
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._server:
+            self._server.close()
+            for w in list(self._peers):
+                w.close()
+            self._server = None
+            try:
+                os.unlink(self.path)    # os outros reconectam e um deles assume
+            except OSError:
+                pass
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            self._locked = False
+
+    # ------------------------------------------------------------------ cliente
+    def publish(self, msg: dict):
+        """Envia para os outros workers (não bloqueia; descarta se não há conexão ou o buffer encheu)."""
+        w = self._writer
+        if w is None or w.transport.get_write_buffer_size() > BUS_MAX_BUFFER:
+            self.stats["dropped"] += 1
+            return
+        w.write(json.dumps(msg, separators=(",", ":")).encode() + b"\n")
+        self.stats["published"] += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self._try_broker()
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=BUS_LINE_LIMIT)
+            except OSError:
+                await asyncio.sleep(BUS_RETRY_S)
+                continue
+            self._writer = writer
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self.stats["received"] += 1
+                    try:
+                        self.handler(json.loads(line))
+                    except Exception as e:
+                        log_event("bus.handler_failed", level="error", error=e)
+            except (OSError, ValueError) as e:
+                log_event("bus.read_failed", level="warning", error=e)
+            finally:
+                self._writer = None
+                writer.close()
+            self.stats["reconnects"] += 1
+            log_event("bus.reconnect", level="warning", path=self.path)
+            await asyncio.sleep(BUS_RETRY_S)
+
+    # ------------------------------------------------------------------ broker
+    def _take_lock(self) -> bool:
+        if self._locked:
+            return True
+        if self._lock_fd is None:
+            self._lock_fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False    # outro worker é o broker
+        self._locked = True
+        return True
+
+    async def _try_broker(self):
+        if self._server is not None or not self._take_lock():
+            return
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._serve, self.path, limit=BUS_LINE_LIMIT)
+        os.chmod(self.path, 0o600)
+        log_event("bus.broker", level="info", path=self.path, pid=os.getpid())
+
+    async def _serve(self, reader, writer):
+        self._peers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for w in self._peers:
+                    if w is writer:
+                        continue
+                    if w.transport.get_write_buffer_size() > BUS_MAX_BUFFER:
+                        self.stats["broker_dropped"] += 1
+                        continue
+                    w.write(line)
+                    self.stats["forwarded"] += 1
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._peers.discard(writer)
+            writer.close()
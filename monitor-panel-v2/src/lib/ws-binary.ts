@@ -0,0 +1,68 @@
+// Decoder do protocolo binário do /sensor/ws (?format=bin)
+// Espelha internal/sensor/delivery/binary_protocol.py:
+//   u8 type | u16 device | f64 ts | f32 temperature | f32 pressure | f32 distance | u8 flags  (little-endian, 24 bytes)
+
+export const MSG_FRAME = 1
+
+export interface BinarySchema {
+  type: "schema"
+  version: number
+  frame: { size: number; fields: [string, string][] }
+  flags: { ir_bread: number; ir_hand: number; ir_bread_present: number; ir_hand_present: number }
+  devices: Record<string, string>
+}
+
+export interface DecodedReading {
+  device_id: string
+  ts: number
+  temperature?: number
+  pressure?: number
+  distance?: number
+  ir_bread?: boolean
+  ir_hand?: boolean
+}
+
+export class BinaryFrameDecoder {
+  private devices = new Map<number, string>()
+  private flags = { ir_bread: 1, ir_hand: 2, ir_bread_present: 4, ir_hand_present: 8 }
+  private frameSize = 24
+
+  /** Trata mensagens de controle em texto (schema / devices). Retorna true se consumiu. */
+  handleControl(msg: { type?: string; devices?: Record<string, string>; flags?: BinarySchema["flags"]; frame?: BinarySchema["frame"] }): boolean {
+    if (msg.type === "schema") {
+      this.devices.clear()
+      if (msg.flags) this.flags = msg.flags
+      if (msg.frame) this.frameSize = msg.frame.size
+    }
+    if (msg.type === "schema" || msg.type === "devices") {
+      for (const [idx, id] of Object.entries(msg.devices ?? {})) this.devices.set(Number(idx), id)
+      return true
+    }
+    return false
+  }
+
+  decode(buf: ArrayBuffer): DecodedReading | null {
+    if (buf.byteLength < this.frameSize) return null
+    const dv = new DataView(buf)
+    if (dv.getUint8(0) !== MSG_FRAME) return null
+
+    const idx = dv.getUint16(1, true)
+    const out: DecodedReading = {
+      device_id: this.devices.get(idx) ?? `device-${idx}`,
+      ts: dv.getFloat64(3, true),
+    }
+    const temperature = dv.getFloat32(11, true)
+    const pressure = dv.getFloat32(15, true)
+    const distance = dv.getFloat32(19, true)
+    if (!Number.isNaN(temperature)) out.temperature = temperature
+    if (!Number.isNaN(pressure)) out.pressure = pressure
+    if (!Number.isNaN(distance)) out.distance = distance
+
+    const f = dv.getUint8(23)
+    if (f & this.flags.ir_bread_present) out.ir_bread = (f & this.flags.ir_bread) !== 0
+    if (f & this.flags.ir_hand_present) out.ir_hand = (f & this.flags.ir_hand) !== 0
+    return out
+  }
+}
+
+export const isBinaryWsUrl = (url: string) => /[?&]format=bin(ary)?(&|$)/.test(url)
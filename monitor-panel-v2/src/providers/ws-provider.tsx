@@ -1,6 +1,7 @@
 import { createContext, useContext, useEffect, useRef, useState, type ReactNode } from "react"
 import { useConfig } from "@/providers/config-provider"
 import { useStatus } from "./status-provider"
+import { BinaryFrameDecoder, isBinaryWsUrl } from "@/lib/ws-binary"
 
 interface SensorReading {
   device_id: string
@@ -32,6 +33,7 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
   const [isConnected, setIsConnected] = useState(false)
   const [sensors, setSensors] = useState<Record<string, SensorReading>>({})
   const wsRef = useRef<WebSocket | null>(null)
+  const decoderRef = useRef(new BinaryFrameDecoder())
 
   const addLog = (msg: string) => {
     const timestamp = new Date().toLocaleTimeString()
@@ -40,6 +42,23 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
 
   const clearLogs = () => setLogs([])
 
+  const applyReading = (reading: any) => {
+    const deviceId = reading.device_id ?? "unknown"
+
+    setSensors((prev) => ({
+      ...prev,
+      [deviceId]: {
+        device_id: deviceId,
+        temperature: reading.temperature ?? 0,
+        pressure: reading.pressure ?? 0,
+        distance: reading.distance ?? 0,
+        ir_bread: reading.ir_bread,
+        ir_hand: reading.ir_hand,
+        timestamp: new Date().toLocaleTimeString(),
+      },
+    }))
+  }
+
   const connect = () => {
     if (wsRef.current) {
       console.warn("🔄 Already connected")
@@ -48,6 +67,12 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
 
     const ws = new WebSocket(wsUrl)
     wsRef.current = ws
+    // ?format=bin -> frames empacotados (ver lib/ws-binary.ts)
+    const binary = isBinaryWsUrl(wsUrl)
+    if (binary) {
+      ws.binaryType = "arraybuffer"
+      decoderRef.current = new BinaryFrameDecoder()
+    }
 
     ws.onopen = () => {
       setIsConnected(true)
@@ -56,26 +81,22 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
     }
 
     ws.onmessage = (event) => {
+      if (event.data instanceof ArrayBuffer) {
+        const reading = decoderRef.current.decode(event.data)
+        if (reading) {
+          addLog(JSON.stringify(reading))
+          applyReading(reading)
+        }
+        return
+      }
+
       addLog(event.data)
 
       try {
         const parsed = JSON.parse(event.data)
+        if (binary && decoderRef.current.handleControl(parsed)) return
         if (parsed.event === "ingest" && parsed.reading) {
-          const reading = parsed.reading
-          const deviceId = reading.device_id ?? "unknown"
-
-          setSensors((prev) => ({
-            ...prev,
-            [deviceId]: {
-              device_id: deviceId,
-              temperature: reading.temperature ?? 0,
-              pressure: reading.pressure ?? 0,
-              distance: reading.distance ?? 0,
-              ir_bread: reading.ir_bread,
-              ir_hand: reading.ir_hand,
-              timestamp: new Date().toLocaleTimeString(),
-            },
-          }))
+          applyReading(parsed.reading)
         }
       } catch {
         // ignora logs não JSON
@@ -0,0 +1,72 @@
+# scripts/bench_broadcast.py
+"""
+Benchmark do custo de serialização no broadcast com 1, 10 e 100 clientes simulados.
+
+  antes  -> json.dumps por cliente (o que ws.send_json faz)
+  depois -> ws_hub.broadcast_nowait: serializa 1x e compartilha o texto
+
+Uso: python scripts/bench_broadcast.py [N_MSGS]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("WS_MAX_FPS", "1000000")  # sem rate limit: mede só CPU
+
+from internal.sensor.delivery import ws_hub
+
+class _FakeWS:
+    class _State:
+        name = "CONNECTED"
+    client_state = _State()
+    client = None
+
+    def __init__(self):
+        self.n = 0
+
+    async def send_text(self, text):
+        self.n += 1
+
+    async def close(self):
+        pass
+
+def _msg(i: int):
+    # NaN como o replayer emite com REPLAY_NAN_POLICY=keep
+    return {"event": "ingest", "reading": {
+        "device_id": "bench-01", "temperature": 180.0 + i % 7, "pressure": float("nan"),
+        "distance": 300.5, "ir_bread": True, "ir_hand": False}}
+
+def _before(n_clients: int, n_msgs: int) -> float:
+    t0 = time.process_time()
+    for i in range(n_msgs):
+        m = _msg(i)
+        for _ in range(n_clients):
+            json.dumps(m)
+    return time.process_time() - t0
+
+async def _after(n_clients: int, n_msgs: int) -> float:
+    clients = [_FakeWS() for _ in range(n_clients)]
+    for ws in clients:
+        ws_hub.register(ws)
+    ws_hub._metrics["encode_us_total"] = 0.0
+    for i in range(n_msgs):
+        ws_hub.broadcast_nowait(_msg(i))
+        await asyncio.sleep(0)
+    encode_s = ws_hub._metrics["encode_us_total"] / 1e6
+    for ws in clients:
+        await ws_hub.cleanup(ws)
+    return encode_s
+
+def main(n_msgs: int):
+    print(f"encoder: {ws_hub.codec.ENCODER_NAME} | {n_msgs} msgs")
+    print(f"{'clientes':>8} {'antes (ms)':>12} {'depois (ms)':>12}")
+    for n in (1, 10, 100):
+        b = _before(n, n_msgs)
+        a = asyncio.run(_after(n, n_msgs))
+        print(f"{n:>8} {b * 1000:>12.1f} {a * 1000:>12.1f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
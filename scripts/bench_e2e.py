@@ -0,0 +1,319 @@
+# scripts/bench_e2e.py
+"""
+Benchmark ponta a ponta do app real (cmd/main.py) rodando neste processo:
+
+  - uvicorn numa porta local livre; repositório num diretório temporário
+  - P portas seriais virtuais (pty) recebendo linhas no formato que o firmware
+    imprime (main.cpp), via /serial/start
+  - N clientes WebSocket (/sensor/ws) e o escritor das ptys num processo filho,
+    para a CPU deles não entrar na conta do servidor
+  - replay de uma gravação sintética em paralelo (/replay/start)
+
+Mede, na janela após o aquecimento:
+  - throughput de ingest (frames/s, leituras/s; serial e replay)
+  - latência ingest -> cliente (p50/p99/max, pelo 'ts' da msg "ingest"); a espera
+    na fila antes do parse está no estágio 'queue' do /metrics
+  - CPU do processo servidor por frame
+  - bytes em disco (CSV + .idx) por leitura
+  - latência por estágio (resumo do /metrics)
+
+Resultado em JSON para comparar entre commits:
+  python scripts/bench_e2e.py --out antes.json
+  python scripts/bench_e2e.py --out depois.json --compare antes.json
+
+Requer uvicorn[standard] (websockets) e httpx.
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import multiprocessing as mp
+import os
+import pty
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tty
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+# =============================================================================
+# Carga: linhas do firmware e clientes WS (processo filho)
+# =============================================================================
+def _fw_line(i: int, rnd: random.Random) -> bytes:
+    """Mesma formatação do Serial.print do firmware (casas decimais, true/false, null)."""
+    dist = "null" if rnd.random() < 0.05 else f"{300 + rnd.gauss(0, 2):.1f}"
+    return (
+        "{"
+        f'"timestamp_ms":{i * 20},'
+        f'"temperatura_C":{145 + 5 * math.sin(i / 300) + rnd.gauss(0, 0.3):.2f},'
+        f'"pressao_volts":{0.93 + 0.01 * rnd.random():.5f},'
+        f'"IR_pao":{"true" if (i // 40) % 2 == 0 else "false"},'
+        f'"IR_mao":{"true" if rnd.random() < 0.02 else "false"},'
+        f'"distancia_mm":{dist}'
+        "}\r\n"
+    ).encode()
+
+def _write_recording(path: str, n: int):
+    rnd = random.Random(11)
+    with open(path, "wb") as f:
+        for i in range(n):
+            f.write(_fw_line(i, rnd).rstrip(b"\r\n") + b"\n")
+
+def _pct(xs, q):
+    if not xs:
+        return None
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+async def _clients_main(port, n_clients, fds, rate, seconds, warmup, devices):
+    import websockets
+
+    lat = []
+    received = [0]
+    t_start = time.time() + warmup
+    t_end = t_start + seconds
+
+    async def client(k):
+        url = f"ws://127.0.0.1:{port}/sensor/ws"
+        async with websockets.connect(url, max_queue=None) as ws:
+            while time.time() < t_end:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=max(0.05, t_end - time.time()))
+                except asyncio.TimeoutError:
+                    break
+                now = time.time()
+                msg = json.loads(raw)
+                if msg.get("event") != "ingest":
+                    continue
+                if now >= t_start and (msg.get("reading") or {}).get("device_id") in devices:
+                    received[0] += 1
+                    lat.append(now - msg["ts"])
+
+    async def writer(fd, seed):
+        rnd = random.Random(seed)
+        period = 1.0 / rate
+        nxt = time.monotonic()
+        i = 0
+        deadline = t_end + 0.2
+        while time.time() < deadline:
+            os.write(fd, _fw_line(i, rnd))
+            i += 1
+            nxt += period
+            await asyncio.sleep(max(0.0, nxt - time.monotonic()))
+        return i
+
+    tasks = [asyncio.create_task(client(k)) for k in range(n_clients)]
+    await asyncio.sleep(0.3)   # clientes conectados antes das linhas
+    written = await asyncio.gather(*(writer(fd, s) for s, fd in enumerate(fds)))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    lat.sort()
+    return {
+        "lines_written": sum(written),
+        "client_msgs": received[0],
+        "latency_ms": {
+            "p50": round(_pct(lat, 0.50) * 1e3, 3) if lat else None,
+            "p99": round(_pct(lat, 0.99) * 1e3, 3) if lat else None,
+            "max": round(lat[-1] * 1e3, 3) if lat else None,
+            "samples": len(lat),
+        },
+    }
+
+def _clients_proc(q, go, *args):
+    # criado antes do servidor subir (fork sem threads/loop); espera as sessões seriais
+    go.wait()
+    try:
+        q.put(asyncio.run(_clients_main(*args)))
+    except Exception as e:
+        q.put({"error": repr(e)})
+
+
+# =============================================================================
+# Servidor (este processo)
+# =============================================================================
+def _load_app():
+    spec = importlib.util.spec_from_file_location("bench_app_main", os.path.join(ROOT, "cmd", "main.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+
+def _ingest_totals(metrics):
+    fr = metrics.INGEST_FRAMES.children
+    rd = metrics.INGEST_READINGS.children
+    return ({k[0]: c.value for k, c in fr.items()}, {k[0]: c.value for k, c in rd.items()})
+
+def _setup(args):
+    """Porta, ptys e o processo filho dos clientes — antes de qualquer thread/loop no servidor."""
+    port = _free_port()
+    ptys = []
+    for _ in range(args.ports):
+        master, slave = pty.openpty()
+        tty.setraw(slave)
+        ptys.append((master, slave, os.ttyname(slave)))
+    serial_devices = [f"bench-{i:02d}" for i in range(args.ports)]
+    ctx = mp.get_context("fork")
+    q, go = ctx.Queue(), ctx.Event()
+    child = ctx.Process(target=_clients_proc, args=(
+        q, go, port, args.clients, [m for m, _, _ in ptys], args.rate, args.seconds, args.warmup, set(serial_devices)))
+    child.start()
+    return port, ptys, serial_devices, q, go, child
+
+async def _bench(args, mod, setup):
+    import httpx
+    import uvicorn
+    from internal.shared import metrics
+
+    port, ptys, serial_devices, q, go, child = setup
+    server = uvicorn.Server(uvicorn.Config(mod.app, host="127.0.0.1", port=port, log_level="warning"))
+    srv_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as http:
+        for (_, _, name), did in zip(ptys, serial_devices):
+            r = await http.post("/serial/start", json={"port": name, "baudrate": 115200, "device_id": did})
+            r.raise_for_status()
+        if args.replay_speed > 0:
+            rec = os.path.join(os.getcwd(), "recording.jsonl")
+            _write_recording(rec, 20000)
+            r = await http.post("/replay/start", json={
+                "path": rec, "device_id": "bench-replay", "speed": args.replay_speed, "loop": True, "id": "bench"})
+            r.raise_for_status()
+
+        go.set()
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(args.warmup + 0.3)
+        f0, r0 = _ingest_totals(metrics)
+        cpu0, wall0 = time.process_time(), time.perf_counter()
+        await asyncio.sleep(args.seconds)
+        cpu1, wall1 = time.process_time(), time.perf_counter()
+        f1, r1 = _ingest_totals(metrics)
+
+        replay = (await http.get("/replay/status", params={"id": "bench"})).json() if args.replay_speed > 0 else None
+        client_res = await loop.run_in_executor(None, q.get)
+        await loop.run_in_executor(None, child.join)
+        sessions = (await http.get("/serial/sessions")).json()
+        await http.post("/serial/stop", json={})
+        await http.post("/replay/stop", json={})
+
+    mod.repo.flush()
+    server.should_exit = True
+    await srv_task
+    for m, s, _ in ptys:
+        os.close(m)
+        os.close(s)
+
+    dt = wall1 - wall0
+    frames = {d: f1.get(d, 0) - f0.get(d, 0) for d in f1}
+    readings = {d: r1.get(d, 0) - r0.get(d, 0) for d in r1}
+    n_frames = sum(frames.values())
+    n_readings_total = sum(r1.values())
+    serial_frames = sum(frames.get(d, 0) for d in serial_devices)
+    return {
+        "ingest": {
+            "frames_per_s": round(n_frames / dt, 1),
+            "readings_per_s": round(sum(readings.values()) / dt, 1),
+            "serial_frames_per_s": round(serial_frames / dt, 1),
+            "replay_frames_per_s": round(frames.get("bench-replay", 0) / dt, 1),
+            "serial_lines_offered_per_s": args.rate * args.ports,
+            "parse_errors": sum(s["parse_errors"] for s in sessions["sessions"]),
+            "queue_full": sum(s["queue_full"] for s in sessions["sessions"]),
+        },
+        "latency_ingest_to_client_ms": client_res.get("latency_ms"),
+        "clients": {"n": args.clients, "msgs": client_res.get("client_msgs"), "error": client_res.get("error")},
+        "cpu_us_per_frame": round((cpu1 - cpu0) / n_frames * 1e6, 2) if n_frames else None,
+        "cpu_util": round((cpu1 - cpu0) / dt, 3),
+        "disk_bytes_per_reading": round(_dir_bytes(os.path.join(os.getcwd(), "data")) / n_readings_total, 2)
+                                  if n_readings_total else None,
+        "replay": {k: replay[k] for k in ("rows_per_s", "lag_s", "lag_max_s", "position_s")} if replay else None,
+        "stages_ms": metrics.summary().get("twin_stage_seconds", {}),
+    }
+
+
+# =============================================================================
+# Saída / comparação
+# =============================================================================
+_KEYS = (
+    ("ingest.frames_per_s", +1),
+    ("ingest.serial_frames_per_s", +1),
+    ("latency_ingest_to_client_ms.p50", -1),
+    ("latency_ingest_to_client_ms.p99", -1),
+    ("cpu_us_per_frame", -1),
+    ("disk_bytes_per_reading", -1),
+)
+
+def _get(d, dotted):
+    for k in dotted.split("."):
+        d = (d or {}).get(k)
+    return d
+
+def _compare(cur, old):
+    print(f"\ncomparação com {old.get('commit', '?')}:")
+    for key, better in _KEYS:
+        a, b = _get(old["results"], key), _get(cur["results"], key)
+        if not a or b is None:
+            continue
+        delta = (b - a) / a * 100
+        flag = "melhor" if delta * better > 0 else ("pior" if delta else "=")
+        print(f"  {key:38s} {a:>10} -> {b:>10}  ({delta:+.1f}% {flag})")
+
+def _commit():
+    try:
+        return subprocess.check_output(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--seconds", type=float, default=10.0, help="janela medida")
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--rate", type=float, default=50.0, help="linhas/s por porta serial")
+    ap.add_argument("--ports", type=int, default=1)
+    ap.add_argument("--clients", type=int, default=10)
+    ap.add_argument("--replay-speed", type=float, default=10.0, help="0 desliga o replay")
+    ap.add_argument("--ws-fps", type=float, default=None, help="WS_MAX_FPS do servidor (padrão: o do .env)")
+    ap.add_argument("--out", default=None, help="arquivo JSON de saída")
+    ap.add_argument("--compare", default=None, help="JSON de uma execução anterior")
+    args = ap.parse_args()
+
+    cwd = os.getcwd()
+    setup = _setup(args)
+    # ambiente do servidor antes de importar o app (módulos leem o ENV no import)
+    os.chdir(tempfile.mkdtemp(prefix="bench_e2e_"))
+    os.environ["REPLAY_FILE"] = ""
+    if args.ws_fps:
+        os.environ["WS_MAX_FPS"] = str(args.ws_fps)
+    mod = _load_app()
+
+    results = asyncio.run(_bench(args, mod, setup))
+    out = {
+        "commit": _commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "params": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    text = json.dumps(out, indent=2, ensure_ascii=False)
+    print(text)
+    if args.out:
+        with open(os.path.join(cwd, args.out), "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(os.path.join(cwd, args.compare)) as f:
+            _compare(out, json.load(f))
+
+if __name__ == "__main__":
+    main()
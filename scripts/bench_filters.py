@@ -0,0 +1,54 @@
+# scripts/bench_filters.py
+"""
+Filtros do replayer: tempo contra a implementação original em listas (a equivalência
+é coberta por tests/test_filters.py, que usa as mesmas referências de tests/filter_refs.py).
+
+  Hampel: _hampel antigo (statistics.median 2x por amostra, janela recriada a cada índice)
+          vs HampelFilter em streaming (internal.shared.filter)
+          vs hampel vetorizado (internal.shared.filter_np)
+  Faixa, warmup, EMA, média móvel, deadband+slew: listas vs filter_np
+
+Uso: python scripts/bench_filters.py [N_AMOSTRAS]
+"""
+import os
+import sys
+import time
+
+_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, _ROOT)
+sys.path.insert(0, os.path.join(_ROOT, "tests"))
+
+from filter_refs import (
+    deadband_slew_ref, ema_ref, hampel_ref, movavg_ref, range_ref, signal, warmup_ref,
+)
+from internal.shared.filter import hampel_iter
+from internal.shared import filter_np as fnp
+
+def _timeit(fn, *a):
+    t0 = time.perf_counter()
+    fn(*a)
+    return time.perf_counter() - t0
+
+def _row(name, t_ref, t_new):
+    print(f"{name:<26} lista {t_ref*1e3:8.1f} ms   novo {t_new*1e3:8.1f} ms   x{t_ref/max(t_new,1e-9):6.1f}")
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    series = signal(n)
+    t_ms = [i * 280.0 for i in range(n)]
+    dt = [0.5] + [0.28] * (n - 1)
+    print(f"n={n}")
+    for w in (11, 51):
+        t_ref = _timeit(hampel_ref, series, w, 3.0)
+        _row(f"hampel w={w} streaming", t_ref, _timeit(lambda *a: list(hampel_iter(*a)), series, w, 3.0))
+        _row(f"hampel w={w} numpy", t_ref, _timeit(fnp.hampel, series, w, 3.0))
+    _row("faixa", _timeit(range_ref, series, 0.0, 300.0), _timeit(fnp.range_mask, series, 0.0, 300.0))
+    _row("warmup", _timeit(warmup_ref, t_ms, 4.0), _timeit(fnp.warmup_index, t_ms, 4.0))
+    _row("ema", _timeit(ema_ref, series, 0.08), _timeit(fnp.ema, series, 0.08))
+    _row("média móvel w=25", _timeit(movavg_ref, series, 25), _timeit(fnp.movavg, series, 25))
+    for hold in (False, True):
+        _row(f"deadband+slew hold={hold}", _timeit(deadband_slew_ref, series, dt, 0.8, 15.0, hold),
+             _timeit(fnp.deadband_slew, series, dt, 0.8, 15.0, hold))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# scripts/bench_ingest.py
+"""
+Micro-benchmark do ingest: frames/s com 5 SensorReading por frame.
+
+  antes  -> 5x ingest por frame, cada um com 2 hops no thread pool (save_last + append_csv)
+  depois -> 1x ingest_batch por frame (1 hop no thread pool)
+
+Uso: python scripts/bench_ingest.py [N_FRAMES]
+"""
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.sensor.domain.sensor_model import SensorReading
+from internal.sensor.repository.sensor_repository import SensorRepository
+from internal.sensor.usecase.sensor_usecase import SensorUsecase
+
+SENSORS = (("temperature", "C"), ("pressure", "kPa"), ("distance", "mm"), ("ir_bread", None), ("ir_hand", None))
+
+def _frame(i: int):
+    now = datetime.now(timezone.utc)
+    return [SensorReading(device_id="bench-01", sensor=s, value=float(i % 100), unit=u, ts=now) for s, u in SENSORS]
+
+async def _before(repo, n: int):
+    # caminho antigo: dois run_in_executor por leitura
+    loop = asyncio.get_running_loop()
+    for i in range(n):
+        for r in _frame(i):
+            await loop.run_in_executor(None, repo.save_last, r)
+            await loop.run_in_executor(None, repo.append_csv, r)
+
+async def _after(usecase, n: int):
+    for i in range(n):
+        await usecase.ingest_batch(_frame(i))
+
+def _run(label: str, coro_factory, n: int):
+    with tempfile.TemporaryDirectory() as d:
+        repo = SensorRepository(base_path=d)
+        t0 = time.perf_counter()
+        asyncio.run(coro_factory(repo, n))
+        repo.close()
+        dt = time.perf_counter() - t0
+    print(f"{label:<8} {n} frames em {dt:.3f}s -> {n / dt:,.0f} frames/s")
+    return n / dt
+
+def main(n: int):
+    before = _run("antes", _before, n)
+    after = _run("depois", lambda repo, n: _after(SensorUsecase(repo), n), n)
+    print(f"speedup  {after / before:.2f}x")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
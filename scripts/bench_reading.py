@@ -0,0 +1,82 @@
+# scripts/bench_reading.py
+"""
+Custo por frame (5 leituras) da representação interna da leitura:
+
+  pydantic  -> SensorReading(BaseModel): validação + coerção por campo
+  dataclass -> Reading (dataclass com __slots__), o caminho atual serial/fake/replay
+
+Cada frame faz o que o hot path faz: cria as 5 leituras, guarda em _last,
+monta a msg de broadcast (frame_message) e formata as linhas do CSV.
+
+Mede:
+  - CPU (µs/frame) só da criação e do caminho completo
+  - memória retida (bytes/frame) e blocos alocados (tracemalloc) com N frames vivos
+
+Uso: python scripts/bench_reading.py [N_FRAMES]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.sensor.domain.sensor_model import Reading, SensorReading
+from internal.sensor.repository.csv_store import _format_row
+from internal.sensor.usecase.sensor_usecase import frame_message
+
+SENSORS = (("temperature", "C"), ("pressure", "kPa"), ("distance", "mm"), ("ir_bread", None), ("ir_hand", None))
+KINDS = (("pydantic", SensorReading), ("dataclass", Reading))
+
+def _frame(cls, i: int):
+    now = datetime.now(timezone.utc)
+    v = float(i % 100)
+    return [cls(device_id="bench-01", sensor=s, value=v, unit=u, ts=now) for s, u in SENSORS]
+
+def _full(cls, n: int, last: dict):
+    for i in range(n):
+        frame = _frame(cls, i)
+        for r in frame:
+            last[(r.device_id, r.sensor)] = r
+        frame_message(frame)
+        for r in frame:
+            _format_row(r.ts, r.value, r.unit)
+
+def _cpu_us(fn, n: int) -> float:
+    t0 = time.process_time()
+    fn(n)
+    return (time.process_time() - t0) / n * 1e6
+
+def _memory(cls, n: int):
+    """(bytes retidos/frame, blocos alocados/frame) mantendo n frames vivos."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    keep = [_frame(cls, i) for i in range(n)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    size = sum(d.size_diff for d in diff)
+    blocks = sum(d.count_diff for d in diff)
+    del keep
+    return size / n, blocks / n
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    print(f"{n} frames x {len(SENSORS)} leituras\n")
+    res = {}
+    for name, cls in KINDS:
+        _full(cls, 1000, {})   # aquecimento
+        build = _cpu_us(lambda k: [_frame(cls, i) for i in range(k)], n)
+        full = _cpu_us(lambda k: _full(cls, k, {}), n)
+        size, blocks = _memory(cls, min(n, 20_000))
+        res[name] = (build, full, size, blocks)
+        print(f"{name:10s} criação {build:7.2f} µs/frame | caminho {full:7.2f} µs/frame | "
+              f"{size:7.0f} B/frame retidos | {blocks:5.1f} blocos/frame")
+
+    (b0, f0, s0, k0), (b1, f1, s1, k1) = res["pydantic"], res["dataclass"]
+    print(f"\ncriação {b0 / b1:.2f}x mais rápida, caminho {f0 / f1:.2f}x, "
+          f"memória -{(1 - s1 / s0) * 100:.0f}%, blocos -{(1 - k1 / k0) * 100:.0f}%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# scripts/bench_replay.py
+"""
+Replay: modo em cache (arquivo inteiro + NumPy) vs streaming (memória constante).
+
+Gera um JSONL sintético no formato do firmware e mede, para cada modo:
+  - tempo até a 1ª amostra
+  - tempo total para percorrer o arquivo (sem o sleep de timing)
+  - pico de memória alocada (tracemalloc)
+e confere que os dois modos produzem os mesmos valores (rtol 1e-9: EMA em blocos).
+
+Uso: python scripts/bench_replay.py [N_LINHAS]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.shared import serial_reader as sr
+
+def _write_jsonl(path, n):
+    rnd = random.Random(7)
+    with open(path, "w") as f:
+        for i in range(n):
+            row = {
+                "timestamp_ms": i * 280,
+                "temperatura_C": 145 + 5 * math.sin(i / 300) + rnd.gauss(0, 0.3),
+                "pressao_volts": 0.93 + 0.01 * rnd.random() + (0.05 if rnd.random() < 0.01 else 0.0),
+                "IR_pao": (i // 40) % 2 == 0,
+                "IR_mao": rnd.random() < 0.02,
+                "distancia_mm": None if rnd.random() < 0.05 else 300 + rnd.gauss(0, 2),
+            }
+            f.write(json.dumps(row) + "\n")
+
+def _run(make_rows, keep=0):
+    """(1ª amostra s, total s, até 'keep' linhas de saída) — sem tracemalloc, que distorce o tempo."""
+    sr._TRACK_CACHE.clear()
+    t0 = time.perf_counter()
+    first = None
+    out = []
+    for _, vals in make_rows():
+        if first is None:
+            first = time.perf_counter() - t0
+        if len(out) < keep:
+            out.append(vals)
+    return first, time.perf_counter() - t0, out
+
+def _peak(make_rows):
+    sr._TRACK_CACHE.clear()
+    tracemalloc.start()
+    for _ in make_rows():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+def _same(a, b):
+    if len(a) != len(b):
+        return False
+    for ra, rb in zip(a, b):
+        for x, y in zip(ra, rb):
+            if not (x == y or (x != x and y != y) or abs(x - y) <= 1e-9 * max(abs(x), abs(y), 1.0)):
+                return False
+    return True
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, "rec.jsonl")
+        _write_jsonl(path, n)
+        mb = os.path.getsize(path) / 1e6
+        print(f"{n} linhas ({mb:.1f} MB)")
+        res = {}
+        for name, make in (("cache", lambda: sr._iter_cached(sr._load_tracks(path))),
+                           ("streaming", lambda: sr._iter_stream(path))):
+            first, total, out = _run(make, keep=50_000)
+            peak = _peak(make)
+            res[name] = out
+            print(f"{name:<10} 1ª amostra {first*1e3:8.1f} ms   total {total:6.2f} s   pico {peak/1e6:8.2f} MB")
+        ok = _same(res["cache"], res["streaming"])
+        print("valores:", "iguais" if ok else "DIFERENTES")
+        if not ok:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# scripts/bench_shards.py
+"""
+Ingest em shards (internal.shared.shard_pool) contra o ingest num processo só:
+frames/s de persistência (CSV, write-behind) + analytics + gêmeo para N prensas
+simuladas (PressSim), sem servidor nem WS (o fan-out fica no processo da API).
+
+  inline    -> o mesmo trabalho do shard, chamado direto neste processo
+  shards=k  -> k processos; este processo só empacota e envia (como a API)
+
+Escala com os cores livres: com k maior que os cores da máquina o ganho some (e o
+pipe vira custo puro).
+
+Uso: python scripts/bench_shards.py [N_DEVICES] [TICKS] [SHARDS,...]
+     python scripts/bench_shards.py 200 100 1,2,4
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.shared.press_sim import PressSim, SENSORS
+from internal.shared.shard_pool import ShardPool, _Shard, pack_frame
+
+def _frames(n_dev: int, ticks: int):
+    sim = PressSim(n_dev, seed=1)
+    t0 = datetime.now(timezone.utc)
+    ids = [f"bench-{i:04d}" for i in range(n_dev)]
+    out = []
+    for k in range(ticks):
+        vals = sim.step(0.05)
+        ts = t0 + timedelta(milliseconds=50 * k)
+        cols = [(s, u, vals[s].tolist()) for s, u in SENSORS]
+        for i, did in enumerate(ids):
+            out.append([Reading(did, s, col[i], u, ts) for s, u, col in cols])
+    return out
+
+def _inline(frames, base):
+    shard = _Shard(0, base)
+    msgs = []
+    t0 = time.perf_counter()
+    for f in frames:
+        shard.ingest(f, msgs)
+    shard.repo.close()
+    return time.perf_counter() - t0
+
+async def _sharded(frames, base, k):
+    pool = ShardPool(k, base_path=base)
+
+    async def on_out(out_frames, msgs, counters):
+        pass
+
+    pool.start(asyncio.get_running_loop(), on_out)
+    # sobe os processos antes de medir (spawn importa numpy etc.)
+    await pool.acall_all("flush", False)
+    t0 = time.perf_counter()
+    for f in frames:
+        await pool.submit(pool.shard_of(f[0].device_id), ("f", pack_frame(f)))
+    # a resposta do flush vem depois de todos os frames do mesmo pipe
+    await pool.acall_all("flush", False)
+    dt = time.perf_counter() - t0
+    pool.close()
+    return dt
+
+def main():
+    n_dev = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    ks = [int(x) for x in sys.argv[3].split(",")] if len(sys.argv) > 3 else [1, 2, 4]
+    frames = _frames(n_dev, ticks)
+    print(f"{n_dev} prensas x {ticks} ticks = {len(frames)} frames | {os.cpu_count()} cores")
+
+    with tempfile.TemporaryDirectory() as base:
+        dt = _inline(frames, base)
+    ref = len(frames) / dt
+    print(f"  inline     {ref:>9,.0f} frames/s")
+    for k in ks:
+        with tempfile.TemporaryDirectory() as base:
+            dt = asyncio.run(_sharded(frames, base, k))
+        fps = len(frames) / dt
+        print(f"  shards={k:<3} {fps:>9,.0f} frames/s ({fps / ref:.2f}x)")
+
+if __name__ == "__main__":
+    main()
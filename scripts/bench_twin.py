@@ -0,0 +1,69 @@
+# scripts/bench_twin.py
+"""
+Gêmeo digital (internal.sensor.usecase.twin) com muitos devices num core só:
+frames/s do TwinEngine.apply + delta para o WS, e tamanho dos deltas contra o
+estado completo.
+
+Cada device percorre um ciclo sintético (aquece, pão entra, pistão avança/recua,
+ruído nos sensores contínuos); os frames são gerados antes da medição.
+
+Uso: python scripts/bench_twin.py [N_DEVICES] [FRAMES_POR_DEVICE]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.sensor.usecase.twin import TwinEngine
+
+def _frames(n_dev: int, n: int):
+    t0 = datetime.now(timezone.utc)
+    rnd = random.Random(1)
+    out = []
+    for i in range(n):
+        ts = t0 + timedelta(milliseconds=50 * i)
+        ph = i % 60
+        for d in range(n_dev):
+            did = f"bench-{d:04d}"
+            temp = min(25.0 + i * 0.5, 145.0 + 5 * math.sin(i / 40)) + rnd.uniform(-0.3, 0.3)
+            dist = 300.0 - (40.0 if 20 <= ph < 40 else 0.0) + rnd.uniform(-0.5, 0.5)
+            press = 185.0 + (40.0 if 18 <= ph < 40 else 0.0) + rnd.uniform(-1, 1)
+            out.append([
+                Reading(did, "temperature", temp, "C", ts),
+                Reading(did, "pressure", press, "kPa", ts),
+                Reading(did, "distance", dist, "mm", ts),
+                Reading(did, "ir_bread", 1.0 if 10 <= ph < 45 else 0.0, None, ts),
+                Reading(did, "ir_hand", 0.0, None, ts),
+            ])
+    return out
+
+def main():
+    n_dev = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    frames = _frames(n_dev, n)
+    twin = TwinEngine()
+
+    t0 = time.perf_counter()
+    delta_bytes = msgs = 0
+    for f in frames:
+        dev = twin.apply(f)
+        if dev.version > dev.pushed:
+            delta_bytes += len(json.dumps(twin.delta_message(dev), separators=(",", ":")))
+            msgs += 1
+    dt = time.perf_counter() - t0
+
+    full = json.dumps(twin.state(), separators=(",", ":"))
+    print(f"{n_dev} devices x {n} frames: {len(frames) / dt:,.0f} frames/s "
+          f"({dt / len(frames) * 1e6:.1f} µs/frame, inclui serializar o delta)")
+    print(f"  20 Hz por device -> {len(frames) / dt / 20:,.0f} devices num core")
+    print(f"  deltas: {msgs} msgs, média {delta_bytes / max(1, msgs):.0f} B "
+          f"| estado completo por device {len(full) / n_dev:.0f} B | versão {twin.version}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# scripts/migrate_csv_to_columnar.py
+"""
+Converte os CSVs do repositório (data/<device>__<sensor>.csv) para o backend
+colunar (data/columnar/<device>__<sensor>/chunk-*.ts|val) e compara tamanho em
+disco e tempo de leitura completa.
+
+Uso: python scripts/migrate_csv_to_columnar.py [DATA_DIR] [--force]
+"""
+import os
+import sys
+import csv
+import glob
+import time
+import shutil
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from internal.sensor.repository.columnar_store import ColumnarStore, migrate_csv
+
+def _dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(r, f)) for r, _, fs in os.walk(path) for f in fs)
+
+def _read_csv(path: str) -> int:
+    n = 0
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rd = csv.reader(f)
+        next(rd, None)
+        for row in rd:
+            float(row[1]) if row[1] else None
+            n += 1
+    return n
+
+def main(data_dir: str, force: bool):
+    store = ColumnarStore(base_path=data_dir)
+    for p in sorted(glob.glob(os.path.join(data_dir, "*__*.csv"))):
+        name = os.path.basename(p)[:-4]
+        dev, _, sen = name.partition("__")
+        dst = store.path(dev, sen)
+        if os.path.exists(dst):
+            if not force:
+                print(f"[skip] {name}: série colunar já existe (use --force)")
+                continue
+            shutil.rmtree(dst)
+
+        t0 = time.perf_counter()
+        rows = migrate_csv(p, store, dev, sen)
+        store.flush(durable=True)
+        t_mig = time.perf_counter() - t0
+
+        t0 = time.perf_counter(); _read_csv(p); t_csv = time.perf_counter() - t0
+        t0 = time.perf_counter(); ts, val = store.read(dev, sen); float(val.sum()) if len(val) else 0.0
+        t_col = time.perf_counter() - t0
+
+        b_csv, b_col = os.path.getsize(p), _dir_size(dst)
+        print(f"[ok] {name}: {rows} linhas em {t_mig:.3f}s | "
+              f"disco {b_csv:,} B -> {b_col:,} B ({b_csv / max(1, b_col):.1f}x) | "
+              f"leitura {t_csv * 1000:.1f} ms -> {t_col * 1000:.2f} ms ({t_csv / max(1e-9, t_col):.0f}x)")
+    store.close()
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    main(args[0] if args else "data", "--force" in sys.argv)
@@ -0,0 +1,116 @@
+# scripts/sim_dataset.py
+"""
+Gera datasets com o simulador físico (internal.shared.press_sim) mais rápido que o
+tempo real, sem servidor:
+
+  --format repo      -> CSVs do repositório (<device>__<sensor>.csv + .idx, e o
+                        colunar se REPO_BACKEND incluir), gravados em bloco via
+                        save_arrays; servem de REPLAY_FILE (sessão) e /sensor/history
+  --format firmware  -> um .jsonl por prensa no formato que o main.cpp imprime
+                        (pressao_volts pela calibração inversa, distancia_mm null
+                        sem eco); servem para o replayer com filtros / bench_filters
+
+Os ticks são simulados em blocos de --block passos para limitar a memória.
+
+Uso:
+  python scripts/sim_dataset.py --devices 100 --seconds 3600 --out /tmp/sim
+  python scripts/sim_dataset.py --devices 3 --seconds 600 --dt 0.28 --format firmware --out /tmp/fw
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+
+from internal.shared.press_sim import PressSim, SENSORS
+from internal.shared.calib import CAL_PRESSURE
+from internal.shared.timeutil import to_epoch_ns
+
+def _write_firmware(files, block, t_ms):
+    """Linhas JSON do main.cpp, uma por tick, no arquivo de cada prensa."""
+    volts = (block["pressure"] - CAL_PRESSURE.b) / CAL_PRESSURE.a
+    for j, fh in enumerate(files):
+        lines = []
+        for i, tm in enumerate(t_ms):
+            d = block["distance"][i, j]
+            lines.append(json.dumps({
+                "timestamp_ms": int(tm),
+                "temperatura_C": round(float(block["temperature"][i, j]), 2),
+                "pressao_volts": round(float(volts[i, j]), 5),
+                "IR_pao": bool(block["ir_bread"][i, j]),
+                "IR_mao": bool(block["ir_hand"][i, j]),
+                "distancia_mm": None if math.isnan(d) else round(float(d), 1),
+            }, separators=(",", ":")))
+        fh.write("\n".join(lines) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--devices", type=int, default=10)
+    ap.add_argument("--seconds", type=float, default=600.0, help="tempo simulado")
+    ap.add_argument("--dt", type=float, default=0.3, help="passo (s); o firmware imprime a cada ~0,28 s")
+    ap.add_argument("--out", required=True, help="diretório de saída")
+    ap.add_argument("--format", choices=("repo", "firmware"), default="repo")
+    ap.add_argument("--prefix", default="sim-press-", help="prefixo dos device_id")
+    ap.add_argument("--start", default=None, help="ISO-8601 da 1ª amostra (padrão: agora - duração)")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--block", type=int, default=2048, help="passos simulados por bloco")
+    args = ap.parse_args()
+
+    steps = int(args.seconds / args.dt)
+    ids = [f"{args.prefix}{i:04d}" for i in range(args.devices)]
+    if args.start:
+        start_ns = to_epoch_ns(datetime.fromisoformat(args.start.replace("Z", "+00:00")))
+    else:
+        start_ns = time.time_ns() - int(args.seconds * 1e9)
+    dt_ns = int(round(args.dt * 1e9))
+    os.makedirs(args.out, exist_ok=True)
+
+    sim = PressSim(args.devices, seed=args.seed)
+    repo = files = None
+    if args.format == "repo":
+        from internal.sensor.repository.sensor_repository import SensorRepository
+        repo = SensorRepository(base_path=args.out)
+    else:
+        files = [open(os.path.join(args.out, f"{did}.jsonl"), "w", encoding="utf-8") for did in ids]
+
+    t0 = time.perf_counter()
+    t_sim = t_io = 0.0
+    done = 0
+    try:
+        while done < steps:
+            k = min(args.block, steps - done)
+            a = time.perf_counter()
+            block = sim.run(k, args.dt)
+            b = time.perf_counter()
+            if repo is not None:
+                ts = start_ns + (done + 1 + np.arange(k, dtype=np.int64)) * dt_ns
+                for j, did in enumerate(ids):
+                    for sensor, unit in SENSORS:
+                        repo.save_arrays(did, sensor, ts, np.ascontiguousarray(block[sensor][:, j]), unit)
+            else:
+                _write_firmware(files, block, (done + 1 + np.arange(k)) * args.dt * 1000.0)
+            t_sim += b - a
+            t_io += time.perf_counter() - b
+            done += k
+    finally:
+        if repo is not None:
+            repo.close()
+        for fh in files or ():
+            fh.close()
+
+    wall = time.perf_counter() - t0
+    rows = steps * args.devices
+    print(f"{args.devices} prensas x {steps} passos ({args.seconds:.0f} s simulados) -> {args.out} [{args.format}]")
+    print(f"  {wall:.2f} s ({args.seconds * args.devices / wall:,.0f}x tempo real somando as prensas; "
+          f"{args.seconds / wall:,.0f}x por prensa em lockstep)")
+    print(f"  {rows / wall:,.0f} frames/s | simulação {t_sim:.2f} s, gravação {t_io:.2f} s")
+    print(f"  ciclos de prensagem: média {sim.cycles.mean():.1f} por prensa")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# tests/filter_refs.py
+"""
+Implementações originais dos filtros do replayer (listas, amostra a amostra):
+referência dos testes de equivalência (test_filters.py) e baseline do
+scripts/bench_filters.py.
+"""
+import math
+import random
+import statistics
+
+def hampel_ref(series, w, k):
+    # cópia do _hampel original
+    if w < 3 or w % 2 == 0:
+        return series[:]
+    n = len(series); r = series[:]
+    half = w // 2
+    for i in range(n):
+        a = max(0, i - half); b = min(n, i + half + 1)
+        window = [x for x in series[a:b] if not math.isnan(x)]
+        if len(window) < 3:
+            continue
+        med = statistics.median(window)
+        mad = statistics.median([abs(x - med) for x in window]) or 1e-9
+        if not math.isnan(series[i]) and abs(series[i] - med) > k * 1.4826 * mad:
+            r[i] = med
+    return r
+
+def movavg_ref(series, w):
+    if w<=1:
+        return series[:]
+    out=[]; q=[]; s=0.0
+    for x in series:
+        if math.isnan(x):
+            out.append(x)
+            continue
+        q.append(x); s+=x
+        if len(q)>w:
+            s-=q.pop(0)
+        out.append(s/len(q))
+    return out
+
+def ema_ref(series, alpha):
+    out=[]; y=None
+    for x in series:
+        if math.isnan(x):
+            out.append(x)
+            continue
+        y = x if y is None or math.isnan(y) else (alpha*x + (1-alpha)*y)
+        out.append(y)
+    return out
+
+def range_ref(v, low, high):
+    return [x if (not math.isnan(x) and low <= x <= high) else float("nan") for x in v]
+
+def warmup_ref(t_ms, warmup_s):
+    t0 = t_ms[0]
+    for i, tm in enumerate(t_ms):
+        if (tm - t0) >= warmup_s*1000.0:
+            return i
+    return 0
+
+def deadband_slew_ref(v, dt, db, max_per_s, hold_nan=False):
+    # laço do replayer original (_deadband_apply + _slew_limit)
+    out=[]; y=None
+    for x, d in zip(v, dt):
+        if not math.isnan(x):
+            cand = x if y is None or math.isnan(y) else (y if abs(x - y) <= db else x)
+            if y is None or math.isnan(y) or math.isnan(cand):
+                y = cand
+            else:
+                md = max_per_s * max(d, 1e-6)
+                y = y + md if cand > y + md else (y - md if cand < y - md else cand)
+            out.append(y)
+        else:
+            out.append(y if hold_nan and y is not None and not math.isnan(y) else float("nan"))
+    return out
+
+def signal(n, seed=42):
+    # pressão sintética: patamares + ruído + picos de calibração + buracos (NaN)
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        v = 180.0 + 40.0 * ((i // 500) % 2) + rnd.gauss(0, 1.5)
+        r = rnd.random()
+        if r < 0.01:
+            v += rnd.choice((-1, 1)) * rnd.uniform(50, 300)
+        elif r < 0.02:
+            v = float("nan")
+        out.append(v)
+    return out
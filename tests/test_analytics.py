@@ -0,0 +1,38 @@
+# tests/test_analytics.py
+"""PressAnalytics: tempo de aquecimento medido entre os cruzamentos de HEAT_FROM_C e HEAT_TO_C."""
+from datetime import datetime, timedelta, timezone
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.sensor.usecase.analytics import HEAT_FROM_C, HEAT_TO_C, PressAnalytics
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def _feed(a, temps, step_s=1.0):
+    for i, x in enumerate(temps):
+        a.update([Reading("d", "temperature", float(x), "C", T0 + timedelta(seconds=i * step_s))])
+    return a.kpis("d")["heat"]
+
+
+def test_heatup_from_ambient_ramp():
+    heat = _feed(PressAnalytics(push_s=0), [25 + i for i in range(200)])   # 1 °C/s
+    assert heat["heatups"] == 1
+    assert heat["last_heatup_s"] == HEAT_TO_C - HEAT_FROM_C
+
+
+def test_heatup_crossing_is_interpolated():
+    # 2 °C/s amostrado a cada 2 s, começando 2 °C abaixo: cruza HEAT_FROM_C 1 s depois da 1ª leitura
+    heat = _feed(PressAnalytics(push_s=0), [HEAT_FROM_C - 2 + 4 * i for i in range(40)], step_s=2.0)
+    assert heat["last_heatup_s"] == (HEAT_TO_C - HEAT_FROM_C) / 2
+
+
+def test_cooling_below_start_restarts_heatup():
+    temps = [25 + i for i in range(100)] + [130 - i for i in range(40)] + [91 + i for i in range(70)]
+    heat = _feed(PressAnalytics(push_s=0), temps)
+    assert heat["heatups"] == 1
+    assert heat["last_heatup_s"] == HEAT_TO_C - HEAT_FROM_C
+
+
+def test_start_above_threshold_is_not_a_heatup():
+    heat = _feed(PressAnalytics(push_s=0), [120 + i for i in range(60)])
+    assert heat["heatups"] == 0 and not heat["heating"]
@@ -0,0 +1,108 @@
+# tests/test_csv_store.py
+"""CsvStore: índice esparso (.idx) sempre em ordem e leituras por faixa/tail corretas."""
+import numpy as np
+import pytest
+
+from internal.sensor.domain.sensor_model import Reading
+from internal.sensor.repository import csv_store
+from internal.sensor.repository.csv_store import CsvStore, OutOfOrder, _read_index
+from internal.shared.timeutil import from_epoch_ns
+
+S = 10**9
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(csv_store, "INDEX_EVERY", 4)   # várias entradas com poucas linhas
+    st = CsvStore(str(tmp_path))
+    yield st
+    st.close()
+
+
+def _readings(secs):
+    return [Reading("d", "p", float(t), "kPa", from_epoch_ns(t * S)) for t in secs]
+
+
+def _assert_index_sorted(st):
+    st.flush()
+    idx = _read_index(st.path("d", "p"))
+    ts, off = list(idx[0::2]), list(idx[1::2])
+    assert ts and ts == sorted(ts)
+    assert off == sorted(off) and len(set(off)) == len(off)
+
+
+def test_index_sorted_live_and_backfill(store):
+    store.append(_readings(range(0, 10)))
+    store.flush()
+    store.append_arrays("d", "p", np.arange(10, 30) * S, np.arange(10, 30, dtype=float), "kPa")
+    store.append(_readings(range(30, 37)))
+    _assert_index_sorted(store)
+    ts, vals, unit = store.read_range("d", "p", 5 * S, 32 * S)
+    assert ts == [t * S for t in range(5, 33)] and vals == [float(t) for t in range(5, 33)]
+    assert unit == "kPa"
+    assert store.tail("d", "p", 3)[0] == [34 * S, 35 * S, 36 * S]
+
+
+def test_read_range_repeated_ts_across_index_block(store):
+    ts = np.array([1, 2, 3, 5, 5, 5, 5, 6, 7]) * S
+    store.append_arrays("d", "p", ts, np.arange(9.0), "kPa")
+    _assert_index_sorted(store)
+    assert store.read_range("d", "p", 5 * S)[0] == [5 * S] * 4 + [6 * S, 7 * S]
+    assert store.read_range("d", "p", 5 * S, 5 * S)[1] == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_backfill_before_end_is_rejected(store):
+    store.append_arrays("d", "p", np.arange(100, 120) * S, np.arange(20.0))
+    with pytest.raises(OutOfOrder):
+        store.append_arrays("d", "p", np.arange(0, 20) * S, np.arange(20.0))
+    _assert_index_sorted(store)
+    assert len(store.read_range("d", "p", 105 * S, 115 * S)[0]) == 11
+
+
+def test_unsorted_block_is_rejected(store):
+    with pytest.raises(OutOfOrder):
+        store.append_arrays("d", "p", np.array([5, 3, 4]) * S, np.zeros(3))
+
+
+def test_backfill_order_checked_after_reopen(tmp_path, store):
+    store.append(_readings(range(50, 60)))
+    store.close()
+    st = CsvStore(str(tmp_path))
+    try:
+        with pytest.raises(OutOfOrder):
+            st.append_arrays("d", "p", np.arange(40, 45) * S, np.zeros(5))
+        assert st.append_arrays("d", "p", np.arange(59, 70) * S, np.zeros(11)) == 11
+        _assert_index_sorted(st)
+    finally:
+        st.close()
+
+
+def test_index_rebuilt_by_reader(tmp_path, store):
+    store.append(_readings(range(0, 20)))
+    store.close()
+    (tmp_path / "d__p.csv.idx").unlink()
+    st = CsvStore(str(tmp_path))
+    try:
+        assert st.read_range("d", "p", 7 * S, 9 * S)[0] == [7 * S, 8 * S, 9 * S]
+        _assert_index_sorted(st)
+    finally:
+        st.close()
+
+
+def test_shared_files_reader_does_not_touch_index(tmp_path, store):
+    # store é o dono (sink aberto); reader é outro worker lendo os mesmos arquivos
+    reader = CsvStore(str(tmp_path))
+    reader.shared_files = True
+    try:
+        store.append(_readings(range(0, 10)))
+        store.flush()
+        # dono no meio de um flush: linhas já no CSV, entradas do .idx ainda não
+        with open(tmp_path / "d__p.csv", "ab") as f:
+            f.write(b"".join(csv_store._format_row(from_epoch_ns(t * S), float(t), "kPa") for t in range(10, 20)))
+        idx_file = tmp_path / "d__p.csv.idx"
+        before = idx_file.read_bytes()
+        assert reader.read_range("d", "p", 13 * S, 16 * S)[0] == [t * S for t in range(13, 17)]
+        assert reader.tail("d", "p", 2)[0] == [18 * S, 19 * S]
+        assert idx_file.read_bytes() == before
+    finally:
+        reader.close()
@@ -0,0 +1,78 @@
+# tests/test_filters.py
+"""Filtros do replayer (filter / filter_np) contra a implementação original em listas."""
+import numpy as np
+import pytest
+
+from filter_refs import (
+    deadband_slew_ref, ema_ref, hampel_ref, movavg_ref, range_ref, signal, warmup_ref,
+)
+from internal.shared import filter_np as fnp
+from internal.shared.filter import HAMPEL_MAX_WIN, DeadbandSlew, HampelFilter, hampel_iter
+
+N = 5000
+SERIES = signal(N)
+DT = [0.5] + [0.28] * (N - 1)
+
+
+def _same(a, b):
+    """Idêntico amostra a amostra (NaN == NaN)."""
+    a, b = list(a), list(b)
+    return len(a) == len(b) and all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+
+def _close(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return a.shape == b.shape and bool(np.allclose(a, b, rtol=1e-9, atol=1e-9, equal_nan=True))
+
+
+@pytest.mark.parametrize("w", [1, 4, 11, 51])
+def test_hampel_streaming(w):
+    assert _same(hampel_iter(SERIES, w, 3.0), hampel_ref(SERIES, w, 3.0))
+
+
+@pytest.mark.parametrize("w", [11, 51])
+def test_hampel_numpy(w):
+    assert _same(fnp.hampel(SERIES, w, 3.0).tolist(), hampel_ref(SERIES, w, 3.0))
+
+
+def test_hampel_short_series():
+    # série menor que a janela: tudo sai no flush()
+    short = SERIES[:7]
+    assert _same(hampel_iter(short, 11, 3.0), hampel_ref(short, 11, 3.0))
+
+
+def test_hampel_add_delay():
+    f = HampelFilter(11, 3.0)
+    out = [f.add(x) for x in SERIES[:20]]
+    assert out[:5] == [None] * 5 and None not in out[5:]
+
+
+def test_hampel_window_capped():
+    HampelFilter(HAMPEL_MAX_WIN, 3.0, causal=True)
+    with pytest.raises(ValueError):
+        HampelFilter(HAMPEL_MAX_WIN + 2, 3.0)
+
+
+def test_range_mask():
+    assert _same(fnp.range_mask(SERIES, 0.0, 300.0).tolist(), range_ref(SERIES, 0.0, 300.0))
+
+
+def test_warmup_index():
+    t_ms = [i * 280.0 for i in range(N)]
+    assert fnp.warmup_index(t_ms, 4.0) == warmup_ref(t_ms, 4.0)
+
+
+def test_ema():
+    assert _close(fnp.ema(SERIES, 0.08), ema_ref(SERIES, 0.08))
+
+
+def test_movavg():
+    assert _close(fnp.movavg(SERIES, 25), movavg_ref(SERIES, 25))
+
+
+@pytest.mark.parametrize("hold", [False, True])
+def test_deadband_slew(hold):
+    ref = deadband_slew_ref(SERIES, DT, 0.8, 15.0, hold)
+    assert _same(fnp.deadband_slew(SERIES, DT, 0.8, 15.0, hold).tolist(), ref)
+    f = DeadbandSlew(0.8, 15.0, hold)
+    assert _same([f.step(x, d) for x, d in zip(SERIES, DT)], ref)